@@ -52,9 +52,10 @@ def main():
         client.delete_collection(collection_name)
     except Exception:
         pass
+    # kb_version lets consumers (e.g. the Zadanie_3 answer cache) detect a re-ingest
     collection = client.get_or_create_collection(
         name=collection_name,
-        metadata={"hnsw:space": "cosine"}
+        metadata={"hnsw:space": "cosine", "kb_version": str(int(time.time()))}
     )
 
     files = sorted(glob.glob(os.path.join(kb_root, "**", "*.json"), recursive=True))
@@ -5,6 +5,9 @@ from pathlib import Path
 
 import psycopg2
 
+# Zadanie_3's SQL result cache listens here and drops entries of the notified machine.
+NOTIFY_CHANNEL = os.getenv("TELEMETRY_NOTIFY_CHANNEL", "telemetry_ingest")
+
 
 def pg_dsn() -> dict:
     return {
@@ -16,9 +19,27 @@ def pg_dsn() -> dict:
     }
 
 
+def refresh_rollups(cur, machines: list[str], replaced: dict) -> None:
+    """Rebuild telemetry_1m/1h/1d (03_rollups.sql) for the days touched by this load."""
+    cur.execute("SELECT to_regprocedure('refresh_telemetry_rollups(text, timestamptz, timestamptz)');")
+    if cur.fetchone()[0] is None:
+        print("[WARN] refresh_telemetry_rollups() not found; apply services/postgres/init/03_rollups.sql")
+        return
+    for machine in machines:
+        cur.execute("SELECT min(ts), max(ts) FROM telemetry WHERE machine_id = %s;", (machine,))
+        bounds = [b for b in (cur.fetchone(), replaced.get(machine, (None, None))) if b[0] is not None]
+        if not bounds:
+            continue
+        cur.execute(
+            "SELECT refresh_telemetry_rollups(%s, %s, %s);",
+            (machine, min(b[0] for b in bounds), max(b[1] for b in bounds)),
+        )
+
+
 def load_csv(conn, telemetry_csv: Path, alarms_csv: Path, machine_id: str) -> tuple[int, int]:
     telemetry_rows = 0
     alarms_rows = 0
+    machines = {machine_id}
 
     with conn.cursor() as cur:
         cur.execute(
@@ -30,6 +51,10 @@ def load_csv(conn, telemetry_csv: Path, alarms_csv: Path, machine_id: str) -> tu
             (machine_id, "Lankovacka-MVP"),
         )
 
+        # Rollups of the replaced rows are rebuilt below, together with the new ones.
+        cur.execute("SELECT min(ts), max(ts) FROM telemetry WHERE machine_id = %s;", (machine_id,))
+        replaced = {machine_id: cur.fetchone()}
+
         cur.execute("DELETE FROM telemetry WHERE machine_id = %s;", (machine_id,))
         cur.execute("DELETE FROM alarms WHERE machine_id = %s;", (machine_id,))
 
@@ -37,6 +62,7 @@ def load_csv(conn, telemetry_csv: Path, alarms_csv: Path, machine_id: str) -> tu
             reader = csv.DictReader(f)
             telemetry_batch = []
             for row in reader:
+                machines.add(row["machine_id"])
                 telemetry_batch.append(
                     (
                         row["ts"],
@@ -99,6 +125,13 @@ def load_csv(conn, telemetry_csv: Path, alarms_csv: Path, machine_id: str) -> tu
                     alarms_batch,
                 )
                 alarms_rows = len(alarms_batch)
+                machines.update(row[1] for row in alarms_batch)
+
+        refresh_rollups(cur, sorted(machines), replaced)
+
+        # Delivered to listeners only when the transaction commits.
+        for machine in sorted(machines):
+            cur.execute("SELECT pg_notify(%s, %s);", (NOTIFY_CHANNEL, machine))
 
     conn.commit()
     return telemetry_rows, alarms_rows
@@ -20,26 +20,27 @@ def main() -> None:
     parser.add_argument("--hours", type=int, default=2)
     args = parser.parse_args()
 
+    # Minute rollups (services/postgres/init/03_rollups.sql): the cost does not grow with the sampling rate.
     sql = """
     WITH base AS (
-      SELECT ts, tag, value
-      FROM telemetry
+      SELECT *
+      FROM telemetry_1m
       WHERE machine_id = %s
-        AND ts >= (now() at time zone 'utc') - (%s::text || ' hours')::interval
+        AND bucket >= (now() at time zone 'utc') - (%s::text || ' hours')::interval
         AND tag IN ('LineSpeed_mpm','Tension_N','TempGearbox_C','TempMotor_C','Vibration_mm_s')
     ),
     rng AS (
-      SELECT min(ts) AS ts_min, max(ts) AS ts_max, count(*) AS cnt
+      SELECT min(first_ts) AS ts_min, max(last_ts) AS ts_max, coalesce(sum(samples), 0) AS cnt
       FROM base
     ),
     stats AS (
       SELECT
         tag,
-        min(value) AS min_v,
-        avg(value) AS avg_v,
-        max(value) AS max_v,
-        (array_agg(value ORDER BY ts DESC))[1] AS last_v,
-        (array_agg(value ORDER BY ts ASC))[1] AS first_v
+        min(value_min) AS min_v,
+        sum(value_sum) / nullif(sum(value_count), 0) AS avg_v,
+        max(value_max) AS max_v,
+        (array_agg(value_last ORDER BY last_ts DESC))[1] AS last_v,
+        (array_agg(value_first ORDER BY first_ts ASC))[1] AS first_v
       FROM base
       GROUP BY tag
     )
@@ -0,0 +1,102 @@
+-- Telemetry rollups per UTC minute / hour / day, one row per (bucket, machine_id, tag).
+-- avg = value_sum / value_count; samples counts rows including NULL values.
+-- first/last are the values at first_ts/last_ts, so coarser buckets can be merged from finer ones.
+CREATE TABLE IF NOT EXISTS telemetry_1m (
+  bucket TIMESTAMPTZ NOT NULL,
+  machine_id TEXT NOT NULL,
+  tag TEXT NOT NULL,
+  unit TEXT,
+  samples BIGINT NOT NULL,
+  value_count BIGINT NOT NULL,
+  value_min DOUBLE PRECISION,
+  value_max DOUBLE PRECISION,
+  value_sum DOUBLE PRECISION,
+  first_ts TIMESTAMPTZ NOT NULL,
+  value_first DOUBLE PRECISION,
+  last_ts TIMESTAMPTZ NOT NULL,
+  value_last DOUBLE PRECISION,
+  PRIMARY KEY (bucket, machine_id, tag)
+);
+
+CREATE TABLE IF NOT EXISTS telemetry_1h (LIKE telemetry_1m INCLUDING ALL);
+CREATE TABLE IF NOT EXISTS telemetry_1d (LIKE telemetry_1m INCLUDING ALL);
+
+CREATE INDEX IF NOT EXISTS idx_telemetry_1m_machine_bucket ON telemetry_1m(machine_id, bucket DESC);
+CREATE INDEX IF NOT EXISTS idx_telemetry_1h_machine_bucket ON telemetry_1h(machine_id, bucket DESC);
+CREATE INDEX IF NOT EXISTS idx_telemetry_1d_machine_bucket ON telemetry_1d(machine_id, bucket DESC);
+
+-- Recompute the rollups of one machine for the whole UTC days covering [p_from, p_to]
+-- (NULL = unbounded). Idempotent, so callers may pass any range that covers their writes.
+CREATE OR REPLACE FUNCTION refresh_telemetry_rollups(p_machine_id TEXT, p_from TIMESTAMPTZ, p_to TIMESTAMPTZ)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  d_from TIMESTAMPTZ := date_trunc('day', COALESCE(p_from, '-infinity') AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+  d_to TIMESTAMPTZ := (date_trunc('day', COALESCE(p_to, 'infinity') AT TIME ZONE 'UTC') + interval '1 day') AT TIME ZONE 'UTC';
+BEGIN
+  DELETE FROM telemetry_1m WHERE machine_id = p_machine_id AND bucket >= d_from AND bucket < d_to;
+  DELETE FROM telemetry_1h WHERE machine_id = p_machine_id AND bucket >= d_from AND bucket < d_to;
+  DELETE FROM telemetry_1d WHERE machine_id = p_machine_id AND bucket >= d_from AND bucket < d_to;
+
+  INSERT INTO telemetry_1m
+  SELECT
+    date_trunc('minute', ts AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+    machine_id,
+    tag,
+    max(unit),
+    count(*),
+    count(value),
+    min(value),
+    max(value),
+    sum(value),
+    min(ts),
+    (array_agg(value ORDER BY ts))[1],
+    max(ts),
+    (array_agg(value ORDER BY ts DESC))[1]
+  FROM telemetry
+  WHERE machine_id = p_machine_id AND ts >= d_from AND ts < d_to
+  GROUP BY 1, machine_id, tag;
+
+  INSERT INTO telemetry_1h
+  SELECT
+    date_trunc('hour', bucket AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+    machine_id,
+    tag,
+    max(unit),
+    sum(samples),
+    sum(value_count),
+    min(value_min),
+    max(value_max),
+    sum(value_sum),
+    min(first_ts),
+    (array_agg(value_first ORDER BY first_ts))[1],
+    max(last_ts),
+    (array_agg(value_last ORDER BY last_ts DESC))[1]
+  FROM telemetry_1m
+  WHERE machine_id = p_machine_id AND bucket >= d_from AND bucket < d_to
+  GROUP BY 1, machine_id, tag;
+
+  INSERT INTO telemetry_1d
+  SELECT
+    date_trunc('day', bucket AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+    machine_id,
+    tag,
+    max(unit),
+    sum(samples),
+    sum(value_count),
+    min(value_min),
+    max(value_max),
+    sum(value_sum),
+    min(first_ts),
+    (array_agg(value_first ORDER BY first_ts))[1],
+    max(last_ts),
+    (array_agg(value_last ORDER BY last_ts DESC))[1]
+  FROM telemetry_1h
+  WHERE machine_id = p_machine_id AND bucket >= d_from AND bucket < d_to
+  GROUP BY 1, machine_id, tag;
+END;
+$$;
+
+-- Backfill when this script is applied to an existing database.
+SELECT refresh_telemetry_rollups(machine_id, NULL, NULL) FROM machines;
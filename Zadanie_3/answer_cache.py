@@ -0,0 +1,142 @@
+"""Full-answer cache invalidated by the data an answer was built from."""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Text casts keep the result JSON-safe on both the native and the MCP backend.
+DATA_VERSION_SQL = (
+    "SELECT (SELECT max(ts) FROM telemetry)::text AS telemetry_ts, "
+    "(SELECT max(ts) FROM alarms)::text AS alarms_ts"
+)
+
+# Tools whose output an answer may depend on, mapped to the fingerprint fields that version them.
+SOURCE_FIELDS: dict[str, tuple[str, ...]] = {
+    "sql_query": ("telemetry_ts", "alarms_ts"),
+    "rag_search": ("kb_version",),
+    "web_search": (),
+}
+
+_RELATIVE_TIME_RE = re.compile(r"now\(\)|current_(?:date|timestamp)|\blast\b|\bpast\b|\btoday\b|\bago\b", re.IGNORECASE)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+
+def is_time_relative(texts: list[str]) -> bool:
+    return any(_RELATIVE_TIME_RE.search(text) for text in texts)
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600, bucket_seconds: int = 60) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.bucket_seconds = max(1, bucket_seconds)
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+        self._stores = 0
+
+    def time_bucket(self, now: float | None = None) -> int:
+        return int((now if now is not None else time.time()) // self.bucket_seconds)
+
+    def lookup(self, query: str, fingerprint: dict[str, Any]) -> str | None:
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            fresh = now - entry["created_at"] <= self.ttl_seconds
+            for field, value in entry["fingerprint"].items():
+                if fingerprint.get(field) != value:
+                    fresh = False
+                    break
+            if not fresh:
+                del self._entries[key]
+                self._stale += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry["answer"]
+
+    def store(
+        self,
+        query: str,
+        answer: str,
+        tool_results: list[dict[str, Any]],
+        fingerprint: dict[str, Any],
+    ) -> bool:
+        """Cache `answer` keyed by the fingerprint fields of the sources it used.
+
+        Every entry is keyed by `memory_version`, since the loaded memories shape each
+        answer; answers built from no tool at all are also keyed by the time bucket.
+        Turns that touched memory or had failing steps are not cached; neither are
+        turns whose data versions could not be read.
+        """
+        used_fields: set[str] = {"memory_version"}
+        if not tool_results:
+            used_fields.add("time_bucket")
+        texts = [query]
+        for item in tool_results:
+            tool = item.get("tool", "")
+            if "error" in item or tool not in SOURCE_FIELDS:
+                return False
+            used_fields.update(SOURCE_FIELDS[tool])
+            texts.append(str(item.get("instruction", "")))
+            result = item.get("result")
+            if isinstance(result, dict) and result.get("generated_sql"):
+                texts.append(str(result["generated_sql"]))
+        if is_time_relative(texts):
+            used_fields.add("time_bucket")
+
+        entry_fingerprint = {field: fingerprint.get(field) for field in sorted(used_fields)}
+        if any(value is None for value in entry_fingerprint.values()):
+            return False
+
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = {
+                "answer": answer,
+                "fingerprint": entry_fingerprint,
+                "created_at": time.time(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._stores += 1
+        logger.info("[ANSWER_CACHE] Stored answer for '%s' keyed by %s", key, entry_fingerprint)
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "stale_invalidations": self._stale,
+                "stores": self._stores,
+                "hit_rate": self._hits / total if total else 0.0,
+            }
+
+
+def answer_cache_from_env() -> AnswerCache | None:
+    if os.getenv("ANSWER_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    return AnswerCache(
+        max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256")),
+        ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600")),
+        bucket_seconds=int(os.getenv("ANSWER_CACHE_BUCKET_SECONDS", "60")),
+    )
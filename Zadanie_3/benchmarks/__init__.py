@@ -0,0 +1 @@
+"""Offline micro-benchmarks for the agent's hot paths (no Ollama/Postgres/Chroma needed)."""
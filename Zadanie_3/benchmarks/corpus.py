@@ -0,0 +1,129 @@
+"""Deterministic inputs for the benchmarks: SQL corpus, planner outputs and tool results."""
+
+import json
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+from tools.telemetry_schema import TELEMETRY_TAGS
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+_NUMERIC_TAGS = [tag for tag, unit in TELEMETRY_TAGS.items() if unit]
+_WINDOWS = ["15 minutes", "1 hour", "8 hours", "24 hours", "7 days"]
+_AGGREGATES = ["AVG", "MIN", "MAX", "COUNT", "STDDEV"]
+
+_SELECT_TEMPLATES = [
+    "SELECT tag, {agg}(value) AS {agg_l}_value FROM telemetry WHERE machine_id='{machine}' "
+    "AND tag IN ('{tag}', '{tag2}') AND ts >= now() - interval '{window}' GROUP BY tag",
+    "SELECT date_trunc('hour', ts) AS hour, {agg}(value) AS {agg_l}_value FROM telemetry "
+    "WHERE machine_id='{machine}' AND tag='{tag}' AND ts >= now() - interval '{window}' GROUP BY 1 ORDER BY 1",
+    "SELECT ts, value FROM telemetry WHERE machine_id='{machine}' AND tag='{tag}' "
+    "AND ts >= now() - interval '{window}' ORDER BY ts DESC LIMIT 200",
+    "SELECT ts, alarm_code, severity, state, message FROM alarms WHERE machine_id='{machine}' "
+    "AND alarm_code='E{code}' AND ts >= now() - interval '{window}' ORDER BY ts DESC",
+    "WITH w AS (SELECT tag, value, ts FROM telemetry WHERE machine_id='{machine}' "
+    "AND ts >= now() - interval '{window}') SELECT tag, {agg}(value) FROM w WHERE tag='{tag}' GROUP BY tag",
+    "select a.alarm_code, count(*) as events from alarms a where a.ts >= now() - interval '{window}' "
+    "group by a.alarm_code order by events desc;",
+]
+# Rejected by is_read_only_sql: writes, chaining and comments.
+_UNSAFE_TEMPLATES = [
+    "DELETE FROM telemetry WHERE tag='{tag}'",
+    "SELECT * FROM telemetry; DROP TABLE alarms",
+    "SELECT value FROM telemetry WHERE tag='{tag}' -- AND machine_id='{machine}'",
+    "WITH x AS (UPDATE telemetry SET value=0 RETURNING *) SELECT * FROM x",
+    "SELECT /* hint */ value FROM telemetry",
+    "INSERT INTO alarms (alarm_code) VALUES ('E{code}')",
+]
+
+
+def sql_corpus(size: int = 500, seed: int = 7) -> list[str]:
+    """Generated NL->SQL-like statements; about one in six is not read-only."""
+    rng = random.Random(seed)
+    corpus: list[str] = []
+    for idx in range(size):
+        templates = _UNSAFE_TEMPLATES if idx % 6 == 5 else _SELECT_TEMPLATES
+        agg = rng.choice(_AGGREGATES)
+        corpus.append(
+            rng.choice(templates).format(
+                agg=agg,
+                agg_l=agg.lower(),
+                machine=f"LNK-{rng.randint(1, 4):02d}",
+                tag=rng.choice(_NUMERIC_TAGS),
+                tag2=rng.choice(_NUMERIC_TAGS),
+                window=rng.choice(_WINDOWS),
+                code=rng.randint(100, 399),
+            )
+        )
+    return corpus
+
+
+def fenced_sql_corpus(size: int = 500, seed: int = 7) -> list[str]:
+    """The SQL corpus wrapped the ways the NL->SQL model answers (fenced, prose, bare)."""
+    wrappers = [
+        "```sql\n{sql}\n```",
+        "Here is the query:\n```sql\n{sql}\n```\nIt filters by machine and window.",
+        "```\n{sql}\n```",
+        "{sql}",
+    ]
+    return [wrappers[idx % len(wrappers)].format(sql=sql) for idx, sql in enumerate(sql_corpus(size, seed))]
+
+
+def planner_outputs() -> list[str]:
+    """Raw planner responses recorded from the LLM, including malformed ones."""
+    with (DATA_DIR / "planner_outputs.json").open(encoding="utf-8") as f:
+        return json.load(f)["outputs"]
+
+
+def large_tool_results(sql_rows: int = 2000, seed: int = 7) -> list[dict[str, Any]]:
+    """tool_results of a heavy turn: a long telemetry series, KB documents and web hits."""
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    rows = [
+        [
+            (start + timedelta(seconds=10 * idx)).isoformat(),
+            tag,
+            round(rng.uniform(20, 90), 3),
+            TELEMETRY_TAGS[tag],
+        ]
+        for idx in range(sql_rows)
+        for tag in [_NUMERIC_TAGS[idx % len(_NUMERIC_TAGS)]]
+    ]
+    document = (
+        "# SOP E204 - Gearbox overtemperature\n"
+        + "Check oil level, cooling fan and bearing condition before restarting the line. " * 40
+    )
+    return [
+        {
+            "step": 1,
+            "tool": "sql_query",
+            "instruction": "Telemetry for LNK-01 over the last 8 hours",
+            "result": {
+                "columns": ["ts", "tag", "value", "unit"],
+                "rows": rows,
+                "row_count": len(rows),
+                "generated_sql": _SELECT_TEMPLATES[2],
+                "sql_backend": "native",
+            },
+        },
+        {
+            "step": 2,
+            "tool": "rag_search",
+            "instruction": "E204 troubleshooting",
+            "result": [
+                {"document": document, "metadata": {"source": f"sop_e20{idx}.md"}, "distance": 0.1 * idx}
+                for idx in range(3)
+            ],
+        },
+        {
+            "step": 3,
+            "tool": "web_search",
+            "instruction": "Siemens gearbox temperature sensor datasheet",
+            "result": [
+                {"title": f"Datasheet {idx}", "url": f"https://example.com/{idx}", "snippet": "Příklad ° " * 60}
+                for idx in range(5)
+            ],
+        },
+    ]
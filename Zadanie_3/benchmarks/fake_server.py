@@ -0,0 +1,35 @@
+"""`web_app` served by uvicorn, with the agent graph wired to the stand-ins in `fakes.py`.
+
+    python -m benchmarks.fake_server --port 8011
+
+Used by `benchmarks.loadtest --fake` to measure the API and graph overhead alone.
+"""
+
+import argparse
+import logging
+import os
+
+import uvicorn
+
+from benchmarks.fakes import OFFLINE_ENV, create_fake_graph
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="web_app with offline stand-ins for Ollama/Chroma/Postgres/Tavily.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--log-level", default="ERROR", help="agent log level (plan warnings are frequent)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper())
+    os.environ.update(OFFLINE_ENV)
+    import web_app
+
+    graph = create_fake_graph(web_app.get_memory_writer(), sessions=web_app.get_session_store())
+    # The chat endpoints look the graph up on every request.
+    web_app.get_app_graph = lambda: graph  # type: ignore[assignment]
+    uvicorn.run(web_app.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
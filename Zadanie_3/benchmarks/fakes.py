@@ -0,0 +1,166 @@
+"""In-process stand-ins for Ollama, Postgres, Chroma and Tavily.
+
+They answer instantly with fixed data, so a graph run measures only the code in this
+repository (LangGraph wiring, planning, execution, compaction, prompt building).
+"""
+
+import hashlib
+import itertools
+import json
+import os
+from typing import Any, AsyncIterator, Iterator
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from benchmarks.corpus import planner_outputs
+from graph import create_agent_graph
+from memory_writer import BackgroundMemoryWriter
+from sessions import SessionStore
+
+# Fixed configuration for offline runs, independent of the local .env.
+OFFLINE_ENV = {
+    "ANSWER_CACHE_ENABLED": "false",
+    "PLAN_CACHE_ENABLED": "false",
+    "FAST_PLANNER_ENABLED": "false",
+    "PLANNER_INLINE_SQL": "true",
+    "RAG_PREFETCH_ENABLED": "true",
+    "COMPACTION_ENABLED": "true",
+    "RESPONSE_TEMPLATES_ENABLED": "true",
+    "OLLAMA_MAX_CONCURRENCY": "0",
+    "MEMORY_QUEUE_PATH": "",
+}
+
+_SQL_RESULT = {
+    "columns": ["tag", "avg_value", "max_value", "unit"],
+    "rows": [["TempGearbox_C", 63.12, 71.5, "°C"], ["TempMotor_C", 58.4, 66.0, "°C"]],
+    "row_count": 2,
+    "generated_sql": "SELECT tag, AVG(value) AS avg_value, MAX(value) AS max_value, unit FROM telemetry "
+    "WHERE machine_id='LNK-01' AND ts >= now() - interval '8 hours' GROUP BY tag, unit",
+    "sql_backend": "native",
+}
+_ANSWER = (
+    "Over the last 8 hours LNK-01 averaged 63.12 °C on the gearbox (max 71.5 °C) and 58.4 °C on the motor "
+    "(max 66.0 °C). Both are within the SOP limits. Source: telemetry database (SQL)."
+)
+
+
+class FakeChatModel:
+    """Replays recorded planner outputs and returns a fixed answer for every other prompt."""
+
+    def __init__(self) -> None:
+        self._plans = itertools.cycle(planner_outputs())
+
+    def _reply(self, prompt: Any) -> str:
+        text = prompt if isinstance(prompt, str) else str(prompt)
+        if "You are a planning agent" in text:
+            return next(self._plans)
+        if '"memories"' in text:
+            return json.dumps({"memories": []})
+        return _ANSWER
+
+    def invoke(self, prompt: Any, *args: Any, **kwargs: Any) -> AIMessage:
+        return AIMessage(content=self._reply(prompt))
+
+    async def ainvoke(self, prompt: Any, *args: Any, **kwargs: Any) -> AIMessage:
+        return self.invoke(prompt)
+
+    def stream(self, prompt: Any, *args: Any, **kwargs: Any) -> Iterator[AIMessageChunk]:
+        for word in self._reply(prompt).split(" "):
+            yield AIMessageChunk(content=word + " ")
+
+    async def astream(self, prompt: Any, *args: Any, **kwargs: Any) -> AsyncIterator[AIMessageChunk]:
+        for chunk in self.stream(prompt):
+            yield chunk
+
+
+def fake_embedding(text: str, dim: int = 64) -> list[float]:
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [(digest[idx % len(digest)] - 128) / 128 for idx in range(dim)]
+
+
+class FakeSQLTool:
+    active_backend = "native"
+
+    def run(self, instruction: str, sql: str | None = None) -> dict[str, Any]:
+        return dict(_SQL_RESULT)
+
+    async def arun(self, instruction: str, sql: str | None = None) -> dict[str, Any]:
+        return self.run(instruction, sql=sql)
+
+    def run_uncached(self, sql: str) -> dict[str, Any]:
+        return dict(_SQL_RESULT)
+
+    async def arun_uncached(self, sql: str) -> dict[str, Any]:
+        return self.run_uncached(sql)
+
+
+class FakeRAGTool:
+    def embed(self, text: str) -> list[float]:
+        return fake_embedding(text)
+
+    async def aembed(self, text: str) -> list[float]:
+        return self.embed(text)
+
+    def kb_version(self) -> str:
+        return "bench"
+
+    async def akb_version(self) -> str:
+        return self.kb_version()
+
+    def search(self, query: str, n_results: int = 3) -> list[dict[str, Any]]:
+        return [
+            {
+                "document": f"SOP {idx}: check oil level, cooling fan and bearings before restarting.",
+                "metadata": {"source": f"sop_{idx}.md"},
+                "distance": 0.1 * idx,
+            }
+            for idx in range(n_results)
+        ]
+
+    async def asearch(self, query: str, n_results: int = 3) -> list[dict[str, Any]]:
+        return self.search(query, n_results=n_results)
+
+
+class FakeMemoryTool:
+    def __init__(self) -> None:
+        self.version = 0
+
+    def search_memories(self, query: str, n_results: int = 4) -> list[dict[str, Any]]:
+        return [{"text": "User prefers temperatures in Celsius.", "metadata": {}, "distance": 0.2}]
+
+    async def asearch_memories(self, query: str, n_results: int = 4) -> list[dict[str, Any]]:
+        return self.search_memories(query, n_results=n_results)
+
+    def save_memory(self, text: str, metadata: dict[str, Any] | None = None) -> str:
+        self.version += 1
+        return f"bench-{self.version}"
+
+    async def asave_memory(self, text: str, metadata: dict[str, Any] | None = None) -> str:
+        return self.save_memory(text, metadata)
+
+    def save_memories(self, items: list[tuple[str, dict[str, Any]]]) -> list[str]:
+        return [self.save_memory(text, metadata) for text, metadata in items]
+
+
+class FakeWebSearchTool:
+    active_backend = "native"
+
+    def search(self, query: str, vendor: str | None = None) -> list[dict[str, Any]]:
+        return [{"title": "Datasheet", "url": "https://example.com/datasheet", "snippet": "Rated 0-120 °C."}]
+
+    async def asearch(self, query: str, vendor: str | None = None) -> list[dict[str, Any]]:
+        return self.search(query, vendor=vendor)
+
+
+def create_fake_graph(memory_writer: BackgroundMemoryWriter, sessions: SessionStore | None = None):
+    """The agent graph with every external service replaced by the stand-ins above."""
+    os.environ.update(OFFLINE_ENV)
+    return create_agent_graph(
+        FakeChatModel(),  # type: ignore[arg-type]
+        memory_writer=memory_writer,
+        sessions=sessions,
+        sql_tool=FakeSQLTool(),  # type: ignore[arg-type]
+        rag_tool=FakeRAGTool(),  # type: ignore[arg-type]
+        memory_tool=FakeMemoryTool(),  # type: ignore[arg-type]
+        web_search_tool=FakeWebSearchTool(),  # type: ignore[arg-type]
+    )
@@ -0,0 +1,317 @@
+"""Concurrency load generator for the `/chat` API.
+
+    python -m benchmarks.loadtest --fake --concurrency 1,8,32 --duration 20
+    python -m benchmarks.loadtest --url http://localhost:8001 --concurrency 4 --rate 0.5,1 --requests 100
+    python -m benchmarks.loadtest --fake --output run2.json --compare run1.json
+
+Every (concurrency, rate) pair is one level. With `--rate 0` (default) each of the
+`concurrency` operators sends its next question as soon as the previous answer arrives.
+With a rate, questions arrive as a Poisson process at that many requests per second, at
+most `concurrency` in flight; latency is then measured from the scheduled arrival, so
+time spent queued behind a saturated server counts.
+
+`--fake` starts `benchmarks.fake_server` (web_app with in-process stand-ins for Ollama,
+Chroma, Postgres and Tavily), so only the API and graph overhead is measured.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+DEFAULT_QUESTIONS = Path(__file__).resolve().parent / "data" / "questions.txt"
+# web_app answers backend failures with HTTP 200 and this diagnostic (see web_app.chat).
+_UNAVAILABLE_PREFIX = "The assistant is temporarily unavailable"
+
+
+def _float_list(raw: str) -> list[float]:
+    return [float(item) for item in raw.split(",") if item.strip()]
+
+
+def _int_list(raw: str) -> list[int]:
+    return [int(item) for item in raw.split(",") if item.strip()]
+
+
+def load_questions(path: Path) -> list[str]:
+    lines = path.read_text(encoding="utf-8").splitlines()
+    questions = [line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")]
+    if not questions:
+        raise ValueError(f"No questions in {path}")
+    return questions
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Linear-interpolated percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+class Level:
+    """Requests of one (concurrency, rate) level and their outcomes."""
+
+    def __init__(self, concurrency: int, rate: float) -> None:
+        self.concurrency = concurrency
+        self.rate = rate
+        self.latencies: list[float] = []
+        self.errors: dict[str, int] = {}
+        self.started = 0.0
+        self.finished = 0.0
+
+    def record(self, latency: float, error: str | None) -> None:
+        if error is None:
+            self.latencies.append(latency)
+        else:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+    def report(self) -> dict[str, Any]:
+        latencies = sorted(self.latencies)
+        errors = sum(self.errors.values())
+        total = len(latencies) + errors
+        elapsed = max(self.finished - self.started, 1e-9)
+        return {
+            "concurrency": self.concurrency,
+            "rate": self.rate,
+            "requests": total,
+            "errors": errors,
+            "error_rate": errors / total if total else 0.0,
+            "error_kinds": dict(self.errors),
+            "throughput_rps": len(latencies) / elapsed,
+            "duration_s": elapsed,
+            "latency_ms": {
+                "p50": 1000 * percentile(latencies, 50),
+                "p95": 1000 * percentile(latencies, 95),
+                "p99": 1000 * percentile(latencies, 99),
+                "mean": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+                "max": 1000 * latencies[-1] if latencies else 0.0,
+            },
+        }
+
+
+class LoadTest:
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        questions: list[str],
+        requests_per_level: int,
+        duration: float,
+        reuse_sessions: bool,
+        seed: int,
+    ) -> None:
+        self.client = client
+        self.questions = questions
+        self.requests_per_level = requests_per_level
+        self.duration = duration
+        self.reuse_sessions = reuse_sessions
+        self.rng = random.Random(seed)
+        self._next_question = 0
+
+    def _question(self) -> str:
+        question = self.questions[self._next_question % len(self.questions)]
+        self._next_question += 1
+        return question
+
+    async def _send(self, level: Level, started: float, session: dict[str, str | None]) -> None:
+        payload: dict[str, Any] = {"message": self._question()}
+        if self.reuse_sessions and session.get("id"):
+            payload["session_id"] = session["id"]
+        error: str | None = None
+        try:
+            response = await self.client.post("/chat", json=payload)
+            if response.status_code != 200:
+                error = f"http_{response.status_code}"
+            else:
+                body = response.json()
+                session["id"] = body.get("session_id")
+                if str(body.get("answer", "")).startswith(_UNAVAILABLE_PREFIX):
+                    error = "backend_unavailable"
+        except httpx.TimeoutException:
+            error = "timeout"
+        except httpx.HTTPError as exc:
+            error = type(exc).__name__
+        level.record(time.perf_counter() - started, error)
+
+    def _more(self, sent: int, level: Level) -> bool:
+        if self.requests_per_level > 0:
+            return sent < self.requests_per_level
+        return time.perf_counter() - level.started < self.duration
+
+    async def _closed_loop(self, level: Level) -> None:
+        sent = 0
+
+        async def operator() -> None:
+            nonlocal sent
+            session: dict[str, str | None] = {}
+            while self._more(sent, level):
+                sent += 1
+                await self._send(level, time.perf_counter(), session)
+
+        await asyncio.gather(*(operator() for _ in range(level.concurrency)))
+
+    async def _open_loop(self, level: Level) -> None:
+        sent = 0
+        in_flight = asyncio.Semaphore(level.concurrency)
+        sessions: list[dict[str, str | None]] = [{} for _ in range(level.concurrency)]
+        tasks: list[asyncio.Task[None]] = []
+        next_arrival = time.perf_counter()
+
+        async def arrive(scheduled: float, session: dict[str, str | None]) -> None:
+            async with in_flight:
+                await self._send(level, scheduled, session)
+
+        while self._more(sent, level):
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(arrive(next_arrival, sessions[sent % len(sessions)])))
+            sent += 1
+            next_arrival += self.rng.expovariate(level.rate)
+        await asyncio.gather(*tasks)
+
+    async def run_level(self, concurrency: int, rate: float) -> dict[str, Any]:
+        level = Level(concurrency, rate)
+        level.started = time.perf_counter()
+        if rate > 0:
+            await self._open_loop(level)
+        else:
+            await self._closed_loop(level)
+        level.finished = time.perf_counter()
+        return level.report()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_fake_server() -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_server", "--port", str(port)],
+        cwd=str(Path(__file__).resolve().parents[1]),
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Fake server exited with code {proc.returncode}")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return proc, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("Fake server did not become healthy within 60s")
+
+
+def print_report(levels: list[dict[str, Any]], previous: list[dict[str, Any]] | None) -> None:
+    baseline = {(lvl["concurrency"], lvl["rate"]): lvl for lvl in previous or []}
+    print(
+        f"{'conc':>5} {'rate':>6} {'reqs':>6} {'err%':>6} {'rps':>8} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}" + ("  vs previous (p95, rps)" if previous else "")
+    )
+    for lvl in levels:
+        lat = lvl["latency_ms"]
+        line = (
+            f"{lvl['concurrency']:>5} {lvl['rate'] or '-':>6} {lvl['requests']:>6} {100 * lvl['error_rate']:>5.1f}% "
+            f"{lvl['throughput_rps']:>8.2f} {lat['p50']:>9.1f} {lat['p95']:>9.1f} {lat['p99']:>9.1f}"
+        )
+        before = baseline.get((lvl["concurrency"], lvl["rate"]))
+        if before is not None:
+            p95_before = before["latency_ms"]["p95"]
+            rps_before = before["throughput_rps"]
+            line += (
+                f"  p95 x{lat['p95'] / p95_before:.2f}" if p95_before else "  p95 -"
+            ) + (f", rps x{lvl['throughput_rps'] / rps_before:.2f}" if rps_before else ", rps -")
+        print(line)
+
+
+async def run(args: argparse.Namespace, url: str) -> list[dict[str, Any]]:
+    questions = load_questions(args.questions)
+    max_concurrency = max(args.concurrency)
+    limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        test = LoadTest(client, questions, args.requests, args.duration, args.reuse_sessions, args.seed)
+        if args.warmup:
+            await LoadTest(client, questions, args.warmup, 0, False, args.seed).run_level(1, 0.0)
+        levels = []
+        for concurrency in args.concurrency:
+            for rate in args.rate:
+                report = await test.run_level(concurrency, rate)
+                levels.append(report)
+                print(
+                    f"concurrency={concurrency} rate={rate or 'closed'}: {report['requests']} requests, "
+                    f"p95 {report['latency_ms']['p95']:.1f} ms, {report['throughput_rps']:.2f} rps"
+                )
+        return levels
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load generator for the /chat API.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="base URL of a running web_app, e.g. http://localhost:8001")
+    target.add_argument("--fake", action="store_true", help="start web_app with offline stand-ins and test it")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 4, 16], help="comma-separated levels")
+    parser.add_argument("--rate", type=_float_list, default=[0.0], help="comma-separated req/s; 0 = closed loop")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per level")
+    parser.add_argument("--requests", type=int, default=0, help="requests per level (overrides --duration)")
+    parser.add_argument("--warmup", type=int, default=5, help="sequential requests before the first level")
+    parser.add_argument("--timeout", type=float, default=180.0, help="per-request timeout in seconds")
+    parser.add_argument("--questions", type=Path, default=DEFAULT_QUESTIONS, help="question corpus, one per line")
+    parser.add_argument("--reuse-sessions", action="store_true", help="keep one session per operator")
+    parser.add_argument("--seed", type=int, default=7, help="seed for Poisson arrivals")
+    parser.add_argument("--output", type=Path, help="write the report to this JSON file")
+    parser.add_argument("--compare", type=Path, help="previous report to compare with")
+    args = parser.parse_args()
+
+    server: subprocess.Popen | None = None
+    url = args.url
+    if args.fake:
+        server, url = start_fake_server()
+    try:
+        levels = asyncio.run(run(args, url))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    previous = json.loads(args.compare.read_text(encoding="utf-8"))["levels"] if args.compare else None
+    print()
+    print_report(levels, previous)
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "target": "fake" if args.fake else url,
+            "questions": str(args.questions),
+            "duration_s": args.duration,
+            "requests_per_level": args.requests,
+            "reuse_sessions": args.reuse_sessions,
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "levels": levels,
+    }
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""Run the offline micro-benchmarks and compare them with the stored baseline.
+
+    python -m benchmarks.run                     # compare with benchmarks/baseline.json
+    python -m benchmarks.run --update-baseline   # record a new baseline
+    python -m benchmarks.run --only graph --threshold 0.5
+
+Each benchmark sample is paired with a fixed calibration workload timed right before it, and
+a benchmark's cost is the median ratio of the two. Exits with status 1 when that cost is higher
+than the baseline's by more than the threshold (0.25 = 25% slower), so a slower or busier host
+does not read as a regression. `--raw` compares best (fastest sample) times instead.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+from benchmarks import corpus
+from benchmarks.fakes import create_fake_graph
+from compaction import ResultCompactor
+from graph import _validate_plan
+from memory_writer import BackgroundMemoryWriter
+from tools.llm_json import safe_json_parse
+from tools.sql_tool import extract_sql, is_read_only_sql
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+_QUERIES = [
+    "What was the average gearbox temperature on LNK-01 over the last 8 hours?",
+    "Show E204 alarms from the last 24 hours and what to do about them.",
+    "Remember that I prefer temperatures in Celsius.",
+    "Is the Siemens 6SL3210 drive compatible with our motor?",
+]
+
+
+_CALIBRATION_DATA = [{"id": idx, "name": f"tag-{idx}", "values": list(range(idx % 17))} for idx in range(400)]
+_CALIBRATION_RE = re.compile(r"tag-(\d+)")
+
+
+def _calibration() -> Any:
+    """Fixed interpreter workload (JSON, regex, dicts, sorting) that tracks host speed."""
+    text = json.dumps(_CALIBRATION_DATA)
+    ids = sorted((int(m) for m in _CALIBRATION_RE.findall(text)), reverse=True)
+    totals: dict[int, int] = {}
+    for item in json.loads(text):
+        totals[item["id"] % 13] = totals.get(item["id"] % 13, 0) + sum(item["values"])
+    return ids, totals
+
+
+def _benchmarks() -> tuple[dict[str, Callable[[], Any]], Callable[[], None]]:
+    """Benchmark name -> zero-argument callable, plus a cleanup callback."""
+    sql = corpus.sql_corpus()
+    fenced = corpus.fenced_sql_corpus()
+    raw_plans = corpus.planner_outputs()
+    parsed_plans = [(safe_json_parse(raw) or {}).get("plan") for raw in raw_plans]
+    tool_results = corpus.large_tool_results()
+    compactor = ResultCompactor()
+
+    memory_writer = BackgroundMemoryWriter(queue_path=None)
+    app = create_fake_graph(memory_writer)
+    loop = asyncio.new_event_loop()
+    turn = iter(range(sys.maxsize))
+
+    def graph_invoke() -> Any:
+        return app.invoke({"user_query": _QUERIES[next(turn) % len(_QUERIES)]})
+
+    def graph_ainvoke() -> Any:
+        return loop.run_until_complete(app.ainvoke({"user_query": _QUERIES[next(turn) % len(_QUERIES)]}))
+
+    def cleanup() -> None:
+        memory_writer.stop()
+        loop.close()
+
+    benchmarks: dict[str, Callable[[], Any]] = {
+        f"is_read_only_sql[{len(sql)}]": lambda: [is_read_only_sql(q) for q in sql],
+        f"extract_sql[{len(fenced)}]": lambda: [extract_sql(text) for text in fenced],
+        f"safe_json_parse[{len(raw_plans)}]": lambda: [safe_json_parse(raw) for raw in raw_plans],
+        f"validate_plan[{len(parsed_plans)}]": lambda: [
+            _validate_plan(plan, fallback_instruction="fallback", inline_sql=True) for plan in parsed_plans
+        ],
+        "json_dumps_tool_results": lambda: json.dumps(tool_results, ensure_ascii=False),
+        "compact_tool_results": lambda: compactor.compact(_QUERIES[0], tool_results),
+        "graph_invoke": graph_invoke,
+        "graph_ainvoke": graph_ainvoke,
+    }
+    return benchmarks, cleanup
+
+
+def _timed(func: Callable[[], Any], number: int) -> float:
+    started = time.perf_counter()
+    for _ in range(number):
+        func()
+    return time.perf_counter() - started
+
+
+def _number(func: Callable[[], Any], min_time: float) -> int:
+    """Calls per sample so that one sample takes at least `min_time` seconds."""
+    func()  # warm-up
+    number = 1
+    while (elapsed := _timed(func, number)) < min_time:
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    return number
+
+
+def measure(func: Callable[[], Any], repeat: int, min_time: float) -> dict[str, Any]:
+    """Per-call timings in microseconds over `repeat` samples of at least `min_time` seconds.
+
+    Each sample follows a short calibration sample; `relative` is the median ratio of the two,
+    i.e. the cost in calibration units, which holds when the host is slower or busy.
+    """
+    number = _number(func, min_time)
+    calibration_number = _number(_calibration, min_time / 4)
+    samples: list[float] = []
+    calibrations: list[float] = []
+    for _ in range(repeat):
+        calibrations.append(_timed(_calibration, calibration_number) / calibration_number)
+        samples.append(_timed(func, number) / number)
+    return {
+        "number": number,
+        "median_us": round(statistics.median(samples) * 1e6, 3),
+        "min_us": round(min(samples) * 1e6, 3),
+        "max_us": round(max(samples) * 1e6, 3),
+        "calibration_us": round(statistics.median(calibrations) * 1e6, 3),
+        "relative": round(statistics.median(t / c for t, c in zip(samples, calibrations)), 4),
+    }
+
+
+def compare(
+    results: dict[str, dict[str, Any]],
+    baseline: dict[str, dict[str, Any]],
+    threshold: float,
+    calibrate: bool = True,
+) -> list[str]:
+    """Print a results table and return the names of regressed benchmarks.
+
+    `host` is this run's calibration time over the baseline's (>1: slower host right now).
+    """
+    regressions: list[str] = []
+    print(f"{'benchmark':32} {'best':>12} {'baseline':>12} {'host':>6} {'ratio':>7}  status")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:32} {result['min_us']:>10.1f}us {'-':>12} {'-':>6} {'-':>7}  new")
+            continue
+        if calibrate and result.get("relative") and base.get("relative"):
+            factor = result["calibration_us"] / base["calibration_us"]
+            ratio = result["relative"] / base["relative"]
+        else:
+            factor = 1.0
+            ratio = result["min_us"] / base["min_us"] if base["min_us"] else float("inf")
+        status = "ok"
+        if ratio > 1 + threshold:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            status = "faster"
+        print(f"{name:32} {result['min_us']:>10.1f}us {base['min_us']:>10.1f}us {factor:>6.2f} {ratio:>7.2f}  {status}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline micro-benchmarks for Zadanie_3 hot paths.")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=float(os.getenv("BENCH_REGRESSION_THRESHOLD", "0.25")),
+        help="allowed slowdown vs. baseline as a fraction (default: BENCH_REGRESSION_THRESHOLD or 0.25)",
+    )
+    parser.add_argument("--repeat", type=int, default=7, help="samples per benchmark")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per sample")
+    parser.add_argument("--only", default="", help="run benchmarks whose name contains this text")
+    parser.add_argument("--output", type=Path, help="also write this run's results to a JSON file")
+    parser.add_argument("--raw", action="store_true", help="compare best times, not calibration-relative costs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "ERROR").upper())
+    benchmarks, cleanup = _benchmarks()
+    results: dict[str, dict[str, Any]] = {}
+    try:
+        for name, func in benchmarks.items():
+            if args.only in name:
+                results[name] = measure(func, repeat=max(1, args.repeat), min_time=args.min_time)
+    finally:
+        cleanup()
+
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "min_time": args.min_time,
+        },
+        "results": results,
+    }
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+    if args.update_baseline or not args.baseline.exists():
+        if args.baseline.exists() and args.only:
+            # Keep the entries of benchmarks that were not run.
+            previous = json.loads(args.baseline.read_text(encoding="utf-8"))
+            report["results"] = {**previous.get("results", {}), **results}
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        compare(results, {}, args.threshold)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    if baseline.get("meta", {}).get("python") != platform.python_version():
+        print(f"Note: baseline was recorded on Python {baseline.get('meta', {}).get('python')}.")
+    if not args.raw and not all("relative" in base for base in baseline.get("results", {}).values()):
+        print("Note: baseline has no calibration times; re-record it with --update-baseline on this host.")
+    regressions = compare(results, baseline.get("results", {}), args.threshold, calibrate=not args.raw)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than baseline by more than {args.threshold:.0%}: "
+              + ", ".join(regressions))
+        return 1
+    print(f"No regressions (threshold {args.threshold:.0%}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
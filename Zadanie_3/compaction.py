@@ -0,0 +1,305 @@
+"""Token-budgeted compaction of tool results before they go into the respond prompt."""
+
+import json
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+from urllib.parse import urlsplit
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_TIME_COLUMNS = {"ts", "time", "timestamp", "bucket", "created_at"}
+_WORD_RE = re.compile(r"[a-z0-9_]{3,}")
+# Document sections kept regardless of relevance so a trimmed SOP still says what it is.
+_ALWAYS_KEEP_SECTIONS = ("title", "summary")
+# (head/tail rows, characters per KB document, characters per web snippet), loosest first.
+_LEVELS = ((5, 1200, 400), (3, 600, 240), (1, 300, 120))
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly 4 characters per token for English text and JSON with Llama/Qwen tokenizers.
+    return (len(text) + 3) // 4
+
+
+def dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _as_number(value: Any) -> float | None:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float, Decimal)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+def _as_time(value: Any) -> datetime | None:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+
+def _round(value: float) -> float:
+    return round(value, 4)
+
+
+def _trend(values: list[float]) -> dict[str, Any]:
+    """Direction of a least-squares line through the values, in the given (time) order."""
+    if len(values) < 3:
+        return {"direction": "n/a"}
+    y = np.asarray(values, dtype=np.float64)
+    slope = float(np.polyfit(np.arange(len(y)), y, 1)[0])
+    change = slope * (len(y) - 1)
+    scale = max(abs(float(y.mean())), float(y.std()), 1e-9)
+    direction = "flat"
+    if change / scale > 0.05:
+        direction = "rising"
+    elif change / scale < -0.05:
+        direction = "falling"
+    return {"direction": direction, "change": _round(change)}
+
+
+def _numeric_summary(values: list[float]) -> dict[str, Any]:
+    return {
+        "first": _round(values[0]),
+        "last": _round(values[-1]),
+        "min": _round(min(values)),
+        "max": _round(max(values)),
+        "avg": _round(sum(values) / len(values)),
+        "trend": _trend(values),
+    }
+
+
+def _time_ordered(rows: list[Any], idx: int) -> list[Any]:
+    """Rows sorted by the time in column `idx`; rows without a time go last."""
+    timed = [(t, pos) for pos, t in enumerate(_as_time(row[idx]) if idx < len(row) else None for row in rows)]
+    try:
+        order = sorted(item for item in timed if item[0] is not None)
+    except TypeError:  # naive and aware timestamps mixed; keep the result order
+        return rows
+    return [rows[pos] for _, pos in order] + [rows[pos] for t, pos in timed if t is None]
+
+
+def summarize_rows(result: dict[str, Any], head_rows: int, tail_rows: int) -> dict[str, Any]:
+    """Replace a large SQL row set with column statistics, head/tail rows and trends."""
+    rows = result.get("rows") or []
+    columns = result.get("columns") or []
+    if len(rows) <= head_rows + tail_rows or not columns:
+        return result
+
+    cells = {col: [row[idx] for row in rows if idx < len(row) and row[idx] is not None] for idx, col in enumerate(columns)}
+    numeric: list[str] = []
+    time_col: str | None = None
+    categorical: list[str] = []
+    stats: dict[str, Any] = {}
+    for col, values in cells.items():
+        if not values:
+            stats[col] = {"nulls": len(rows)}
+            continue
+        numbers = [_as_number(v) for v in values]
+        if all(n is not None for n in numbers) and col.lower() not in _TIME_COLUMNS:
+            numeric.append(col)
+            floats = [n for n in numbers if n is not None]
+            stats[col] = {"min": _round(min(floats)), "max": _round(max(floats)), "avg": _round(sum(floats) / len(floats))}
+            continue
+        times = [_as_time(v) for v in values]
+        if all(t is not None for t in times):
+            time_col = time_col or col
+            stats[col] = {"first": str(values[0]), "last": str(values[-1])}
+            continue
+        counts = Counter(str(v) for v in values)
+        categorical.append(col)
+        stats[col] = {"distinct": len(counts), "top": [value for value, _ in counts.most_common(5)]}
+
+    col_idx = {col: idx for idx, col in enumerate(columns)}
+    # first/last/trend follow time, not the result order (e.g. ORDER BY ts DESC).
+    ordered = rows
+    if time_col:
+        ordered = _time_ordered(rows, col_idx[time_col])
+        times = [row[col_idx[time_col]] for row in ordered if row[col_idx[time_col]] is not None]
+        stats[time_col] = {"first": str(times[0]), "last": str(times[-1])}
+
+    # Long-format results (ts, tag, value) only trend meaningfully per tag.
+    group_col = next((col for col in categorical if 1 < stats[col]["distinct"] <= 12), None)
+    trends: dict[str, Any] = {}
+    if numeric:
+        groups: dict[str, list[tuple[Any, ...]]] = {}
+        for row in ordered:
+            key = str(row[col_idx[group_col]]) if group_col else "all"
+            groups.setdefault(key, []).append(row)
+        for key, group_rows in groups.items():
+            per_col = {}
+            for col in numeric:
+                values = [n for n in (_as_number(r[col_idx[col]]) for r in group_rows) if n is not None]
+                if values:
+                    per_col[col] = _numeric_summary(values)
+            trends[key] = {"rows": len(group_rows), **per_col}
+
+    compacted = {
+        key: value for key, value in result.items() if key not in {"rows", "columns", "row_count"}
+    }
+    compacted.update(
+        {
+            "columns": columns,
+            "row_count": len(rows),
+            "summarized": True,
+            "column_stats": stats,
+            "trends_by": group_col or ("time" if time_col else "row order"),
+            "trends": trends,
+            "head": rows[:head_rows],
+            "tail": rows[-tail_rows:] if tail_rows else [],
+        }
+    )
+    if time_col:
+        compacted["time_column"] = time_col
+    return compacted
+
+
+def _terms(text: str) -> set[str]:
+    return set(_WORD_RE.findall(text.lower()))
+
+
+def trim_document(document: str, query_terms: set[str], max_chars: int) -> str:
+    """Keep the title/summary and the sections sharing most terms with the query."""
+    if len(document) <= max_chars:
+        return document
+    sections = [line for line in document.splitlines() if line.strip()]
+    keep: list[int] = [idx for idx, line in enumerate(sections) if line.startswith(_ALWAYS_KEEP_SECTIONS)]
+    ranked = sorted(
+        (idx for idx in range(len(sections)) if idx not in keep),
+        key=lambda idx: -len(_terms(sections[idx]) & query_terms),
+    )
+    budget = max_chars - sum(len(sections[idx]) + 1 for idx in keep)
+    for idx in ranked:
+        if budget < 80:
+            break
+        if len(sections[idx]) + 1 > budget:
+            # Shorten the section instead of letting the final cut drop a more relevant one.
+            sections[idx] = sections[idx][: budget - 4] + "..."
+        keep.append(idx)
+        budget -= len(sections[idx]) + 1
+    text = "\n".join(sections[idx] for idx in sorted(keep))
+    return text if len(text) <= max_chars else text[: max_chars - 3] + "..."
+
+
+def trim_documents(matches: list[dict[str, Any]], query: str, max_chars: int) -> list[dict[str, Any]]:
+    query_terms = _terms(query)
+    seen: set[str] = set()
+    trimmed: list[dict[str, Any]] = []
+    for match in matches:
+        document = str(match.get("document") or match.get("text") or "")
+        if document in seen:
+            continue
+        seen.add(document)
+        item = dict(match)
+        item["document" if "document" in match else "text"] = trim_document(document, query_terms, max_chars)
+        trimmed.append(item)
+    return trimmed
+
+
+def _url_key(url: str) -> str:
+    parts = urlsplit(url.strip().lower())
+    return f"{parts.netloc.removeprefix('www.')}{parts.path.rstrip('/')}"
+
+
+def dedupe_snippets(rows: list[dict[str, Any]], max_chars: int) -> list[dict[str, Any]]:
+    """Drop repeated URLs and near-identical snippets, and cap snippet length."""
+    kept: list[dict[str, Any]] = []
+    seen_urls: set[str] = set()
+    seen_terms: list[set[str]] = []
+    for row in rows:
+        url_key = _url_key(str(row.get("url", "")))
+        if url_key and url_key in seen_urls:
+            continue
+        snippet = str(row.get("snippet", ""))
+        terms = _terms(snippet)
+        if terms and any(len(terms & other) / len(terms | other) >= 0.8 for other in seen_terms):
+            continue
+        seen_urls.add(url_key)
+        seen_terms.append(terms)
+        item = dict(row)
+        if len(snippet) > max_chars:
+            item["snippet"] = snippet[: max_chars - 3] + "..."
+        kept.append(item)
+    return kept
+
+
+class ResultCompactor:
+    def __init__(self, token_budget: int = 1500) -> None:
+        self.token_budget = token_budget
+        self._lock = threading.Lock()
+        self._turns = 0
+        self._compacted_turns = 0
+        self._tokens_before = 0
+        self._tokens_saved = 0
+
+    def _compact_entry(self, entry: dict[str, Any], query: str, level: tuple[int, int, int]) -> dict[str, Any]:
+        head_rows, doc_chars, snippet_chars = level
+        result = entry.get("result")
+        tool = entry.get("tool")
+        if tool == "sql_query" and isinstance(result, dict):
+            result = summarize_rows(result, head_rows, head_rows)
+        elif tool in {"rag_search", "memory_search"} and isinstance(result, list):
+            result = trim_documents(result, f"{query} {entry.get('instruction', '')}", doc_chars)
+        elif tool == "web_search" and isinstance(result, list):
+            result = dedupe_snippets(result, snippet_chars)
+        else:
+            return entry
+        return {**entry, "result": result}
+
+    def compact(self, query: str, tool_results: list[dict[str, Any]]) -> tuple[str, dict[str, int]]:
+        """Return the tool results as prompt text within the budget, plus token accounting.
+
+        Results that already fit are passed through untouched; otherwise each level
+        compacts harder until the text fits or the tightest level is reached.
+        """
+        text = dumps(tool_results)
+        before = after = estimate_tokens(text)
+        if before > self.token_budget:
+            for level in _LEVELS:
+                text = dumps([self._compact_entry(entry, query, level) for entry in tool_results])
+                after = estimate_tokens(text)
+                if after <= self.token_budget:
+                    break
+        report = {"tokens_before": before, "tokens_after": after, "tokens_saved": before - after}
+        with self._lock:
+            self._turns += 1
+            self._compacted_turns += int(after < before)
+            self._tokens_before += before
+            self._tokens_saved += before - after
+        return text, report
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "turns": self._turns,
+                "compacted_turns": self._compacted_turns,
+                "tokens_before": self._tokens_before,
+                "tokens_saved": self._tokens_saved,
+                "saved_ratio": self._tokens_saved / self._tokens_before if self._tokens_before else 0.0,
+            }
+
+
+def result_compactor_from_env() -> ResultCompactor | None:
+    if os.getenv("COMPACTION_ENABLED", "true").lower() != "true":
+        return None
+    return ResultCompactor(token_budget=int(os.getenv("COMPACTION_TOKEN_BUDGET", "1500")))
@@ -0,0 +1,166 @@
+"""Rule-based pre-planner that answers recognizable queries without an LLM call."""
+
+import logging
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from tools.telemetry_schema import (
+    ALARM_CODE_RE,
+    DEFAULT_MACHINE_ID,
+    MACHINE_ID_RE,
+    find_tags,
+    find_time_window,
+)
+
+logger = logging.getLogger(__name__)
+
+_RECALL_RE = re.compile(
+    r"\b(what did i (?:tell|say)|what (?:are|were) my|do you (?:remember|know)|recall)\b",
+    re.IGNORECASE,
+)
+_SOP_RE = re.compile(
+    r"\b(sop|procedure|what does|mean|meaning|how (?:do|to|should)|troubleshoot|steps?|fix|resolve)\b",
+    re.IGNORECASE,
+)
+_ALARM_DATA_RE = re.compile(
+    r"\b(when|last (?:time|seen|observed|occurr\w*)|how many|how often|history|occur\w*|count|list)\b",
+    re.IGNORECASE,
+)
+_AGGREGATES = {
+    "average": "AVG",
+    "avg": "AVG",
+    "mean": "AVG",
+    "maximum": "MAX",
+    "max": "MAX",
+    "highest": "MAX",
+    "peak": "MAX",
+    "minimum": "MIN",
+    "min": "MIN",
+    "lowest": "MIN",
+}
+_AGGREGATE_RE = re.compile(r"\b(" + "|".join(_AGGREGATES) + r")\b", re.IGNORECASE)
+# "last 30 min" is a duration, not a MIN aggregate.
+_DURATION_MIN_RE = re.compile(r"\d+\s*mins?\b", re.IGNORECASE)
+_VENDOR_RE = re.compile(r"\b(siemens|datasheet|vendor|manufacturer|simatic|sinamics)\b", re.IGNORECASE)
+# Signals that the question combines intents; those are left to the LLM planner.
+_CORRELATION_RE = re.compile(r"\b(associated|correlat\w*|related|caused?|because|compare|versus|vs)\b", re.IGNORECASE)
+
+
+@dataclass
+class FastPlan:
+    rule: str
+    confidence: float
+    plan: list[dict[str, Any]]
+
+
+class FastPathPlanner:
+    def __init__(
+        self,
+        memory_intent: Callable[[str], bool],
+        min_confidence: float = 0.8,
+        inline_sql: bool = False,
+    ) -> None:
+        self.memory_intent = memory_intent
+        self.min_confidence = min_confidence
+        # Emit ready SQL for templated sql_query steps, skipping the NL->SQL call.
+        self.inline_sql = inline_sql
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._hits = 0
+        self._rule_hits: dict[str, int] = {}
+
+    def _classify(self, query: str) -> FastPlan | None:
+        alarm_codes = sorted({code.upper() for code in ALARM_CODE_RE.findall(query)})
+        tags = find_tags(query)
+        window = find_time_window(query)
+        machine_match = MACHINE_ID_RE.search(query)
+        machine_id = machine_match.group(0).upper() if machine_match else DEFAULT_MACHINE_ID
+        mixed = bool(_CORRELATION_RE.search(query))
+
+        if self.memory_intent(query):
+            if _RECALL_RE.search(query):
+                return FastPlan("memory_recall", 0.9, [{"step": 1, "tool": "memory_search", "instruction": query}])
+            if alarm_codes or tags:
+                return None
+            return FastPlan("memory_write", 0.9, [{"step": 1, "tool": "memory_write", "instruction": query}])
+
+        if alarm_codes and not tags and not mixed:
+            codes = ", ".join(alarm_codes)
+            if _ALARM_DATA_RE.search(query) and not _SOP_RE.search(query):
+                in_list = ", ".join(f"'{code}'" for code in alarm_codes)
+                window_sql = f" and ts >= now() - interval '{window}'" if window else ""
+                instruction = (
+                    f"List alarms from alarms where machine_id='{machine_id}' and alarm_code IN ({in_list})"
+                    f"{window_sql}, ordered by ts DESC, with ts, alarm_code, severity, message, state."
+                )
+                step = {"step": 1, "tool": "sql_query", "instruction": instruction}
+                if self.inline_sql:
+                    step["sql"] = (
+                        "SELECT ts, alarm_code, severity, message, state FROM alarms "
+                        f"WHERE machine_id='{machine_id}' AND alarm_code IN ({in_list}){window_sql} "
+                        "ORDER BY ts DESC"
+                    )
+                return FastPlan("alarm_history", 0.85, [step])
+            if _SOP_RE.search(query) or len(query.split()) <= 6:
+                instruction = f"SOP and troubleshooting procedure for alarm {codes}"
+                return FastPlan("alarm_sop", 0.9, [{"step": 1, "tool": "rag_search", "instruction": instruction}])
+
+        if _VENDOR_RE.search(query):
+            # Vendor questions that also name tags ("max line speed allowed by the drive") are
+            # about the documentation, not our telemetry; mixed ones go to the LLM planner.
+            if alarm_codes or tags:
+                return None
+            return FastPlan("vendor_lookup", 0.85, [{"step": 1, "tool": "web_search", "instruction": query}])
+
+        aggregate = _AGGREGATE_RE.search(_DURATION_MIN_RE.sub(" ", query))
+        if tags and aggregate and window and not alarm_codes and not mixed:
+            func = _AGGREGATES[aggregate.group(1).lower()]
+            tag_list = ", ".join(f"'{tag}'" for tag in tags)
+            instruction = (
+                f"Compute {func}(value) per tag from telemetry where machine_id='{machine_id}', "
+                f"ts >= now() - interval '{window}', and tag IN ({tag_list})."
+            )
+            step = {"step": 1, "tool": "sql_query", "instruction": instruction}
+            if self.inline_sql:
+                step["sql"] = (
+                    f"SELECT tag, {func}(value) AS {func.lower()}_value, unit FROM telemetry "
+                    f"WHERE machine_id='{machine_id}' AND ts >= now() - interval '{window}' AND tag IN ({tag_list}) "
+                    "GROUP BY tag, unit"
+                )
+            return FastPlan("telemetry_aggregate", 0.9, [step])
+
+        return None
+
+    def plan(self, query: str) -> FastPlan | None:
+        """Return a plan when a rule matches with enough confidence, otherwise None."""
+        candidate = self._classify(query)
+        hit = candidate is not None and candidate.confidence >= self.min_confidence
+        with self._lock:
+            self._calls += 1
+            if hit:
+                assert candidate is not None
+                self._hits += 1
+                self._rule_hits[candidate.rule] = self._rule_hits.get(candidate.rule, 0) + 1
+            calls, hits = self._calls, self._hits
+        logger.info(
+            "[PLANNER] fast-path %s rule=%s hit_rate=%.2f (%d/%d LLM planner calls saved)",
+            "hit" if hit else "miss",
+            candidate.rule if candidate else "-",
+            hits / calls,
+            hits,
+            calls,
+        )
+        return candidate if hit else None
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self._calls,
+                "hits": self._hits,
+                "misses": self._calls - self._hits,
+                "hit_rate": self._hits / self._calls if self._calls else 0.0,
+                "llm_calls_saved": self._hits,
+                "rule_hits": dict(self._rule_hits),
+            }
@@ -1,38 +1,144 @@
+import asyncio
+import contextvars
 import json
 import logging
 import os
-from typing import Any, TypedDict
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from typing import Annotated, Any, Callable, TypedDict
 
 from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langgraph.graph import END, START, StateGraph
 
+from answer_cache import DATA_VERSION_SQL, AnswerCache, answer_cache_from_env
+from compaction import result_compactor_from_env
+from fast_planner import FastPathPlanner
+from memory_writer import BackgroundMemoryWriter, memory_writer_from_env
+from metrics import (
+    payload_bytes,
+    record_llm_usage,
+    record_ollama_wait,
+    record_pg_pool_wait,
+    record_span,
+    register_stats,
+)
+from plan_cache import SemanticPlanCache
+from prefetch import RAGPrefetcher
+from response_templates import template_responder_from_env
+from sessions import SessionStore, is_followup
+from tools.deadline import DeadlineExceeded, deadline_scope, remaining
+from tools.downsample import downsampler_from_env
+from tools.embedding_cache import EmbeddingCache
+from tools.llm_json import safe_json_parse
+from tools.llm_usage import add_listener, record_llm_call, summarize_usage, usage_scope
 from tools.memory_tool import LongTermMemoryTool
+from tools.ollama_scheduler import OllamaScheduler, ollama_scheduler_from_env
+from tools.pg_pool import add_wait_listener, pg_pool_stats
 from tools.rag_tool import RAGTool
+from tools.rollup_router import rollup_router_from_env
 from tools.search_tool import WebSearchTool
-from tools.sql_tool import SQLPlannerExecutor
+from tools.sql_result_cache import sql_result_cache_from_env
+from tools.sql_template_cache import sql_template_cache_from_env
+from tools.sql_tool import SQLPlannerExecutor, is_read_only_sql
+from tools.telemetry_schema import find_time_window, replace_time_window
 
 logger = logging.getLogger(__name__)
 
 
+def _add_spans(left: list[dict[str, Any]] | None, right: list[dict[str, Any]] | None) -> list[dict[str, Any]]:
+    # None (sent by begin_turn) starts a new turn instead of appending to the previous one.
+    if right is None:
+        return []
+    return (left or []) + right
+
+
 class AgentState(TypedDict, total=False):
     user_query: str
     memory_context: list[str]
     plan: list[dict[str, Any]]
     tool_results: list[dict[str, Any]]
+    execution_status: dict[str, Any]
     final_answer: str
     trace: list[str]
+    data_fingerprint: dict[str, Any]
+    answer_cache_hit: bool
+    compaction: dict[str, int]
+    # Timing spans of nodes and tool calls; each node appends its own.
+    spans: Annotated[list[dict[str, Any]], _add_spans]
+    prefetch_id: str
+    # Carried across turns of a session: previous turn, memory lookup and tool results.
+    session: dict[str, Any]
+    # Wall-clock time (epoch seconds) by which the turn should be answered.
+    deadline_ts: float | None
+    # Tokens and Ollama timings of every LLM call in the turn, tagged with the calling node.
+    llm_usage: Annotated[list[dict[str, Any]], _add_spans]
 
 
-def _safe_json_parse(raw: str) -> dict[str, Any] | None:
-    text = raw.strip()
-    if "```json" in text:
-        text = text.split("```json", maxsplit=1)[1].split("```", maxsplit=1)[0].strip()
-    elif "```" in text:
-        text = text.split("```", maxsplit=1)[1].split("```", maxsplit=1)[0].strip()
-    try:
-        return json.loads(text)
-    except Exception:
-        return None
+# (tool_results entry, trace line, span) of one executed plan step.
+StepOutcome = tuple[dict[str, Any], str, dict[str, Any]]
+
+
+def _validate_plan(raw_plan: Any, fallback_instruction: str, inline_sql: bool = False) -> list[dict[str, Any]]:
+    """Ensure plan has a safe, minimal shape."""
+    allowed_tools = {"sql_query", "rag_search", "memory_search", "memory_write", "web_search"}
+    if not isinstance(raw_plan, list):
+        return [{"step": 1, "tool": "rag_search", "instruction": fallback_instruction, "depends_on": []}]
+
+    cleaned: list[dict[str, Any]] = []
+    for idx, item in enumerate(raw_plan, start=1):
+        if not isinstance(item, dict):
+            continue
+        tool = str(item.get("tool", "")).strip()
+        instruction = str(item.get("instruction", "")).strip() or fallback_instruction
+        if tool not in allowed_tools:
+            continue
+        step_no = item.get("step")
+        try:
+            step_int = int(step_no)
+        except Exception:
+            step_int = idx
+
+        # Only earlier steps may be referenced, which keeps the plan acyclic.
+        earlier_steps = {c["step"] for c in cleaned}
+        raw_deps = item.get("depends_on") or []
+        if not isinstance(raw_deps, list):
+            raw_deps = [raw_deps]
+        depends_on: list[int] = []
+        for dep in raw_deps:
+            try:
+                dep_int = int(dep)
+            except Exception:
+                continue
+            if dep_int in earlier_steps and dep_int not in depends_on:
+                depends_on.append(dep_int)
+        if tool == "memory_search":
+            # A lookup must observe memories written earlier in the same plan.
+            for c in cleaned:
+                if c["tool"] == "memory_write" and c["step"] not in depends_on:
+                    depends_on.append(c["step"])
+
+        step: dict[str, Any] = {
+            "step": step_int,
+            "tool": tool,
+            "instruction": instruction,
+            "depends_on": depends_on,
+        }
+        sql = item.get("sql")
+        if inline_sql and tool == "sql_query" and isinstance(sql, str) and sql.strip():
+            if is_read_only_sql(sql):
+                step["sql"] = sql.strip().rstrip(";")
+            else:
+                logger.warning("[PLAN] Dropping non read-only SQL from step %s: %s", step_int, sql)
+        cleaned.append(step)
+
+    if not cleaned:
+        cleaned = [{"step": 1, "tool": "rag_search", "instruction": fallback_instruction, "depends_on": []}]
+    if len(cleaned) > 4:
+        cleaned = cleaned[:4]
+    return cleaned
 
 
 def _looks_like_memory_intent(query: str) -> bool:
@@ -47,93 +153,452 @@ def _looks_like_memory_intent(query: str) -> bool:
     return any(k in lowered for k in keywords)
 
 
-def create_agent_graph(llm: BaseChatModel):
+def _emit(config: RunnableConfig | None, event: str, **data: Any) -> None:
+    """Forward a progress event to the caller's `event_sink`, if one was configured."""
+    sink = ((config or {}).get("configurable") or {}).get("event_sink")
+    if sink is not None:
+        sink({"event": event, **data})
+
+
+def _streaming(config: RunnableConfig | None) -> bool:
+    return ((config or {}).get("configurable") or {}).get("event_sink") is not None
+
+
+def _traced_node(
+    name: str,
+    func: Callable[[Any, RunnableConfig], dict[str, Any]],
+    afunc: Callable[[Any, RunnableConfig], Any] | None = None,
+) -> RunnableLambda:
+    """Wrap a node so every run records a span and appends it to `spans`.
+
+    The node runs inside the turn's deadline scope, so tools size their timeouts by it,
+    and inside a usage scope that collects its LLM calls (tool calls included) into `llm_usage`.
+    """
+
+    def _finish(state: Any, update: dict[str, Any], started: float, usage: list[dict[str, Any]]) -> dict[str, Any]:
+        span = record_span(
+            name,
+            time.perf_counter() - started,
+            bytes_in=payload_bytes(state),
+            bytes_out=payload_bytes(update),
+        )
+        update = {**update, "spans": list(update.get("spans", [])) + [span]}
+        if usage:
+            update["llm_usage"] = usage
+        return update
+
+    def _failed(state: Any, exc: Exception, started: float) -> None:
+        record_span(name, time.perf_counter() - started, bytes_in=payload_bytes(state), error=type(exc).__name__)
+
+    def run(state: Any, config: RunnableConfig) -> dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            with deadline_scope(state.get("deadline_ts")), usage_scope() as usage:
+                update = func(state, config)
+        except Exception as exc:
+            _failed(state, exc, started)
+            raise
+        return _finish(state, update, started, usage)
+
+    async def arun(state: Any, config: RunnableConfig) -> dict[str, Any]:
+        assert afunc is not None
+        started = time.perf_counter()
+        try:
+            with deadline_scope(state.get("deadline_ts")), usage_scope() as usage:
+                update = await afunc(state, config)
+        except Exception as exc:
+            _failed(state, exc, started)
+            raise
+        return _finish(state, update, started, usage)
+
+    if afunc is None:
+        return RunnableLambda(run, name=name)
+    return RunnableLambda(run, afunc=arun, name=name)
+
+
+def _parse_tool_limits(raw: str) -> dict[str, int]:
+    """Parse `tool=N,tool=N` into per-tool concurrency caps."""
+    limits: dict[str, int] = {}
+    for part in raw.split(","):
+        name, sep, value = part.partition("=")
+        if not sep:
+            continue
+        try:
+            limits[name.strip()] = max(1, int(value))
+        except ValueError:
+            logger.warning("[EXECUTE] Ignoring invalid tool limit: %s", part)
+    return limits
+
+
+def create_agent_graph(
+    llm: BaseChatModel,
+    answer_cache: AnswerCache | None = None,
+    memory_writer: BackgroundMemoryWriter | None = None,
+    sessions: SessionStore | None = None,
+    scheduler: OllamaScheduler | None = None,
+    sql_tool: SQLPlannerExecutor | None = None,
+    rag_tool: RAGTool | None = None,
+    memory_tool: LongTermMemoryTool | None = None,
+    web_search_tool: WebSearchTool | None = None,
+):
+    # Every LLM and embedding call below takes a slot from this one scheduler.
+    if scheduler is None:
+        scheduler = ollama_scheduler_from_env(on_wait=record_ollama_wait)
+
     sql_mode = os.getenv("SQL_BACKEND_MODE", "").strip().lower()
     if not sql_mode:
         # Backward compatibility with the previous flag
         sql_mode = "mcp" if os.getenv("USE_MCP_SQL", "true").lower() == "true" else "native"
 
-    sql_tool = SQLPlannerExecutor(
-        llm=llm,
-        backend_mode=sql_mode,  # type: ignore[arg-type]
-        mcp_server_path=os.getenv(
-            "SQL_MCP_SERVER_PATH",
-            os.getenv("MCP_SQL_SERVER_PATH", "mcp_server/mcp_postgres_server.py"),
-        ),
-        runtime_fallback=os.getenv("SQL_RUNTIME_FALLBACK", "true").lower() == "true",
-    )
-    rag_tool = RAGTool(
-        chroma_host=os.getenv("CHROMA_HOST", "localhost"),
-        chroma_port=int(os.getenv("CHROMA_PORT", "8000")),
-        collection_name=os.getenv("CHROMA_COLLECTION", "kb_lankovacka"),
-        ollama_base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
-        embed_model=os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text"),
+    # Tools passed in (e.g. offline stand-ins in benchmarks/) replace the ones built from env.
+    if sql_tool is None:
+        sql_tool = SQLPlannerExecutor(
+            llm=llm,
+            backend_mode=sql_mode,  # type: ignore[arg-type]
+            mcp_server_path=os.getenv(
+                "SQL_MCP_SERVER_PATH",
+                os.getenv("MCP_SQL_SERVER_PATH", "mcp_server/mcp_postgres_server.py"),
+            ),
+            runtime_fallback=os.getenv("SQL_RUNTIME_FALLBACK", "true").lower() == "true",
+            scheduler=scheduler,
+            template_cache=sql_template_cache_from_env(),
+            result_cache=sql_result_cache_from_env(),
+            downsampler=downsampler_from_env(),
+            rollup_router=rollup_router_from_env(),
+        )
+    # Memory lookup, plan cache and KB search all embed the same user query.
+    embedding_cache = EmbeddingCache(max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "1024")))
+    if rag_tool is None:
+        rag_tool = RAGTool(
+            chroma_host=os.getenv("CHROMA_HOST", "localhost"),
+            chroma_port=int(os.getenv("CHROMA_PORT", "8000")),
+            collection_name=os.getenv("CHROMA_COLLECTION", "kb_lankovacka"),
+            ollama_base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
+            embed_model=os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text"),
+            embedding_cache=embedding_cache,
+            scheduler=scheduler,
+        )
+    if memory_tool is None:
+        memory_tool = LongTermMemoryTool(
+            chroma_host=os.getenv("CHROMA_HOST", "localhost"),
+            chroma_port=int(os.getenv("CHROMA_PORT", "8000")),
+            ollama_base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
+            embed_model=os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text"),
+            collection_name=os.getenv("LONG_TERM_MEMORY_COLLECTION", "long_term_memory"),
+            embedding_cache=embedding_cache,
+            scheduler=scheduler,
+        )
+    if web_search_tool is None:
+        web_mode = os.getenv("WEB_BACKEND_MODE", "auto").strip().lower()
+        try:
+            web_search_tool = WebSearchTool(
+                backend_mode=web_mode,  # type: ignore[arg-type]
+                mcp_server_path=os.getenv("TAVILY_MCP_SERVER_PATH", "mcp_server/mcp_tavily_server.py"),
+                max_results=int(os.getenv("WEB_SEARCH_MAX_RESULTS", "5")),
+                runtime_fallback=os.getenv("WEB_RUNTIME_FALLBACK", "true").lower() == "true",
+            )
+        except Exception as exc:
+            logger.warning("[WEB] Web search tool disabled due to init error: %s", exc)
+            web_search_tool = None
+
+    # Shared across requests so the caps bound total load on Ollama/Postgres/Tavily.
+    max_workers = max(1, int(os.getenv("EXECUTE_MAX_WORKERS", "8")))
+    step_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="plan-step")
+    tool_limits = _parse_tool_limits(
+        os.getenv(
+            "EXECUTE_TOOL_CONCURRENCY",
+            "sql_query=2,rag_search=2,memory_search=2,memory_write=1,web_search=2",
+        )
     )
-    memory_tool = LongTermMemoryTool(
-        chroma_host=os.getenv("CHROMA_HOST", "localhost"),
-        chroma_port=int(os.getenv("CHROMA_PORT", "8000")),
-        ollama_base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
-        embed_model=os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text"),
-        collection_name=os.getenv("LONG_TERM_MEMORY_COLLECTION", "long_term_memory"),
+    tool_semaphores = {name: threading.BoundedSemaphore(limit) for name, limit in tool_limits.items()}
+
+    # Planner writes SQL into sql_query steps; NL->SQL only repairs SQL that fails.
+    inline_sql = os.getenv("PLANNER_INLINE_SQL", "false").lower() == "true"
+
+    fast_planner = FastPathPlanner(
+        memory_intent=_looks_like_memory_intent,
+        inline_sql=inline_sql,
+        min_confidence=float(os.getenv("FAST_PLANNER_MIN_CONFIDENCE", "0.8")),
     )
-    web_mode = os.getenv("WEB_BACKEND_MODE", "auto").strip().lower()
-    try:
-        web_search_tool: WebSearchTool | None = WebSearchTool(
-            backend_mode=web_mode,  # type: ignore[arg-type]
-            mcp_server_path=os.getenv("TAVILY_MCP_SERVER_PATH", "mcp_server/mcp_tavily_server.py"),
-            max_results=int(os.getenv("WEB_SEARCH_MAX_RESULTS", "5")),
-            runtime_fallback=os.getenv("WEB_RUNTIME_FALLBACK", "true").lower() == "true",
+    fast_planner_enabled = os.getenv("FAST_PLANNER_ENABLED", "true").lower() == "true"
+    plan_cache: SemanticPlanCache | None = None
+    if os.getenv("PLAN_CACHE_ENABLED", "true").lower() == "true":
+        plan_cache = SemanticPlanCache(
+            path=os.getenv("PLAN_CACHE_PATH", ".data/plan_cache.json") or None,
+            max_entries=int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "512")),
+            ttl_seconds=float(os.getenv("PLAN_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+            similarity_threshold=float(os.getenv("PLAN_CACHE_SIMILARITY", "0.92")),
         )
-    except Exception as exc:
-        logger.warning("[WEB] Web search tool disabled due to init error: %s", exc)
-        web_search_tool = None
 
-    def load_memory(state: AgentState) -> AgentState:
-        query = state["user_query"]
-        memories = memory_tool.search_memories(query=query, n_results=4)
-        context = [m["text"] for m in memories]
-        trace = state.get("trace", []) + [f"load_memory: retrieved={len(context)}"]
+    if answer_cache is None:
+        answer_cache = answer_cache_from_env()
+
+    compactor = result_compactor_from_env()
+    template_responder = template_responder_from_env()
+
+    # How long a session may reuse its memory lookup and tool results.
+    session_memory_ttl = float(os.getenv("SESSION_MEMORY_TTL_SECONDS", "600"))
+    session_result_ttls = {
+        "sql_query": float(os.getenv("SESSION_SQL_TTL_SECONDS", "60")),
+        "rag_search": float(os.getenv("SESSION_RAG_TTL_SECONDS", "600")),
+    }
+    session_max_results = max(0, int(os.getenv("SESSION_MAX_RESULTS", "8")))
+
+    # Time budget per turn. Steps stop starting once less than the respond reserve is
+    # left, and optional steps need a larger margin.
+    request_deadline_seconds = float(os.getenv("REQUEST_DEADLINE_SECONDS", "120"))
+    respond_reserve_seconds = float(os.getenv("DEADLINE_RESPOND_RESERVE_SECONDS", "20"))
+    optional_min_seconds = float(os.getenv("DEADLINE_OPTIONAL_MIN_SECONDS", "30"))
+    optional_tools = {"web_search"}
+
+    register_stats("ollama_scheduler", scheduler.stats)
+    add_listener(record_llm_usage)
+    # The pool itself is created lazily by the native SQL backend.
+    add_wait_listener(record_pg_pool_wait)
+    register_stats("pg_pool", pg_pool_stats)
+    sql_template_cache = getattr(sql_tool, "template_cache", None)
+    if sql_template_cache is not None:
+        register_stats("sql_templates", sql_template_cache.stats)
+    sql_result_cache = getattr(sql_tool, "result_cache", None)
+    if sql_result_cache is not None:
+        register_stats("sql_results", sql_result_cache.stats)
+    downsampler = getattr(sql_tool, "downsampler", None)
+    if downsampler is not None:
+        register_stats("sql_downsample", downsampler.stats)
+    rollup_router = getattr(sql_tool, "rollup_router", None)
+    if rollup_router is not None:
+        register_stats("rollup_router", rollup_router.stats)
+    for component, tool in (("mcp_sql", sql_tool), ("mcp_web", web_search_tool)):
+        # Stand-in tools (benchmarks/) have no MCP backend.
+        mcp_backend = getattr(tool, "mcp_backend", None)
+        if mcp_backend is not None:
+            register_stats(component, mcp_backend.stats)
+    register_stats("embedding_cache", embedding_cache.stats)
+    register_stats("fast_planner", fast_planner.stats)
+    if plan_cache is not None:
+        register_stats("plan_cache", plan_cache.stats)
+    if answer_cache is not None:
+        register_stats("answer_cache", answer_cache.stats)
+    if compactor is not None:
+        register_stats("compaction", compactor.stats)
+    if template_responder is not None:
+        register_stats("response_templates", template_responder.stats)
+
+    if memory_writer is None:
+        memory_writer = memory_writer_from_env()
+    memory_writer.start(llm, memory_tool, scheduler)
+    register_stats("memory_writer", memory_writer.stats)
+    if sessions is not None:
+        register_stats("sessions", sessions.stats)
+
+    def _fresh_results(results: dict[str, Any]) -> dict[str, Any]:
+        now = time.time()
+        return {
+            key: cached
+            for key, cached in results.items()
+            if now - cached["at"] <= session_result_ttls.get(cached["tool"], 0)
+        }
+
+    def begin_turn(state: AgentState, config: RunnableConfig) -> AgentState:
+        """Reset per-turn fields restored by the checkpointer and roll the session forward."""
+        budget = ((config or {}).get("configurable") or {}).get("deadline_seconds", request_deadline_seconds)
+        previous = state.get("session") or {}
+        session: dict[str, Any] = {
+            "turn": previous.get("turn", 0) + 1,
+            "query": state["user_query"],
+            "memory": previous.get("memory"),
+            "results": _fresh_results(previous.get("results", {})),
+        }
+        if previous.get("query"):
+            session["previous"] = {
+                "query": previous["query"],
+                "answer": state.get("final_answer", ""),
+                "plan": state.get("plan", []),
+            }
+            logger.info("[SESSION] turn=%d follows: %s", session["turn"], previous["query"])
+        return {
+            "session": session,
+            "plan": [],
+            "tool_results": [],
+            "execution_status": {},
+            "final_answer": "",
+            "trace": [],
+            "data_fingerprint": {},
+            "answer_cache_hit": False,
+            "compaction": {},
+            "spans": None,  # type: ignore[typeddict-item]
+            "prefetch_id": "",
+            "deadline_ts": time.time() + float(budget) if budget and float(budget) > 0 else None,
+            "llm_usage": None,  # type: ignore[typeddict-item]
+        }
+
+    async def abegin_turn(state: AgentState, config: RunnableConfig) -> AgentState:
+        return begin_turn(state, config)
+
+    def _is_followup_turn(state: AgentState) -> bool:
+        return bool((state.get("session") or {}).get("previous")) and is_followup(state["user_query"])
+
+    def _conversation_section(state: AgentState) -> str:
+        if not _is_followup_turn(state):
+            return ""
+        previous = state["session"]["previous"]
+        steps = [{"tool": s.get("tool"), "instruction": s.get("instruction")} for s in previous.get("plan", [])]
+        return f"""
+
+Previous turn of this conversation (the user query is a follow-up to it):
+User: {previous["query"]}
+Assistant: {previous["answer"][:400]}
+Plan: {json.dumps(steps, ensure_ascii=False)}"""
+
+    def _data_versions(result: dict[str, Any]) -> dict[str, Any]:
+        rows = result.get("rows") or []
+        row = rows[0] if rows else (None, None)
+        return {"telemetry_ts": row[0], "alarms_ts": row[1]}
+
+    def _data_fingerprint() -> dict[str, Any]:
+        assert answer_cache is not None
+        fingerprint: dict[str, Any] = {
+            "time_bucket": answer_cache.time_bucket(),
+            "memory_version": memory_tool.version,
+        }
+        try:
+            fingerprint["kb_version"] = rag_tool.kb_version()
+        except Exception as exc:
+            logger.warning("[ANSWER_CACHE] KB version unavailable: %s", exc)
+        try:
+            fingerprint.update(_data_versions(sql_tool.run_uncached(DATA_VERSION_SQL)))
+        except Exception as exc:
+            logger.warning("[ANSWER_CACHE] Data versions unavailable: %s", exc)
+        return fingerprint
+
+    async def _adata_fingerprint() -> dict[str, Any]:
+        assert answer_cache is not None
+        fingerprint: dict[str, Any] = {
+            "time_bucket": answer_cache.time_bucket(),
+            "memory_version": memory_tool.version,
+        }
+        kb_version, versions = await asyncio.gather(
+            rag_tool.akb_version(), sql_tool.arun_uncached(DATA_VERSION_SQL), return_exceptions=True
+        )
+        if isinstance(kb_version, BaseException):
+            logger.warning("[ANSWER_CACHE] KB version unavailable: %s", kb_version)
+        else:
+            fingerprint["kb_version"] = kb_version
+        if isinstance(versions, BaseException):
+            logger.warning("[ANSWER_CACHE] Data versions unavailable: %s", versions)
+        else:
+            fingerprint.update(_data_versions(versions))
+        return fingerprint
+
+    def _answer_cache_update(state: AgentState, config: RunnableConfig, fingerprint: dict[str, Any]) -> AgentState:
+        assert answer_cache is not None
+        answer = answer_cache.lookup(state["user_query"], fingerprint)
+        if answer is None:
+            update: AgentState = {
+                "data_fingerprint": fingerprint,
+                "answer_cache_hit": False,
+                "trace": state.get("trace", []) + ["answer_cache: miss"],
+            }
+        else:
+            update = {
+                "final_answer": answer,
+                "answer_cache_hit": True,
+                "trace": state.get("trace", []) + ["answer_cache: hit"],
+            }
+        logger.info("[TRACE] %s", update["trace"][-1])
+        _emit(config, "node", node="answer_cache", detail=update["trace"][-1])
+        return update
+
+    def _answer_cache_skip(state: AgentState, config: RunnableConfig) -> AgentState:
+        # Follow-ups mean different things in different conversations.
+        trace = state.get("trace", []) + ["answer_cache: skipped (follow-up)"]
         logger.info("[TRACE] %s", trace[-1])
-        return {"memory_context": context, "trace": trace}
+        _emit(config, "node", node="answer_cache", detail=trace[-1])
+        return {"answer_cache_hit": False, "trace": trace}
 
-    def _validate_plan(raw_plan: Any, fallback_instruction: str) -> list[dict[str, Any]]:
-        """Ensure plan has a safe, minimal shape."""
-        allowed_tools = {"sql_query", "rag_search", "memory_search", "memory_write", "web_search"}
-        if not isinstance(raw_plan, list):
-            return [{"step": 1, "tool": "rag_search", "instruction": fallback_instruction}]
+    def check_answer_cache(state: AgentState, config: RunnableConfig) -> AgentState:
+        if _is_followup_turn(state):
+            return _answer_cache_skip(state, config)
+        return _answer_cache_update(state, config, _data_fingerprint())
 
-        cleaned: list[dict[str, Any]] = []
-        for idx, item in enumerate(raw_plan, start=1):
-            if not isinstance(item, dict):
-                continue
-            tool = str(item.get("tool", "")).strip()
-            instruction = str(item.get("instruction", "")).strip() or fallback_instruction
-            if tool not in allowed_tools:
-                continue
-            step_no = item.get("step")
-            try:
-                step_int = int(step_no)
-            except Exception:
-                step_int = idx
-            cleaned.append(
-                {
-                    "step": step_int,
-                    "tool": tool,
-                    "instruction": instruction,
-                }
-            )
+    async def acheck_answer_cache(state: AgentState, config: RunnableConfig) -> AgentState:
+        if _is_followup_turn(state):
+            return _answer_cache_skip(state, config)
+        return _answer_cache_update(state, config, await _adata_fingerprint())
+
+    def store_answer(state: AgentState, config: RunnableConfig) -> AgentState:
+        assert answer_cache is not None
+        partial = bool(state.get("execution_status", {}).get("partial"))
+        stored = not _is_followup_turn(state) and not partial and answer_cache.store(
+            state["user_query"],
+            state.get("final_answer", ""),
+            state.get("tool_results", []),
+            state.get("data_fingerprint", {}),
+        )
+        trace = state.get("trace", []) + [f"answer_cache: {'stored' if stored else 'not cacheable'}"]
+        logger.info("[TRACE] %s", trace[-1])
+        return {"trace": trace}
+
+    def _session_memory(state: AgentState) -> list[str] | None:
+        """Memory context of an earlier turn, if nothing was written since and it is fresh.
+
+        Only follow-ups and repeated questions reuse it; a new topic needs its own lookup.
+        """
+        memory = (state.get("session") or {}).get("memory")
+        if not memory or memory["version"] != memory_tool.version:
+            return None
+        if memory["query"] != state["user_query"] and not _is_followup_turn(state):
+            return None
+        if time.time() - memory["at"] > session_memory_ttl:
+            return None
+        return memory["context"]
+
+    def _memory_update(
+        state: AgentState, config: RunnableConfig, context: list[str], version: int, reused: bool = False
+    ) -> AgentState:
+        suffix = " (session)" if reused else ""
+        trace = state.get("trace", []) + [f"load_memory: retrieved={len(context)}{suffix}"]
+        logger.info("[TRACE] %s", trace[-1])
+        _emit(config, "node", node="load_memory", detail=trace[-1])
+        update: AgentState = {"memory_context": context, "trace": trace}
+        if not reused:
+            memory = {"query": state["user_query"], "context": context, "version": version, "at": time.time()}
+            update["session"] = {**state.get("session", {}), "memory": memory}
+        return update
+
+    def load_memory(state: AgentState, config: RunnableConfig) -> AgentState:
+        context = _session_memory(state)
+        if context is not None:
+            return _memory_update(state, config, context, memory_tool.version, reused=True)
+        version = memory_tool.version
+        memories = memory_tool.search_memories(query=state["user_query"], n_results=4)
+        return _memory_update(state, config, [m["text"] for m in memories], version)
+
+    async def aload_memory(state: AgentState, config: RunnableConfig) -> AgentState:
+        context = _session_memory(state)
+        if context is not None:
+            return _memory_update(state, config, context, memory_tool.version, reused=True)
+        version = memory_tool.version
+        memories = await memory_tool.asearch_memories(query=state["user_query"], n_results=4)
+        return _memory_update(state, config, [m["text"] for m in memories], version)
 
-        if not cleaned:
-            cleaned = [{"step": 1, "tool": "rag_search", "instruction": fallback_instruction}]
-        if len(cleaned) > 4:
-            cleaned = cleaned[:4]
-        return cleaned
+    inline_sql_rules = """
+- For every sql_query step, also set "sql" to one ready-to-run read-only PostgreSQL statement implementing the instruction (SELECT/WITH only, no semicolons, no comments). Other tools have no "sql" field.
+""".strip()
+    inline_sql_example = """
+With inline SQL, the same step also carries:
+"sql": "SELECT tag, AVG(value) AS avg_value FROM telemetry WHERE machine_id='LNK-01' AND ts >= now() - interval '8 hours' AND tag IN ('TempGearbox_C','TempMotor_C') GROUP BY tag"
+""".strip()
 
-    def planner(state: AgentState) -> AgentState:
+    def _planner_prompt(state: AgentState) -> str:
         query = state["user_query"]
         memory_context = state.get("memory_context", [])
+        sql_field = ', "sql": "SELECT ..."' if inline_sql else ""
+        sql_rules = f"\n{inline_sql_rules}" if inline_sql else ""
+        sql_example = f"\n{inline_sql_example}" if inline_sql else ""
+        conversation = _conversation_section(state)
 
-        prompt = f"""
+        return f"""
 You are a planning agent. Build a short execution plan in **English** using these tools:
 - sql_query: when telemetry/alarms data from PostgreSQL is needed.
 - rag_search: when SOP/knowledge base content is needed.
@@ -144,18 +609,20 @@ You are a planning agent. Build a short execution plan in **English** using thes
 Return **only valid JSON**, with this exact schema and field names:
 {{
   "plan": [
-    {{"step": 1, "tool": "sql_query", "instruction": "..." }}
+    {{"step": 1, "tool": "sql_query", "instruction": "..."{sql_field}, "depends_on": [] }}
   ]
 }}
 
 Rules:
 - Use 1–4 steps.
+- Steps run in parallel. Set "depends_on" to the earlier step numbers a step must wait for; leave it empty otherwise.
 - Use only these tool values: "sql_query", "rag_search", "memory_search", "memory_write", "web_search".
 - If the query asks about historical telemetry or alarms, include at least one sql_query step.
 - If the query asks for SOP/procedure/knowledge, include at least one rag_search step.
 - If memory_context is not empty and can help, include memory_search.
 - If the user asks to remember something or mentions preferences, include memory_write.
 - If the query asks about vendor documentation or components outside the local KB, include web_search.
+- For a follow-up question, repeat the previous plan and change only what the user asked to change (time window, machine, tag, alarm).
 
 Important SQL schema constraints for sql_query instructions:
 - telemetry columns: ts, machine_id, tag, value, unit
@@ -163,107 +630,571 @@ Important SQL schema constraints for sql_query instructions:
 - NEVER reference non-existent columns like temperature or timestamp.
 - For temperature questions, use telemetry rows where tag is temperature-related and aggregate value over value.
 - For time filters, always use ts and expressions like now() - interval '8 hours'.
-- Prefer machine_id='LNK-01' when the machine is not specified.
+- Prefer machine_id='LNK-01' when the machine is not specified.{sql_rules}
 
 Example for average temperature over the last 8 hours:
-"Compute AVG(value) from telemetry where machine_id='LNK-01', ts >= now() - interval '8 hours', and tag IN ('TempGearbox_C','TempMotor_C')."
+"Compute AVG(value) from telemetry where machine_id='LNK-01', ts >= now() - interval '8 hours', and tag IN ('TempGearbox_C','TempMotor_C')."{sql_example}
 
 User query:
 {query}
 
 Memory context (can be empty):
-{memory_context}
+{memory_context}{conversation}
 """.strip()
 
-        raw = llm.invoke(prompt).content
-        raw_text = raw if isinstance(raw, str) else str(raw)
-        parsed = _safe_json_parse(raw_text) or {}
-        raw_plan = parsed.get("plan")
-        plan = _validate_plan(raw_plan, fallback_instruction=query)
-
-        trace = state.get("trace", []) + [f"planner: steps={len(plan)}"]
+    def _plan_update(state: AgentState, plan: list[dict[str, Any]], source: str = "") -> AgentState:
+        suffix = f" {source}" if source else ""
+        trace = state.get("trace", []) + [f"planner: steps={len(plan)}{suffix}"]
         logger.info("[PLAN] %s", json.dumps(plan, ensure_ascii=False))
         logger.info("[TRACE] %s", trace[-1])
         return {"plan": plan, "trace": trace}
 
-    def execute(state: AgentState) -> AgentState:
-        plan = state.get("plan", [])
-        query = state["user_query"]
-        results: list[dict[str, Any]] = []
-        trace = list(state.get("trace", []))
+    def _plan_from_llm(state: AgentState, raw: Any) -> tuple[list[dict[str, Any]], bool]:
+        """Validated plan plus whether the LLM output itself was usable (not the fallback)."""
+        raw_text = raw if isinstance(raw, str) else str(raw)
+        parsed = safe_json_parse(raw_text)
+        # {"plan": [...]}, or a bare list of steps.
+        raw_plan = parsed.get("plan") if isinstance(parsed, dict) else parsed
+        plan = _validate_plan(raw_plan, fallback_instruction=state["user_query"], inline_sql=inline_sql)
+        return plan, isinstance(raw_plan, list) and bool(raw_plan)
 
-        for item in plan:
-            tool = item.get("tool", "")
-            instruction = item.get("instruction", query)
-            step_no = item.get("step", "?")
-            logger.info("[EXECUTE] step=%s tool=%s instruction=%s", step_no, tool, instruction)
+    def _fast_plan_update(state: AgentState) -> AgentState | None:
+        if not fast_planner_enabled:
+            return None
+        fast = fast_planner.plan(state["user_query"])
+        if fast is None:
+            return None
+        plan = _validate_plan(fast.plan, fallback_instruction=state["user_query"], inline_sql=inline_sql)
+        return _plan_update(state, plan, f"fast_path={fast.rule}")
 
-            try:
-                if tool == "sql_query":
-                    tool_result = sql_tool.run(instruction)
-                elif tool == "rag_search":
-                    tool_result = rag_tool.search(instruction, n_results=3)
-                elif tool == "memory_search":
-                    tool_result = memory_tool.search_memories(instruction, n_results=4)
-                elif tool == "memory_write":
-                    memory_id = memory_tool.save_memory(
-                        text=instruction,
-                        metadata={"kind": "explicit_user_memory", "source_query": query},
-                    )
-                    tool_result = {"stored": True, "memory_id": memory_id}
-                elif tool == "web_search":
-                    if web_search_tool is None:
-                        raise RuntimeError(
-                            "Web search tool is disabled. Configure WEB_BACKEND_MODE and TAVILY_API_KEY."
-                        )
-                    lowered = instruction.lower()
-                    vendor = "siemens" if "siemens" in lowered else None
-                    tool_result = web_search_tool.search(instruction, vendor=vendor)
+    def _followup_plan_update(state: AgentState) -> AgentState | None:
+        """Retarget the previous plan's SQL steps at the window named in "and for the last hour?"."""
+        window = find_time_window(state["user_query"])
+        previous_plan = state["session"]["previous"].get("plan") or []
+        if window is None or not any(item.get("tool") == "sql_query" for item in previous_plan):
+            return None
+        plan: list[dict[str, Any]] = []
+        for item in previous_plan:
+            step = dict(item)
+            if item.get("tool") == "sql_query":
+                step["instruction"] = replace_time_window(item["instruction"], window)
+                if item.get("sql"):
+                    step["sql"] = replace_time_window(item["sql"], window)
+                if step["instruction"] == item["instruction"] and step.get("sql") == item.get("sql"):
+                    # The step has no window to change; let the LLM work out the follow-up.
+                    return None
+            plan.append(step)
+        return _plan_update(state, plan, f"follow_up window={window}")
+
+    def _cached_plan_update(state: AgentState, embedding: list[float] | None) -> AgentState | None:
+        if plan_cache is None or embedding is None:
+            return None
+        cached = plan_cache.lookup(state["user_query"], embedding)
+        if cached is None:
+            return None
+        plan, similarity = cached
+        return _plan_update(state, plan, f"plan_cache=hit similarity={similarity:.3f}")
+
+    def _llm_plan_update(state: AgentState, raw: Any, embedding: list[float] | None) -> AgentState:
+        plan, usable = _plan_from_llm(state, raw)
+        if plan_cache is not None and embedding is not None and usable:
+            plan_cache.put(state["user_query"], embedding, plan)
+        return _plan_update(state, plan)
+
+    def _deadline_plan_update(state: AgentState) -> AgentState:
+        # No planner slot before the deadline: the fallback plan lets the turn end with a partial answer.
+        plan = _validate_plan(None, fallback_instruction=state["user_query"])
+        return _plan_update(state, plan, "fallback (deadline)")
+
+    def _plan_cache_embedding(state: AgentState) -> list[float] | None:
+        if plan_cache is None:
+            return None
+        try:
+            return rag_tool.embed(state["user_query"])
+        except Exception as exc:
+            logger.warning("[PLAN_CACHE] Embedding failed, skipping cache: %s", exc)
+            return None
+
+    async def _aplan_cache_embedding(state: AgentState) -> list[float] | None:
+        if plan_cache is None:
+            return None
+        try:
+            return await rag_tool.aembed(state["user_query"])
+        except Exception as exc:
+            logger.warning("[PLAN_CACHE] Embedding failed, skipping cache: %s", exc)
+            return None
+
+    def planner(state: AgentState, config: RunnableConfig) -> AgentState:
+        followup = _is_followup_turn(state)
+        update = _followup_plan_update(state) if followup else _fast_plan_update(state)
+        if update is None:
+            # Follow-ups depend on the previous turn, so they bypass the shared plan cache.
+            embedding = None if followup else _plan_cache_embedding(state)
+            update = _cached_plan_update(state, embedding)
+            if update is None:
+                try:
+                    with scheduler.slot("planner"):
+                        response = llm.invoke(_planner_prompt(state))
+                except DeadlineExceeded:
+                    update = _deadline_plan_update(state)
                 else:
-                    tool_result = {"warning": f"Unknown tool: {tool}"}
-
-                results.append(
-                    {
-                        "step": step_no,
-                        "tool": tool,
-                        "instruction": instruction,
-                        "result": tool_result,
-                    }
-                )
-                trace_line = f"execute: step={step_no} tool={tool} ok"
-                trace.append(trace_line)
-                logger.info("[TRACE] %s", trace_line)
+                    record_llm_call("planner", response)
+                    update = _llm_plan_update(state, response.content, embedding)
+        _emit(config, "node", node="planner", detail=update["trace"][-1], plan=update["plan"])
+        return update
+
+    async def aplanner(state: AgentState, config: RunnableConfig) -> AgentState:
+        followup = _is_followup_turn(state)
+        update = _followup_plan_update(state) if followup else _fast_plan_update(state)
+        if update is None:
+            # Follow-ups depend on the previous turn, so they bypass the shared plan cache.
+            embedding = None if followup else await _aplan_cache_embedding(state)
+            update = _cached_plan_update(state, embedding)
+            if update is None:
+                try:
+                    async with scheduler.aslot("planner"):
+                        response = await llm.ainvoke(_planner_prompt(state))
+                except DeadlineExceeded:
+                    update = _deadline_plan_update(state)
+                else:
+                    record_llm_call("planner", response)
+                    update = _llm_plan_update(state, response.content, embedding)
+        _emit(config, "node", node="planner", detail=update["trace"][-1], plan=update["plan"])
+        return update
+
+    def _call_tool(tool: str, instruction: str, query: str, sql: str | None = None) -> Any:
+        if tool == "sql_query":
+            return sql_tool.run(instruction, sql=sql)
+        if tool == "rag_search":
+            return rag_tool.search(instruction, n_results=3)
+        if tool == "memory_search":
+            return memory_tool.search_memories(instruction, n_results=4)
+        if tool == "memory_write":
+            memory_id = memory_tool.save_memory(
+                text=instruction,
+                metadata={"kind": "explicit_user_memory", "source_query": query},
+            )
+            return {"stored": True, "memory_id": memory_id}
+        if tool == "web_search":
+            if web_search_tool is None:
+                raise RuntimeError("Web search tool is disabled. Configure WEB_BACKEND_MODE and TAVILY_API_KEY.")
+            vendor = "siemens" if "siemens" in instruction.lower() else None
+            return web_search_tool.search(instruction, vendor=vendor)
+        return {"warning": f"Unknown tool: {tool}"}
+
+    async def _acall_tool(tool: str, instruction: str, query: str, sql: str | None = None) -> Any:
+        if tool == "sql_query":
+            return await sql_tool.arun(instruction, sql=sql)
+        if tool == "rag_search":
+            return await rag_tool.asearch(instruction, n_results=3)
+        if tool == "memory_search":
+            return await memory_tool.asearch_memories(instruction, n_results=4)
+        if tool == "memory_write":
+            memory_id = await memory_tool.asave_memory(
+                text=instruction,
+                metadata={"kind": "explicit_user_memory", "source_query": query},
+            )
+            return {"stored": True, "memory_id": memory_id}
+        if tool == "web_search":
+            if web_search_tool is None:
+                raise RuntimeError("Web search tool is disabled. Configure WEB_BACKEND_MODE and TAVILY_API_KEY.")
+            vendor = "siemens" if "siemens" in instruction.lower() else None
+            return await web_search_tool.asearch(instruction, vendor=vendor)
+        return {"warning": f"Unknown tool: {tool}"}
+
+    def _step_ok(item: dict[str, Any], instruction: str, tool_result: Any) -> tuple[dict[str, Any], str]:
+        trace_line = f"execute: step={item.get('step', '?')} tool={item.get('tool', '')} ok"
+        logger.info("[TRACE] %s", trace_line)
+        entry = {
+            "step": item.get("step", "?"),
+            "tool": item.get("tool", ""),
+            "instruction": instruction,
+            "result": tool_result,
+        }
+        return entry, trace_line
+
+    def _step_error(item: dict[str, Any], instruction: str, exc: Exception) -> tuple[dict[str, Any], str]:
+        trace_line = f"execute: step={item.get('step', '?')} tool={item.get('tool', '')} error"
+        logger.exception("[EXECUTE] step failed: %s", trace_line)
+        entry = {
+            "step": item.get("step", "?"),
+            "tool": item.get("tool", ""),
+            "instruction": instruction,
+            "error": str(exc),
+        }
+        if isinstance(exc, TimeoutError):
+            # Deadline-derived timeouts (MCP reads, DeadlineExceeded) make the answer partial.
+            entry["timed_out"] = True
+        return entry, trace_line
+
+    def _tool_backend(tool: str, result: Any) -> str:
+        if tool == "sql_query":
+            # The result names the backend that served it, which differs after a fallback.
+            return (result.get("sql_backend") if isinstance(result, dict) else None) or sql_tool.active_backend
+        if tool == "web_search":
+            return web_search_tool.active_backend if web_search_tool is not None else ""
+        if tool in {"rag_search", "memory_search", "memory_write"}:
+            return "chroma"
+        return ""
+
+    def _tool_span(
+        tool: str,
+        instruction: str,
+        started: float,
+        result: Any = None,
+        error: Exception | None = None,
+        backend: str | None = None,
+    ) -> dict[str, Any]:
+        return record_span(
+            "execute",
+            time.perf_counter() - started,
+            tool=tool,
+            backend=_tool_backend(tool, result) if backend is None else backend,
+            bytes_in=payload_bytes(instruction),
+            bytes_out=payload_bytes(result),
+            error=type(error).__name__ if error is not None else "",
+        )
+
+    def _emit_step(config: RunnableConfig | None, outcome: StepOutcome) -> None:
+        entry = outcome[0]
+        status = "error" if "error" in entry else "skipped" if "skipped" in entry else "ok"
+        _emit(config, "step", node="execute", step=entry["step"], tool=entry["tool"], status=status)
+
+    def _run_step(item: dict[str, Any], query: str, prefetched: Future | None = None) -> StepOutcome:
+        tool = item.get("tool", "")
+        instruction = item.get("instruction", query)
+        logger.info("[EXECUTE] step=%s tool=%s instruction=%s", item.get("step", "?"), tool, instruction)
+
+        if prefetched is not None:
+            started = time.perf_counter()
+            try:
+                result = prefetched.result()
+                return (*_step_ok(item, instruction, result), _tool_span(tool, instruction, started, result, backend="prefetch"))
             except Exception as exc:
-                err = {
-                    "step": step_no,
-                    "tool": tool,
-                    "instruction": instruction,
-                    "error": str(exc),
-                }
-                results.append(err)
-                trace_line = f"execute: step={step_no} tool={tool} error"
-                trace.append(trace_line)
-                logger.exception("[EXECUTE] step failed: %s", trace_line)
+                logger.warning("[PREFETCH] Speculative search failed (%s), searching again", exc)
+
+        started = time.perf_counter()
+        try:
+            with tool_semaphores.get(tool) or nullcontext():
+                # Spans time the tool call itself, not the wait for a free slot.
+                started = time.perf_counter()
+                result = _call_tool(tool, instruction, query, item.get("sql"))
+        except Exception as exc:
+            return (*_step_error(item, instruction, exc), _tool_span(tool, instruction, started, error=exc))
+        return (*_step_ok(item, instruction, result), _tool_span(tool, instruction, started, result=result))
+
+    # asyncio caps mirror the thread caps; created lazily inside the running loop.
+    async_limits: dict[str, asyncio.Semaphore] = {}
+
+    def _async_semaphore(name: str, limit: int) -> asyncio.Semaphore:
+        if name not in async_limits:
+            async_limits[name] = asyncio.Semaphore(limit)
+        return async_limits[name]
+
+    async def _arun_step(item: dict[str, Any], query: str, prefetched: Any = None) -> StepOutcome:
+        tool = item.get("tool", "")
+        instruction = item.get("instruction", query)
+        logger.info("[EXECUTE] step=%s tool=%s instruction=%s", item.get("step", "?"), tool, instruction)
+
+        if prefetched is not None:
+            started = time.perf_counter()
+            try:
+                result = await RAGPrefetcher.aresult(prefetched)
+                return (*_step_ok(item, instruction, result), _tool_span(tool, instruction, started, result, backend="prefetch"))
+            except Exception as exc:
+                logger.warning("[PREFETCH] Speculative search failed (%s), searching again", exc)
+
+        started = time.perf_counter()
+        try:
+            async with _async_semaphore("__workers__", max_workers):
+                limit = _async_semaphore(tool, tool_limits[tool]) if tool in tool_limits else nullcontext()
+                async with limit:
+                    started = time.perf_counter()
+                    result = await _acall_tool(tool, instruction, query, item.get("sql"))
+        except Exception as exc:
+            return (*_step_error(item, instruction, exc), _tool_span(tool, instruction, started, error=exc))
+        return (*_step_ok(item, instruction, result), _tool_span(tool, instruction, started, result=result))
+
+    def _prefetch_search(query: str) -> list[dict[str, Any]]:
+        with tool_semaphores.get("rag_search") or nullcontext():
+            return rag_tool.search(query, n_results=3)
+
+    async def _aprefetch_search(query: str) -> list[dict[str, Any]]:
+        limit = _async_semaphore("rag_search", tool_limits["rag_search"]) if "rag_search" in tool_limits else nullcontext()
+        async with limit:
+            return await rag_tool.asearch(query, n_results=3)
+
+    prefetcher: RAGPrefetcher | None = None
+    if os.getenv("RAG_PREFETCH_ENABLED", "true").lower() == "true":
+        prefetcher = RAGPrefetcher(
+            search=_prefetch_search,
+            asearch=_aprefetch_search,
+            pool=step_pool,
+            match_threshold=float(os.getenv("RAG_PREFETCH_MATCH", "0.6")),
+        )
+        register_stats("rag_prefetch", prefetcher.stats)
+
+    def prefetch_rag(state: AgentState, config: RunnableConfig) -> AgentState:
+        # Runs beside load_memory, so it must not write `trace` (no reducer).
+        # Follow-ups ("and for the last hour?") are poor KB queries; skip them.
+        assert prefetcher is not None
+        if _is_followup_turn(state):
+            return {"prefetch_id": ""}
+        return {"prefetch_id": prefetcher.start(state["user_query"])}
+
+    async def aprefetch_rag(state: AgentState, config: RunnableConfig) -> AgentState:
+        assert prefetcher is not None
+        if _is_followup_turn(state):
+            return {"prefetch_id": ""}
+        return {"prefetch_id": prefetcher.astart(state["user_query"])}
+
+    def _claim_prefetch(state: AgentState, plan: list[dict[str, Any]], reused: dict[int, Any]) -> dict[int, Any]:
+        # Steps answered from the session are hidden so the prefetch goes to a step that runs.
+        candidates = [{} if idx in reused else item for idx, item in enumerate(plan)]
+        claimed = prefetcher.claim(state.get("prefetch_id"), candidates) if prefetcher is not None else None
+        return dict([claimed]) if claimed else {}
+
+    def _session_result_key(item: dict[str, Any]) -> str | None:
+        tool = item.get("tool", "")
+        if tool not in session_result_ttls:
+            return None
+        return f"{tool}|{item.get('sql') or item.get('instruction', '')}"
+
+    def _session_results(state: AgentState, plan: list[dict[str, Any]]) -> dict[int, Any]:
+        """Results of identical steps run earlier in the session and still within their TTL."""
+        cached = _fresh_results((state.get("session") or {}).get("results", {}))
+        reused: dict[int, Any] = {}
+        for idx, item in enumerate(plan):
+            key = _session_result_key(item)
+            if key is not None and key in cached:
+                reused[idx] = cached[key]["result"]
+        return reused
+
+    def _reused_outcome(item: dict[str, Any], query: str, result: Any) -> StepOutcome:
+        tool = item.get("tool", "")
+        instruction = item.get("instruction", query)
+        logger.info("[SESSION] step=%s tool=%s reuses the result of an earlier turn", item.get("step", "?"), tool)
+        started = time.perf_counter()
+        return (*_step_ok(item, instruction, result), _tool_span(tool, instruction, started, result, backend="session"))
+
+    def _session_with_results(
+        state: AgentState, outcomes: dict[int, StepOutcome], reused: dict[int, Any]
+    ) -> dict[str, Any]:
+        session = dict(state.get("session") or {})
+        results = _fresh_results(session.get("results", {}))
+        now = time.time()
+        for idx, (entry, _, _) in outcomes.items():
+            key = _session_result_key(state["plan"][idx])
+            # Reused results keep their original timestamp so the TTL still bounds staleness.
+            if key is not None and idx not in reused and "result" in entry:
+                results[key] = {"tool": entry["tool"], "result": entry["result"], "at": now}
+        newest = sorted(results, key=lambda k: results[k]["at"], reverse=True)[:session_max_results]
+        session["results"] = {key: results[key] for key in newest}
+        return session
+
+    def _step_budget() -> float | None:
+        """Seconds left for tool steps before respond needs the rest, or None without a deadline."""
+        left = remaining()
+        return None if left is None else left - respond_reserve_seconds
+
+    def _skip_reason(item: dict[str, Any]) -> str | None:
+        budget = _step_budget()
+        if budget is None:
+            return None
+        if budget <= 0:
+            return "deadline"
+        if item.get("tool") in optional_tools and budget < optional_min_seconds:
+            return "low time budget"
+        return None
+
+    def _skipped_outcome(item: dict[str, Any], query: str, reason: str) -> StepOutcome:
+        tool = item.get("tool", "")
+        trace_line = f"execute: step={item.get('step', '?')} tool={tool} skipped ({reason})"
+        logger.warning("[DEADLINE] %s", trace_line)
+        entry = {
+            "step": item.get("step", "?"),
+            "tool": tool,
+            "instruction": item.get("instruction", query),
+            "skipped": reason,
+        }
+        return entry, trace_line, record_span("execute", 0.0, tool=tool, error="skipped")
+
+    def _timed_out_outcome(item: dict[str, Any], query: str, started: float) -> StepOutcome:
+        tool = item.get("tool", "")
+        instruction = item.get("instruction", query)
+        exc = DeadlineExceeded("Request deadline reached before the step finished.")
+        trace_line = f"execute: step={item.get('step', '?')} tool={tool} timed out"
+        logger.warning("[DEADLINE] %s", trace_line)
+        entry = {
+            "step": item.get("step", "?"),
+            "tool": tool,
+            "instruction": instruction,
+            "error": str(exc),
+            "timed_out": True,
+        }
+        return entry, trace_line, _tool_span(tool, instruction, started, error=exc)
+
+    def _execution_update(
+        state: AgentState, outcomes: dict[int, StepOutcome], reused: dict[int, Any]
+    ) -> AgentState:
+        plan = state.get("plan", [])
+        trace = list(state.get("trace", []))
+
+        # Merge in plan order regardless of completion order.
+        results: list[dict[str, Any]] = []
+        spans: list[dict[str, Any]] = []
+        for idx in sorted(outcomes):
+            entry, trace_line, span = outcomes[idx]
+            results.append(entry)
+            trace.append(trace_line)
+            spans.append(span)
 
         # Simple aggregate validation flag for respond node
         any_success = any("result" in r for r in results)
-        all_errors = all("error" in r for r in results) if results else True
-        state_status = {
+        all_errors = all("result" not in r for r in results) if results else True
+        skipped = [r["step"] for r in results if "skipped" in r]
+        timed_out = [r["step"] for r in results if r.get("timed_out")]
+        state_status: dict[str, Any] = {
             "has_results": any_success,
             "all_errors": all_errors,
             "num_steps": len(plan),
         }
-        trace.append(f"execute: summary has_results={any_success} all_errors={all_errors}")
+        if skipped or timed_out:
+            state_status.update({"partial": True, "skipped_steps": skipped, "timed_out_steps": timed_out})
+        summary = f"execute: summary has_results={any_success} all_errors={all_errors}"
+        trace.append(summary + (" partial=True" if skipped or timed_out else ""))
         logger.info("[TRACE] %s", trace[-1])
-        return {"tool_results": results, "trace": trace, "execution_status": state_status}
+        return {
+            "tool_results": results,
+            "trace": trace,
+            "execution_status": state_status,
+            "spans": spans,
+            "session": _session_with_results(state, outcomes, reused),
+        }
 
-    def respond(state: AgentState) -> AgentState:
+    def execute(state: AgentState, config: RunnableConfig) -> AgentState:
+        plan = state.get("plan", [])
         query = state["user_query"]
-        memory_context = state.get("memory_context", [])
+
+        # Dependency-aware scheduling: a step is submitted once all of its
+        # `depends_on` steps have finished; independent steps run concurrently.
+        started = time.perf_counter()
+        outcomes: dict[int, StepOutcome] = {}
+        reused = _session_results(state, plan)
+        prefetched = _claim_prefetch(state, plan, reused)
+        pending = dict(enumerate(plan))
+        finished_steps: set[Any] = set()
+        running: dict[Future, int] = {}
+        for idx in reused:
+            outcomes[idx] = _reused_outcome(pending.pop(idx), query, reused[idx])
+            _emit_step(config, outcomes[idx])
+            finished_steps.add(plan[idx].get("step"))
+        while pending or running:
+            ready = [
+                idx
+                for idx, item in pending.items()
+                if all(dep in finished_steps for dep in item.get("depends_on", []))
+            ]
+            for idx in ready:
+                item = pending.pop(idx)
+                reason = _skip_reason(item)
+                if reason is None:
+                    # Workers do not inherit context variables; carry the request deadline over.
+                    context = contextvars.copy_context()
+                    running[step_pool.submit(context.run, _run_step, item, query, prefetched.get(idx))] = idx
+                    continue
+                outcomes[idx] = _skipped_outcome(item, query, reason)
+                _emit_step(config, outcomes[idx])
+                finished_steps.add(item.get("step"))
+            if not running:
+                if ready:
+                    # Skipped steps may have unblocked their dependents.
+                    continue
+                # Unsatisfiable dependencies; run the rest in order rather than hang.
+                for idx in sorted(pending):
+                    outcomes[idx] = _run_step(pending.pop(idx), query, prefetched.get(idx))
+                    _emit_step(config, outcomes[idx])
+                break
+            budget = _step_budget()
+            done, _ = wait(running, timeout=None if budget is None else max(budget, 0), return_when=FIRST_COMPLETED)
+            if not done:
+                # Out of time. The workers finish on their own (their timeouts follow the
+                # deadline); the turn answers with what it has.
+                for idx in running.values():
+                    outcomes[idx] = _timed_out_outcome(plan[idx], query, started)
+                    _emit_step(config, outcomes[idx])
+                    finished_steps.add(plan[idx].get("step"))
+                running.clear()
+            for future in done:
+                idx = running.pop(future)
+                outcomes[idx] = future.result()
+                _emit_step(config, outcomes[idx])
+                finished_steps.add(plan[idx].get("step"))
+
+        return _execution_update(state, outcomes, reused)
+
+    async def aexecute(state: AgentState, config: RunnableConfig) -> AgentState:
+        plan = state.get("plan", [])
+        query = state["user_query"]
+
+        # Each step awaits the tasks of the steps it depends on; _validate_plan
+        # only allows references to earlier steps, so tasks never wait on themselves.
+        tasks: dict[Any, list[asyncio.Task]] = {}
+        ordered: list[asyncio.Task] = []
+        reused = _session_results(state, plan)
+        prefetched = _claim_prefetch(state, plan, reused)
+
+        async def run_after(idx: int, item: dict[str, Any], deps: list[asyncio.Task]):
+            if idx in reused:
+                outcome = _reused_outcome(item, query, reused[idx])
+            else:
+                if deps:
+                    await asyncio.gather(*deps)
+                reason = _skip_reason(item)
+                budget = _step_budget()
+                if reason is not None:
+                    outcome = _skipped_outcome(item, query, reason)
+                else:
+                    started = time.perf_counter()
+                    try:
+                        outcome = await asyncio.wait_for(
+                            _arun_step(item, query, prefetched.get(idx)), None if budget is None else budget
+                        )
+                    except asyncio.TimeoutError:
+                        outcome = _timed_out_outcome(item, query, started)
+            _emit_step(config, outcome)
+            return outcome
+
+        for idx, item in enumerate(plan):
+            deps = [task for dep in item.get("depends_on", []) for task in tasks.get(dep, [])]
+            task = asyncio.create_task(run_after(idx, item, deps))
+            tasks.setdefault(item.get("step"), []).append(task)
+            ordered.append(task)
+
+        outcomes = dict(enumerate(await asyncio.gather(*ordered)))
+        return _execution_update(state, outcomes, reused)
+
+    def _compacted_results(state: AgentState) -> tuple[str, dict[str, int] | None]:
         tool_results = state.get("tool_results", [])
+        if compactor is None:
+            return json.dumps(tool_results, ensure_ascii=False), None
+        text, report = compactor.compact(state["user_query"], tool_results)
+        logger.info(
+            "[COMPACTION] tool_results %d -> %d tokens (saved %d, budget %d)",
+            report["tokens_before"],
+            report["tokens_after"],
+            report["tokens_saved"],
+            compactor.token_budget,
+        )
+        return text, report
+
+    def _respond_prompt(state: AgentState, tool_results_text: str) -> str:
+        query = state["user_query"]
+        memory_context = state.get("memory_context", [])
         execution_status = state.get("execution_status", {})
+        conversation = _conversation_section(state)
 
-        prompt = f"""
+        return f"""
 You are a Maintenance AI assistant for production machines in the tire industry.
 Typical users are line operators and maintenance technicians asking about:
 - machine status and behavior,
@@ -288,9 +1219,11 @@ Style and tone:
 Grounding and safety:
 - If data is missing or tools failed, say so explicitly and do NOT invent values, timestamps, or parameters.
 - If execution_status.all_errors is true or execution_status.has_results is false, explain that tools did not return useful data and suggest what the operator could check manually.
+- If a SQL result has an `approximate` note, say that the values are approximate and why (one short sentence).
+- If execution_status.partial is true, the request ran out of time: steps in skipped_steps/timed_out_steps did not return data. Say at the start of the answer that it is based on partial results and name what is missing.
 
 User query:
-{query}
+{query}{conversation}
 
 Memory context:
 {memory_context}
@@ -298,71 +1231,179 @@ Memory context:
 Execution status (for your reasoning, do not repeat verbatim):
 {json.dumps(execution_status, ensure_ascii=False)}
 
-Tool results:
-{json.dumps(tool_results, ensure_ascii=False)}
+Tool results (large SQL row sets are summarized as column_stats, trends and head/tail rows; row_count is the full count):
+{tool_results_text}
 """.strip()
 
-        answer = llm.invoke(prompt).content
+    def _answer_update(
+        state: AgentState, config: RunnableConfig, answer: Any, compaction: dict[str, int] | None
+    ) -> AgentState:
         final_answer = answer if isinstance(answer, str) else str(answer)
-        trace = state.get("trace", []) + ["respond: done"]
+        trace_line = "respond: done"
+        if compaction is not None:
+            trace_line += f" (compaction saved {compaction['tokens_saved']} tokens)"
+        trace = state.get("trace", []) + [trace_line]
         logger.info("[TRACE] %s", trace[-1])
-        return {"final_answer": final_answer, "trace": trace}
+        _emit(config, "node", node="respond", detail=trace[-1])
+        update: AgentState = {"final_answer": final_answer, "trace": trace}
+        if compaction is not None:
+            update["compaction"] = compaction
+        return update
 
-    def persist_memory(state: AgentState) -> AgentState:
-        query = state["user_query"]
-        answer = state.get("final_answer", "")
-        trace = list(state.get("trace", []))
+    def _deadline_answer_update(state: AgentState, config: RunnableConfig) -> AgentState:
+        """Answer without the LLM when no respond slot freed up before the request deadline."""
+        sources = sorted({item.get("tool", "") for item in state.get("tool_results", []) if "result" in item})
+        answer = (
+            "The request deadline was reached while the language model was busy, so no full answer could be written."
+        )
+        if sources:
+            answer += f" Data was retrieved from: {', '.join(sources)}."
+        answer += " Please try again in a moment."
+        trace = state.get("trace", []) + ["respond: deadline (LLM skipped)"]
+        logger.warning("[TRACE] %s", trace[-1])
+        if _streaming(config):
+            _emit(config, "token", node="respond", text=answer)
+        _emit(config, "node", node="respond", detail=trace[-1])
+        # Marked partial so the answer cache does not keep it.
+        execution_status = {**state.get("execution_status", {}), "partial": True}
+        return {"final_answer": answer, "trace": trace, "execution_status": execution_status}
 
-        if _looks_like_memory_intent(query):
-            memory_text = f"User memory: {query} | Agent answer: {answer[:300]}"
-            memory_tool.save_memory(
-                text=memory_text,
-                metadata={"kind": "preference_or_fact", "source_query": query},
-            )
-            trace_line = "persist_memory: stored explicit preference/fact"
-            trace.append(trace_line)
-            logger.info("[TRACE] %s", trace_line)
-            return {"trace": trace}
-
-        # Generic compact episodic memory for future context
-        summarize_prompt = f"""
-Extract one concise reusable fact from this interaction.
-If nothing useful should be stored, return JSON: {{"store": false, "memory": ""}}
-Else return JSON: {{"store": true, "memory": "..."}}
-
-Interaction:
-User: {query}
-Agent: {answer}
-""".strip()
-        raw = llm.invoke(summarize_prompt).content
-        parsed = _safe_json_parse(raw if isinstance(raw, str) else str(raw))
+    def _templated_update(state: AgentState, config: RunnableConfig) -> AgentState | None:
+        """Answer trivial results (memory acks, single aggregates, short alarm lists) without the LLM."""
+        if template_responder is None:
+            return None
+        rendered = template_responder.render(
+            state["user_query"], state.get("tool_results", []), state.get("execution_status", {})
+        )
+        if rendered is None:
+            return None
+        template, answer = rendered
+        trace = state.get("trace", []) + [f"respond: template={template} (LLM skipped)"]
+        logger.info("[TRACE] %s", trace[-1])
+        if _streaming(config):
+            _emit(config, "token", node="respond", text=answer)
+        _emit(config, "node", node="respond", detail=trace[-1])
+        return {"final_answer": answer, "trace": trace}
 
-        if parsed and parsed.get("store") and parsed.get("memory"):
-            memory_tool.save_memory(
-                text=str(parsed["memory"]),
-                metadata={"kind": "episodic", "source_query": query},
-            )
-            trace_line = "persist_memory: stored episodic fact"
-        else:
-            trace_line = "persist_memory: skipped"
+    def respond(state: AgentState, config: RunnableConfig) -> AgentState:
+        templated = _templated_update(state, config)
+        if templated is not None:
+            return templated
+        results_text, compaction = _compacted_results(state)
+        prompt = _respond_prompt(state, results_text)
+        try:
+            with scheduler.slot("respond"):
+                if not _streaming(config):
+                    response = llm.invoke(prompt)
+                    record_llm_call("respond", response)
+                    return _answer_update(state, config, response.content, compaction)
+
+                parts: list[str] = []
+                # Ollama puts the token counts and timings on the last chunk.
+                metadata: dict[str, Any] = {}
+                for chunk in llm.stream(prompt):
+                    metadata.update(chunk.response_metadata or {})
+                    text = chunk.content if isinstance(chunk.content, str) else str(chunk.content)
+                    if text:
+                        parts.append(text)
+                        _emit(config, "token", node="respond", text=text)
+        except DeadlineExceeded:
+            return _deadline_answer_update(state, config)
+        record_llm_call("respond", metadata)
+        return _answer_update(state, config, "".join(parts), compaction)
+
+    async def arespond(state: AgentState, config: RunnableConfig) -> AgentState:
+        templated = _templated_update(state, config)
+        if templated is not None:
+            return templated
+        results_text, compaction = _compacted_results(state)
+        prompt = _respond_prompt(state, results_text)
+        try:
+            async with scheduler.aslot("respond"):
+                if not _streaming(config):
+                    response = await llm.ainvoke(prompt)
+                    record_llm_call("respond", response)
+                    return _answer_update(state, config, response.content, compaction)
+
+                parts: list[str] = []
+                metadata: dict[str, Any] = {}
+                async for chunk in llm.astream(prompt):
+                    metadata.update(chunk.response_metadata or {})
+                    text = chunk.content if isinstance(chunk.content, str) else str(chunk.content)
+                    if text:
+                        parts.append(text)
+                        _emit(config, "token", node="respond", text=text)
+        except DeadlineExceeded:
+            return _deadline_answer_update(state, config)
+        record_llm_call("respond", metadata)
+        return _answer_update(state, config, "".join(parts), compaction)
 
-        trace.append(trace_line)
+    def persist_memory(state: AgentState, config: RunnableConfig) -> AgentState:
+        # Summarization and storage happen in the background writer, off the request path.
+        explicit = _looks_like_memory_intent(state["user_query"])
+        memory_writer.enqueue(state["user_query"], state.get("final_answer", ""), explicit=explicit)
+        trace_line = f"persist_memory: queued {'explicit preference/fact' if explicit else 'for episodic summary'}"
+        trace = list(state.get("trace", [])) + [trace_line]
         logger.info("[TRACE] %s", trace_line)
+        _emit(config, "node", node="persist_memory", detail=trace_line)
+        usage = summarize_usage(state.get("llm_usage") or [])
+        if usage:
+            trace.append(
+                "llm_usage: "
+                + ", ".join(
+                    f"{node} calls={u['calls']} tokens={u['prompt_tokens']}+{u['completion_tokens']} "
+                    f"load={u['load_ms']:.0f}ms eval={u['prompt_eval_ms'] + u['eval_ms']:.0f}ms"
+                    for node, u in usage.items()
+                )
+            )
+            logger.info("[TRACE] %s", trace[-1])
         return {"trace": trace}
 
+    # Each node carries a sync and an async implementation so the compiled graph
+    # supports both `invoke` (CLI) and `ainvoke` (FastAPI) without blocking the loop.
+    # _traced_node also records a timing span per node run.
     graph = StateGraph(AgentState)
-    graph.add_node("load_memory", load_memory)
-    graph.add_node("planner", planner)
-    graph.add_node("execute", execute)
-    graph.add_node("respond", respond)
-    graph.add_node("persist_memory", persist_memory)
+    # Not traced: it starts the turn's span list.
+    graph.add_node("begin_turn", RunnableLambda(begin_turn, afunc=abegin_turn, name="begin_turn"))
+    graph.add_node("load_memory", _traced_node("load_memory", load_memory, aload_memory))
+    graph.add_node("planner", _traced_node("planner", planner, aplanner))
+    graph.add_node("execute", _traced_node("execute", execute, aexecute))
+    graph.add_node("respond", _traced_node("respond", respond, arespond))
+    graph.add_node("persist_memory", _traced_node("persist_memory", persist_memory))
+
+    # The speculative KB search starts beside load_memory and overlaps the planner.
+    entry_nodes = ["load_memory"]
+    if prefetcher is not None:
+        graph.add_node("prefetch_rag", _traced_node("prefetch_rag", prefetch_rag, aprefetch_rag))
+        entry_nodes.append("prefetch_rag")
 
-    graph.add_edge(START, "load_memory")
+    if answer_cache is None:
+        for node in entry_nodes:
+            graph.add_edge("begin_turn", node)
+        graph.add_edge("respond", "persist_memory")
+    else:
+        graph.add_node(
+            "answer_cache",
+            _traced_node("answer_cache", check_answer_cache, acheck_answer_cache),
+        )
+        graph.add_node("store_answer", _traced_node("store_answer", store_answer))
+        graph.add_edge("begin_turn", "answer_cache")
+        graph.add_conditional_edges(
+            "answer_cache",
+            lambda state: END if state.get("answer_cache_hit") else entry_nodes,
+            [END, *entry_nodes],
+        )
+        graph.add_edge("respond", "store_answer")
+        graph.add_edge("store_answer", "persist_memory")
     graph.add_edge("load_memory", "planner")
-    graph.add_edge("planner", "execute")
+    if prefetcher is not None:
+        graph.add_edge(["planner", "prefetch_rag"], "execute")
+    else:
+        graph.add_edge("planner", "execute")
     graph.add_edge("execute", "respond")
-    graph.add_edge("respond", "persist_memory")
+    graph.add_edge(START, "begin_turn")
     graph.add_edge("persist_memory", END)
 
-    return graph.compile()
+    # With a session store, state is checkpointed per session id (`thread_id`).
+    return graph.compile(checkpointer=sessions.checkpointer if sessions is not None else None)
 
@@ -1,11 +1,14 @@
 import logging
 import os
+import uuid
 
 from dotenv import load_dotenv
 from langchain_ollama import ChatOllama
 
 from bootstrap_stack import ensure_zadanie2_stack
 from graph import create_agent_graph
+from memory_writer import memory_writer_from_env
+from sessions import session_store_from_env
 
 
 def configure_logging() -> None:
@@ -33,7 +36,11 @@ def main() -> None:
         temperature=float(os.getenv("OLLAMA_TEMPERATURE", "0.1")),
     )
 
-    app = create_agent_graph(llm)
+    memory_writer = memory_writer_from_env()
+    sessions = session_store_from_env()
+    app = create_agent_graph(llm, memory_writer=memory_writer, sessions=sessions)
+    # One session per CLI run, so follow-ups like "and for the last hour?" work.
+    session_id = str(uuid.uuid4())
 
     print("LangGraph Plan-Execute agent is running. Type 'exit' to stop.")
     while True:
@@ -41,10 +48,12 @@ def main() -> None:
         if not user_query:
             continue
         if user_query.lower() in {"exit", "quit", "q"}:
+            print("Saving memories...")
+            memory_writer.flush(timeout=60)
             print("Bye.")
             break
 
-        state = app.invoke({"user_query": user_query})
+        state = app.invoke({"user_query": user_query}, config=sessions.config(session_id))
         print(f"\nAgent> {state.get('final_answer', '(no answer)')}")
 
 
@@ -1,11 +1,15 @@
-import json
 import logging
-import os
 import re
 import sys
+from pathlib import Path
 from typing import Any
 
-import psycopg
+# Started as a script (`python mcp_server/mcp_postgres_server.py`); make `tools` importable.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tools.columnar import encode_columns  # noqa: E402
+from tools.mcp_server_loop import serve  # noqa: E402
+from tools.pg_pool import pg_pool_from_env  # noqa: E402
 
 logging.basicConfig(level=logging.INFO, format="[%(asctime)s] [MCP-POSTGRES] %(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
@@ -44,63 +48,35 @@ def is_read_only_sql(query: str) -> bool:
 
 class PostgresServer:
     def __init__(self) -> None:
-        self.conn = psycopg.connect(
-            host=os.getenv("POSTGRES_HOST", "localhost"),
-            port=int(os.getenv("POSTGRES_PORT", "5432")),
-            dbname=os.getenv("POSTGRES_DB", "lankovacka"),
-            user=os.getenv("POSTGRES_USER", "langflow"),
-            password=os.getenv("POSTGRES_PASSWORD", "langflow"),
-            autocommit=True,
-        )
-
-    def run_select(self, query: str, limit: int = 100) -> dict[str, Any]:
+        # Same pool as the native backend: health checks, reconnects, PG_POOL_* sizing.
+        self.pool = pg_pool_from_env()
+
+    def run_select(self, query: str, limit: int = 100, statement_timeout_ms: int = 0) -> dict[str, Any]:
         if not is_read_only_sql(query):
             raise ValueError("Only read-only SELECT/WITH/EXPLAIN queries are allowed.")
 
         limited_query = f"SELECT * FROM ({query.rstrip(';')}) AS q LIMIT {int(limit)}"
-        with self.conn.cursor() as cur:
-            cur.execute(limited_query)
-            rows = cur.fetchall()
-            columns = [c.name for c in cur.description]
-        return {"columns": columns, "rows": rows, "row_count": len(rows)}
+        # The client derives the timeout from the request deadline (0 = no limit).
+        columns, rows = self.pool.query(limited_query, statement_timeout_ms)
+        return encode_columns(columns, rows)
 
-
-def write_response(payload: dict[str, Any]) -> None:
-    sys.stdout.write(json.dumps(payload, ensure_ascii=True) + "\n")
-    sys.stdout.flush()
+    def stats(self) -> dict[str, Any]:
+        return self.pool.stats()
 
 
 def main() -> None:
     server = PostgresServer()
     logger.info("Postgres MCP server started.")
-
-    for line in sys.stdin:
-        line = line.strip()
-        if not line:
-            continue
-        request: dict[str, Any] | None = None
-        try:
-            request = json.loads(line)
-            req_id = request.get("id")
-            method = request.get("method")
-            params = request.get("params", {})
-
-            if method == "ping":
-                write_response({"id": req_id, "ok": True, "result": "pong"})
-                continue
-
-            if method == "run_select":
-                result = server.run_select(
-                    query=str(params.get("query", "")),
-                    limit=int(params.get("limit", 100)),
-                )
-                write_response({"id": req_id, "ok": True, "result": result})
-                continue
-
-            write_response({"id": req_id, "ok": False, "error": f"Unknown method: {method}"})
-        except Exception as exc:
-            logger.exception("Request handling failed")
-            write_response({"id": request.get("id") if request else None, "ok": False, "error": str(exc)})
+    serve(
+        {
+            "run_select": lambda params: server.run_select(
+                query=str(params.get("query", "")),
+                limit=int(params.get("limit", 100)),
+                statement_timeout_ms=int(params.get("statement_timeout_ms", 0)),
+            ),
+            "stats": lambda params: server.stats(),
+        }
+    )
 
 
 if __name__ == "__main__":
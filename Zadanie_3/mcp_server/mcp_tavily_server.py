@@ -1,11 +1,16 @@
-import json
 import logging
 import os
 import sys
+from pathlib import Path
 from typing import Any
 
 from tavily import TavilyClient
 
+# Started as a script (`python mcp_server/mcp_tavily_server.py`); make `tools` importable.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tools.mcp_server_loop import serve  # noqa: E402
+
 logging.basicConfig(level=logging.INFO, format="[%(asctime)s] [MCP-TAVILY] %(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
@@ -17,11 +22,12 @@ class TavilyServer:
             raise ValueError("Missing TAVILY_API_KEY environment variable.")
         self.client = TavilyClient(api_key=api_key)
 
-    def search(self, query: str, max_results: int = 5) -> list[dict[str, Any]]:
+    def search(self, query: str, max_results: int = 5, timeout: float = 60) -> list[dict[str, Any]]:
         response = self.client.search(
             query=query,
             max_results=max_results,
             include_raw_content=False,
+            timeout=timeout,
         )
         rows = response.get("results", [])
         return [
@@ -34,42 +40,18 @@ class TavilyServer:
         ]
 
 
-def write_response(payload: dict[str, Any]) -> None:
-    sys.stdout.write(json.dumps(payload, ensure_ascii=True) + "\n")
-    sys.stdout.flush()
-
-
 def main() -> None:
     server = TavilyServer()
     logger.info("Tavily MCP server started.")
-
-    for line in sys.stdin:
-        line = line.strip()
-        if not line:
-            continue
-        request: dict[str, Any] | None = None
-        try:
-            request = json.loads(line)
-            req_id = request.get("id")
-            method = request.get("method")
-            params = request.get("params", {})
-
-            if method == "ping":
-                write_response({"id": req_id, "ok": True, "result": "pong"})
-                continue
-
-            if method == "search":
-                result = server.search(
-                    query=str(params.get("query", "")),
-                    max_results=int(params.get("max_results", 5)),
-                )
-                write_response({"id": req_id, "ok": True, "result": result})
-                continue
-
-            write_response({"id": req_id, "ok": False, "error": f"Unknown method: {method}"})
-        except Exception as exc:
-            logger.exception("Request handling failed")
-            write_response({"id": request.get("id") if request else None, "ok": False, "error": str(exc)})
+    serve(
+        {
+            "search": lambda params: server.search(
+                query=str(params.get("query", "")),
+                max_results=int(params.get("max_results", 5)),
+                timeout=float(params.get("timeout", 60)),
+            ),
+        }
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,270 @@
+"""Background writer that persists interactions to long-term memory in batches."""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from tools.llm_json import safe_json_parse
+from tools.llm_usage import record_llm_call
+from tools.memory_tool import LongTermMemoryTool
+from tools.ollama_scheduler import OllamaScheduler
+
+logger = logging.getLogger(__name__)
+
+
+def _summarize_prompt(items: list[dict[str, Any]]) -> str:
+    interactions = "\n\n".join(
+        f"{idx}.\nUser: {item['user_query']}\nAgent: {item['final_answer']}"
+        for idx, item in enumerate(items, start=1)
+    )
+    return f"""
+For each numbered interaction, extract one concise reusable fact.
+Return JSON: {{"memories": [{{"index": 1, "store": true, "memory": "..."}}, ...]}}
+Use {{"store": false, "memory": ""}} for interactions where nothing useful should be stored.
+
+Interactions:
+{interactions}
+""".strip()
+
+
+def _explicit_memory(item: dict[str, Any]) -> tuple[str, dict[str, Any]]:
+    query = item["user_query"]
+    memory_text = f"User memory: {query} | Agent answer: {item['final_answer'][:300]}"
+    return memory_text, {"kind": "preference_or_fact", "source_query": query}
+
+
+def _episodic_memories(items: list[dict[str, Any]], raw: Any) -> list[tuple[str, dict[str, Any]]]:
+    parsed = safe_json_parse(raw if isinstance(raw, str) else str(raw))
+    if isinstance(parsed, dict):
+        parsed = parsed.get("memories")
+    if not isinstance(parsed, list):
+        logger.warning("[MEMORY_WRITER] Could not parse batch summary; skipping %d interactions", len(items))
+        return []
+
+    memories: list[tuple[str, dict[str, Any]]] = []
+    for entry in parsed:
+        if not isinstance(entry, dict) or not entry.get("store") or not entry.get("memory"):
+            continue
+        try:
+            item = items[int(entry.get("index", 0)) - 1]
+        except (TypeError, ValueError, IndexError):
+            continue
+        memories.append((str(entry["memory"]), {"kind": "episodic", "source_query": item["user_query"]}))
+    return memories
+
+
+class BackgroundMemoryWriter:
+    """Queue of finished interactions, drained by a worker thread in batches.
+
+    Pending interactions are mirrored to a JSONL file, so a restart picks up
+    whatever had not been written yet.
+    """
+
+    def __init__(
+        self,
+        queue_path: str | None,
+        batch_size: int = 8,
+        max_delay_seconds: float = 2.0,
+        max_attempts: int = 3,
+        retry_delay_seconds: float = 5.0,
+    ) -> None:
+        self.queue_path = Path(queue_path) if queue_path else None
+        self.batch_size = max(1, batch_size)
+        self.max_delay_seconds = max_delay_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay_seconds = retry_delay_seconds
+        self._cond = threading.Condition()
+        self._pending: list[dict[str, Any]] = []
+        self._in_flight = False
+        self._flush_requested = False
+        self._stopping = False
+        self._thread: threading.Thread | None = None
+        self._llm: BaseChatModel | None = None
+        self._scheduler = OllamaScheduler(max_concurrency=0)
+        self._memory_tool: LongTermMemoryTool | None = None
+        self._stats = {"enqueued": 0, "written": 0, "skipped": 0, "batches": 0, "failed_batches": 0, "dropped": 0}
+        self._load()
+
+    def _load(self) -> None:
+        if self.queue_path is None or not self.queue_path.exists():
+            return
+        try:
+            lines = self.queue_path.read_text(encoding="utf-8").splitlines()
+        except Exception as exc:
+            logger.warning("[MEMORY_WRITER] Ignoring unreadable queue file %s: %s", self.queue_path, exc)
+            return
+        for line in lines:
+            try:
+                self._pending.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A torn last line from a crash mid-append.
+                continue
+        if self._pending:
+            logger.info("[MEMORY_WRITER] Recovered %d queued interactions from %s", len(self._pending), self.queue_path)
+
+    def _append_locked(self, item: dict[str, Any]) -> None:
+        if self.queue_path is None:
+            return
+        try:
+            self.queue_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.queue_path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        except Exception as exc:
+            logger.warning("[MEMORY_WRITER] Could not append to queue file %s: %s", self.queue_path, exc)
+
+    def _rewrite_locked(self) -> None:
+        if self.queue_path is None:
+            return
+        try:
+            self.queue_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.queue_path.with_suffix(self.queue_path.suffix + ".tmp")
+            tmp.write_text(
+                "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in self._pending),
+                encoding="utf-8",
+            )
+            os.replace(tmp, self.queue_path)
+        except Exception as exc:
+            logger.warning("[MEMORY_WRITER] Could not rewrite queue file %s: %s", self.queue_path, exc)
+
+    def start(
+        self, llm: BaseChatModel, memory_tool: LongTermMemoryTool, scheduler: OllamaScheduler | None = None
+    ) -> None:
+        """Bind the summarizer and memory store and start the worker (idempotent)."""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._llm = llm
+            self._memory_tool = memory_tool
+            self._scheduler = scheduler or OllamaScheduler(max_concurrency=0)
+            self._thread = threading.Thread(target=self._run, name="memory-writer", daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def enqueue(self, user_query: str, final_answer: str, explicit: bool) -> None:
+        item = {
+            "id": str(uuid.uuid4()),
+            "user_query": user_query,
+            "final_answer": final_answer,
+            "explicit": explicit,
+            "enqueued_at": time.time(),
+            "attempts": 0,
+        }
+        with self._cond:
+            self._pending.append(item)
+            self._append_locked(item)
+            self._stats["enqueued"] += 1
+            self._cond.notify_all()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Write everything queued so far; True once the queue is empty."""
+        with self._cond:
+            if self._thread is None:
+                return not self._pending
+            self._flush_requested = True
+            self._cond.notify_all()
+            done = self._cond.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+            self._flush_requested = False
+            return done
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the worker after its current batch; unwritten items stay on disk."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _next_batch(self) -> list[dict[str, Any]] | None:
+        with self._cond:
+            while not self._pending and not self._stopping:
+                self._cond.wait()
+            if self._stopping:
+                return None
+            # Give the batch a moment to fill unless it is already full or a flush is waiting.
+            deadline = self._pending[0]["enqueued_at"] + self.max_delay_seconds
+            while len(self._pending) < self.batch_size and not self._flush_requested and not self._stopping:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if self._stopping:
+                return None
+            self._in_flight = True
+            return self._pending[: self.batch_size]
+
+    def _run(self) -> None:
+        while (batch := self._next_batch()) is not None:
+            started = time.perf_counter()
+            try:
+                written, skipped = self._write_batch(batch)
+            except Exception as exc:
+                logger.warning("[MEMORY_WRITER] Batch of %d failed: %s", len(batch), exc)
+                self._finish_batch(batch, failed=True)
+                with self._cond:
+                    self._cond.wait_for(lambda: self._stopping, self.retry_delay_seconds)
+                continue
+            self._finish_batch(batch, failed=False)
+            with self._cond:
+                self._stats["written"] += written
+                self._stats["skipped"] += skipped
+            logger.info(
+                "[MEMORY_WRITER] Batch of %d: stored %d, skipped %d in %.2fs",
+                len(batch),
+                written,
+                skipped,
+                time.perf_counter() - started,
+            )
+
+    def _finish_batch(self, batch: list[dict[str, Any]], failed: bool) -> None:
+        batch_ids = {item["id"] for item in batch}
+        with self._cond:
+            if failed:
+                self._stats["failed_batches"] += 1
+                for item in batch:
+                    item["attempts"] = item.get("attempts", 0) + 1
+                exhausted = {item["id"] for item in batch if item["attempts"] >= self.max_attempts}
+                if exhausted:
+                    logger.warning("[MEMORY_WRITER] Dropping %d interactions after %d attempts", len(exhausted), self.max_attempts)
+                    self._stats["dropped"] += len(exhausted)
+                batch_ids = exhausted
+            else:
+                self._stats["batches"] += 1
+            self._pending = [item for item in self._pending if item["id"] not in batch_ids]
+            self._rewrite_locked()
+            self._in_flight = False
+            self._cond.notify_all()
+
+    def _write_batch(self, batch: list[dict[str, Any]]) -> tuple[int, int]:
+        assert self._llm is not None and self._memory_tool is not None
+        memories = [_explicit_memory(item) for item in batch if item["explicit"]]
+        episodic = [item for item in batch if not item["explicit"]]
+        if episodic:
+            # One summarization call for the whole batch instead of one per turn.
+            with self._scheduler.slot("persist_memory"):
+                response = self._llm.invoke(_summarize_prompt(episodic))
+            record_llm_call("persist_memory", response)
+            memories.extend(_episodic_memories(episodic, response.content))
+        self._memory_tool.save_memories(memories)
+        return len(memories), len(batch) - len(memories)
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            return {"queued": len(self._pending), **self._stats}
+
+
+def memory_writer_from_env() -> BackgroundMemoryWriter:
+    return BackgroundMemoryWriter(
+        queue_path=os.getenv("MEMORY_QUEUE_PATH", ".data/memory_queue.jsonl") or None,
+        batch_size=int(os.getenv("MEMORY_WRITER_BATCH_SIZE", "8")),
+        max_delay_seconds=float(os.getenv("MEMORY_WRITER_MAX_DELAY_SECONDS", "2.0")),
+        max_attempts=int(os.getenv("MEMORY_WRITER_MAX_ATTEMPTS", "3")),
+    )
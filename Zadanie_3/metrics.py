@@ -0,0 +1,166 @@
+"""Structured timing spans for graph nodes and tool calls, exported as Prometheus metrics."""
+
+import json
+import logging
+import threading
+from typing import Any, Callable
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# A dedicated registry keeps /metrics to agent metrics and makes graph rebuilds safe.
+REGISTRY = CollectorRegistry()
+
+_SPAN_LABELS = ["node", "tool", "backend", "error"]
+SPAN_SECONDS = Histogram(
+    "agent_span_duration_seconds",
+    "Duration of graph nodes (tool='') and tool calls.",
+    _SPAN_LABELS,
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+    registry=REGISTRY,
+)
+SPAN_BYTES_IN = Counter(
+    "agent_span_bytes_in",
+    "Serialized input size of graph nodes and tool calls.",
+    _SPAN_LABELS,
+    registry=REGISTRY,
+)
+SPAN_BYTES_OUT = Counter(
+    "agent_span_bytes_out",
+    "Serialized output size of graph nodes and tool calls.",
+    _SPAN_LABELS,
+    registry=REGISTRY,
+)
+OLLAMA_WAIT_SECONDS = Histogram(
+    "agent_ollama_wait_seconds",
+    "Time LLM and embedding calls waited for an Ollama slot, by priority class.",
+    ["priority"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+    registry=REGISTRY,
+)
+PG_POOL_WAIT_SECONDS = Histogram(
+    "agent_pg_pool_wait_seconds",
+    "Time native SQL queries waited for a pooled Postgres connection, by sync/async pool.",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    registry=REGISTRY,
+)
+LLM_CALLS = Counter(
+    "agent_llm_calls",
+    "LLM calls, by the node (or tool step) that made them.",
+    ["node"],
+    registry=REGISTRY,
+)
+LLM_TOKENS = Counter(
+    "agent_llm_tokens",
+    "Prompt and completion tokens of LLM calls, by node.",
+    ["node", "kind"],
+    registry=REGISTRY,
+)
+LLM_SECONDS = Counter(
+    "agent_llm_seconds",
+    "Ollama model load, prompt evaluation and generation time of LLM calls, by node.",
+    ["node", "phase"],
+    registry=REGISTRY,
+)
+
+
+def record_ollama_wait(priority: str, seconds: float) -> None:
+    OLLAMA_WAIT_SECONDS.labels(priority).observe(seconds)
+
+
+def record_pg_pool_wait(pool: str, seconds: float) -> None:
+    PG_POOL_WAIT_SECONDS.labels(pool).observe(seconds)
+
+
+def record_llm_usage(usage: dict[str, Any]) -> None:
+    node = usage["node"]
+    LLM_CALLS.labels(node).inc()
+    LLM_TOKENS.labels(node, "prompt").inc(usage["prompt_tokens"])
+    LLM_TOKENS.labels(node, "completion").inc(usage["completion_tokens"])
+    for phase in ("load", "prompt_eval", "eval"):
+        LLM_SECONDS.labels(node, phase).inc(usage[f"{phase}_ms"] / 1000)
+
+
+def payload_bytes(value: Any) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def record_span(
+    node: str,
+    duration_seconds: float,
+    tool: str = "",
+    backend: str = "",
+    bytes_in: int = 0,
+    bytes_out: int = 0,
+    error: str = "",
+) -> dict[str, Any]:
+    """Observe one span and return it as a dict for `AgentState.spans`."""
+    labels = (node, tool, backend, error)
+    SPAN_SECONDS.labels(*labels).observe(duration_seconds)
+    SPAN_BYTES_IN.labels(*labels).inc(bytes_in)
+    SPAN_BYTES_OUT.labels(*labels).inc(bytes_out)
+    span = {
+        "node": node,
+        "tool": tool,
+        "backend": backend,
+        "duration_ms": round(duration_seconds * 1000, 1),
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "error": error,
+    }
+    logger.debug("[SPAN] %s", span)
+    return span
+
+
+class _ComponentStatsCollector:
+    """Exposes the stats() of caches/planners/writers as `agent_component_stat` gauges."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._sources: dict[str, Callable[[], dict[str, Any]]] = {}
+
+    def register(self, component: str, stats: Callable[[], dict[str, Any]]) -> None:
+        with self._lock:
+            self._sources[component] = stats
+
+    def collect(self):
+        family = GaugeMetricFamily(
+            "agent_component_stat",
+            "Counters and ratios reported by agent components (caches, planners, writers).",
+            labels=["component", "stat"],
+        )
+        with self._lock:
+            sources = list(self._sources.items())
+        for component, stats in sources:
+            try:
+                values = stats()
+            except Exception as exc:
+                logger.warning("[METRICS] stats() of %s failed: %s", component, exc)
+                continue
+            for key, value in values.items():
+                # One level of nesting, e.g. fast-path rule_hits.alarm_sop.
+                items = value.items() if isinstance(value, dict) else [("", value)]
+                for sub_key, sub_value in items:
+                    if isinstance(sub_value, (int, float)):
+                        stat = f"{key}.{sub_key}" if sub_key else key
+                        family.add_metric([component, stat], float(sub_value))
+        yield family
+
+
+_component_stats = _ComponentStatsCollector()
+REGISTRY.register(_component_stats)
+
+
+def register_stats(component: str, stats: Callable[[], dict[str, Any]]) -> None:
+    _component_stats.register(component, stats)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
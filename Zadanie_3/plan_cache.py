@@ -0,0 +1,196 @@
+"""Semantic cache of validated plans keyed by query embedding."""
+
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from prefetch import content_terms
+from tools.telemetry_schema import ALARM_CODE_RE, MACHINE_ID_RE, find_tags, find_time_window
+
+logger = logging.getLogger(__name__)
+
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+# Steps that change state from the user's own wording are never replayed for another query.
+_UNCACHEABLE_TOOLS = {"memory_write"}
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def query_entities(query: str) -> dict[str, Any]:
+    """Facts that must match exactly for a cached plan to be reusable.
+
+    Two questions that differ only in the alarm code, tag, machine or time window
+    embed very closely, but need different plans.
+    """
+    return {
+        "alarms": sorted({c.upper() for c in ALARM_CODE_RE.findall(query)}),
+        "machines": sorted({m.upper() for m in MACHINE_ID_RE.findall(query)}),
+        "tags": sorted(find_tags(query)),
+        "window": find_time_window(query),
+        "numbers": sorted(set(_NUMBER_RE.findall(query))),
+    }
+
+
+def cacheable_plan(plan: list[dict[str, Any]]) -> bool:
+    return not any(step.get("tool") in _UNCACHEABLE_TOOLS for step in plan)
+
+
+def plan_fits_query(plan: list[dict[str, Any]], cached_query: str, query: str) -> bool:
+    """Whether no step carries wording of `cached_query` that `query` does not share.
+
+    Entities cover codes, machines, tags and windows, but not free text such as a vendor
+    ("Siemens" vs "ABB") that the planner copies into search instructions.
+    """
+    if not cacheable_plan(plan):
+        return False
+    foreign = content_terms(cached_query) - content_terms(query)
+    return not any(foreign & content_terms(f"{step.get('instruction', '')} {step.get('sql') or ''}") for step in plan)
+
+
+def _unit(vector: list[float]) -> np.ndarray:
+    arr = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(arr))
+    return arr / norm if norm else arr
+
+
+class SemanticPlanCache:
+    def __init__(
+        self,
+        path: str | None,
+        max_entries: int = 512,
+        ttl_seconds: float = 7 * 24 * 3600,
+        similarity_threshold: float = 0.92,
+        save_delay_seconds: float = 2.0,
+    ) -> None:
+        self.path = Path(path) if path else None
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.save_delay_seconds = save_delay_seconds
+        self._lock = threading.Lock()
+        self._save_timer: threading.Timer | None = None
+        # Normalized query -> entry; order is LRU (oldest first).
+        self._entries: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._rejected = 0
+        self._load()
+        atexit.register(self.save)
+
+    def _load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            payload = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception as exc:
+            logger.warning("[PLAN_CACHE] Ignoring unreadable cache file %s: %s", self.path, exc)
+            return
+        for entry in payload.get("entries", []):
+            self._entries[entry["key"]] = entry
+        self._evict_locked(time.time())
+        logger.info("[PLAN_CACHE] Loaded %d entries from %s", len(self._entries), self.path)
+
+    def _schedule_save_locked(self) -> None:
+        # Debounced so bursts of new plans cost one write, off the request path.
+        if self.path is None or self._save_timer is not None:
+            return
+        self._save_timer = threading.Timer(self.save_delay_seconds, self.save)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            self._save_timer = None
+            snapshot = list(self._entries.values())
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(json.dumps({"entries": snapshot}), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except Exception as exc:
+            logger.warning("[PLAN_CACHE] Could not persist cache to %s: %s", self.path, exc)
+
+    def _evict_locked(self, now: float) -> None:
+        expired = [k for k, e in self._entries.items() if now - e["created_at"] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def lookup(self, query: str, embedding: list[float]) -> tuple[list[dict[str, Any]], float] | None:
+        """Return (plan, similarity) of the nearest cached query above the threshold whose plan fits `query`."""
+        entities = query_entities(query)
+        now = time.time()
+        with self._lock:
+            self._evict_locked(now)
+            candidates = [
+                e
+                for e in self._entries.values()
+                if e["entities"] == entities and len(e["embedding"]) == len(embedding)
+            ]
+            best: dict[str, Any] | None = None
+            best_score = -1.0
+            if candidates:
+                matrix = np.asarray([e["embedding"] for e in candidates], dtype=np.float32)
+                scores = matrix @ _unit(embedding)
+                for idx in np.argsort(-scores):
+                    if scores[idx] < self.similarity_threshold:
+                        break
+                    entry = candidates[int(idx)]
+                    if plan_fits_query(entry["plan"], entry["query"], query):
+                        best, best_score = entry, float(scores[idx])
+                        break
+                    self._rejected += 1
+
+            if best is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._entries.move_to_end(best["key"])
+            best["last_used"] = now
+            return best["plan"], best_score
+
+    def put(self, query: str, embedding: list[float], plan: list[dict[str, Any]]) -> bool:
+        """Store a validated plan; plans with `memory_write` steps are not stored."""
+        if not cacheable_plan(plan):
+            return False
+        key = _normalize_query(query)
+        now = time.time()
+        with self._lock:
+            self._entries[key] = {
+                "key": key,
+                "query": query,
+                "entities": query_entities(query),
+                "embedding": [float(x) for x in _unit(embedding)],
+                "plan": plan,
+                "created_at": now,
+                "last_used": now,
+            }
+            self._entries.move_to_end(key)
+            self._evict_locked(now)
+            self._schedule_save_locked()
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / total if total else 0.0,
+                "rejected": self._rejected,
+            }
@@ -0,0 +1,127 @@
+"""Speculative KB retrieval for the user's question, started before the plan exists."""
+
+import asyncio
+import contextvars
+import logging
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable
+
+from tools.telemetry_schema import ALARM_CODE_RE
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[a-z0-9_]{3,}")
+_STOPWORDS = {
+    "the", "and", "for", "what", "does", "how", "should", "when", "with", "from", "this", "that",
+    "about", "are", "was", "were", "which", "who", "can", "you", "please", "tell", "show", "give",
+}
+
+
+def content_terms(text: str) -> set[str]:
+    return {word for word in _WORD_RE.findall(text.lower()) if word not in _STOPWORDS}
+
+
+def instruction_matches(query: str, instruction: str, threshold: float) -> bool:
+    """Whether results retrieved for `query` can stand in for a search on `instruction`.
+
+    Planners rephrase ("What does E204 mean?" -> "SOP for alarm E204"), so this compares
+    the overlap of content words against the shorter side, and never lets the step ask
+    about an alarm code the user did not mention.
+    """
+    query_codes = {code.upper() for code in ALARM_CODE_RE.findall(query)}
+    step_codes = {code.upper() for code in ALARM_CODE_RE.findall(instruction)}
+    if not step_codes <= query_codes:
+        return False
+    query_terms = content_terms(query)
+    step_terms = content_terms(instruction)
+    if not query_terms or not step_terms:
+        return False
+    return len(query_terms & step_terms) / min(len(query_terms), len(step_terms)) >= threshold
+
+
+class RAGPrefetcher:
+    def __init__(
+        self,
+        search: Callable[[str], list[dict[str, Any]]],
+        asearch: Callable[[str], Awaitable[list[dict[str, Any]]]],
+        pool: ThreadPoolExecutor,
+        match_threshold: float = 0.6,
+        max_age_seconds: float = 300,
+    ) -> None:
+        self.search = search
+        self.asearch = asearch
+        self.pool = pool
+        self.match_threshold = match_threshold
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        # prefetch_id -> (query, started_at, Future or asyncio.Task)
+        self._inflight: dict[str, tuple[str, float, Any]] = {}
+        self._started = 0
+        self._hits = 0
+        self._wasted = 0
+
+    def _register(self, query: str, handle: Any) -> str:
+        prefetch_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            # Turns that never reached execute (errors, cancellations) must not pile up.
+            for stale_id in [k for k, v in self._inflight.items() if now - v[1] > self.max_age_seconds]:
+                self._inflight.pop(stale_id)[2].cancel()
+                self._wasted += 1
+            self._inflight[prefetch_id] = (query, now, handle)
+            self._started += 1
+        return prefetch_id
+
+    def start(self, query: str) -> str:
+        # Run in a copy of the caller's context so the search sees the request deadline.
+        return self._register(query, self.pool.submit(contextvars.copy_context().run, self.search, query))
+
+    def astart(self, query: str) -> str:
+        task = asyncio.get_running_loop().create_task(self.asearch(query))
+        # Dropped prefetches are never awaited; consume their outcome to avoid loop warnings.
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return self._register(query, task)
+
+    def claim(self, prefetch_id: str | None, plan: list[dict[str, Any]]) -> tuple[int, Any] | None:
+        """Hand the prefetch to the first matching rag_search step as (plan index, handle).
+
+        Called once per turn; an unmatched prefetch is dropped here.
+        """
+        with self._lock:
+            entry = self._inflight.pop(prefetch_id, None) if prefetch_id else None
+        if entry is None:
+            return None
+        query, _, handle = entry
+        for idx, item in enumerate(plan):
+            if item.get("tool") == "rag_search" and instruction_matches(
+                query, str(item.get("instruction", "")), self.match_threshold
+            ):
+                with self._lock:
+                    self._hits += 1
+                logger.info("[PREFETCH] step=%s reuses speculative KB results", item.get("step", "?"))
+                return idx, handle
+        handle.cancel()
+        with self._lock:
+            self._wasted += 1
+        logger.info("[PREFETCH] no matching rag_search step; dropped speculative KB results")
+        return None
+
+    @staticmethod
+    async def aresult(handle: Any) -> list[dict[str, Any]]:
+        if isinstance(handle, Future):
+            return await asyncio.wrap_future(handle)
+        return await handle
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "started": self._started,
+                "hits": self._hits,
+                "wasted": self._wasted,
+                "in_flight": len(self._inflight),
+                "hit_rate": self._hits / self._started if self._started else 0.0,
+            }
@@ -0,0 +1,200 @@
+"""Deterministic answers for trivial result shapes, rendered without the respond LLM."""
+
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+from decimal import Decimal
+from typing import Any
+
+from tools.telemetry_schema import (
+    ALARM_CODE_RE,
+    DEFAULT_MACHINE_ID,
+    MACHINE_ID_RE,
+    TELEMETRY_TAGS,
+    find_tags,
+    find_time_window,
+)
+
+logger = logging.getLogger(__name__)
+
+_AGGREGATE_RE = re.compile(r"\b(avg|min|max|sum|count)\b", re.IGNORECASE)
+# Column aliases such as `max_value` or `avg_temp`.
+_AGGREGATE_COLUMN_RE = re.compile(r"(?<![a-z])(avg|min|max|sum|count)(?![a-z])", re.IGNORECASE)
+# "last 30 min" is a duration, not a MIN aggregate.
+_DURATION_MIN_RE = re.compile(r"\d+\s*mins?\b", re.IGNORECASE)
+_INTERVAL_RE = re.compile(r"now\s*\(\s*\)\s*-\s*interval\s*'(\d+\s*[a-z]+)'", re.IGNORECASE)
+_AGGREGATE_NAMES = {"avg": "Average", "min": "Minimum", "max": "Maximum", "sum": "Total", "count": "Count"}
+# Columns that may accompany the single number of an aggregate row.
+_LABEL_COLUMNS = {"tag", "unit", "machine_id"}
+# Questions that want interpretation, not just the numbers.
+_REASONING_RE = re.compile(
+    r"\b(why|should|normal|ok|okay|explain|compare|cause|recommend|risk|trend|safe|problem)\b", re.IGNORECASE
+)
+
+
+def _number(value: Any) -> float | int | None:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, (float, Decimal)):
+        return float(value)
+    return None
+
+
+def _format_number(value: float | int) -> str:
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return f"{value:.2f}"
+
+
+def _window_phrase(text: str) -> str:
+    interval = _INTERVAL_RE.search(text)
+    window = find_time_window(f"last {interval.group(1)}" if interval else text)
+    if window is None:
+        return ""
+    if window.startswith("1 "):
+        window = f"1 {window[2:].rstrip('s')}"
+    return f" over the last {window}"
+
+
+def _machine(text: str) -> str:
+    match = MACHINE_ID_RE.search(text)
+    return match.group(0).upper() if match else DEFAULT_MACHINE_ID
+
+
+def _format_ts(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value).replace("T", " ")[:19]
+
+
+def _memory_ack(results: list[dict[str, Any]]) -> str | None:
+    if not results or any(r.get("tool") != "memory_write" for r in results):
+        return None
+    if not all(isinstance(r.get("result"), dict) and r["result"].get("stored") for r in results):
+        return None
+    lines = [f'- "{r.get("instruction", "")}"' for r in results]
+    return "Saved to long-term memory:\n" + "\n".join(lines) + "\n\nI will take this into account in future answers."
+
+
+def _aggregate_answer(result: dict[str, Any], sql_text: str, max_rows: int) -> str | None:
+    columns = [str(c).lower() for c in result.get("columns") or []]
+    rows = result.get("rows") or []
+    if not rows or len(rows) > max_rows:
+        return None
+    value_columns = [c for c in columns if c not in _LABEL_COLUMNS]
+    if len(value_columns) != 1:
+        return None
+    value_idx = columns.index(value_columns[0])
+    aggregate = _AGGREGATE_COLUMN_RE.search(value_columns[0]) or _AGGREGATE_RE.search(
+        _DURATION_MIN_RE.sub(" ", sql_text)
+    )
+    name = _AGGREGATE_NAMES[aggregate.group(1).lower()] if aggregate else "Value"
+
+    tags = find_tags(sql_text)
+    lines: list[str] = []
+    for row in rows:
+        value = _number(row[value_idx])
+        if value is None:
+            # NULL aggregates mean no matching data; the LLM explains that better.
+            return None
+        cells = dict(zip(columns, row))
+        tag = cells.get("tag") or (tags[0] if len(tags) == 1 else "")
+        unit = cells.get("unit") or TELEMETRY_TAGS.get(str(tag), "")
+        label = f"{name} {tag}".strip()
+        lines.append(f"{label}: **{_format_number(value)}{f' {unit}' if unit else ''}**")
+
+    header = f"{_machine(sql_text)}{_window_phrase(sql_text)}"
+    # Rollup results over a now()-relative window (tools/rollup_router.py).
+    source = "Source: telemetry database (SQL)."
+    if result.get("approximate"):
+        source = f"Approximate: {result['approximate']}\n{source}"
+    if len(lines) == 1:
+        return f"{lines[0]} on {header}.\n\n{source}"
+    return f"On {header}:\n" + "\n".join(f"- {line}" for line in lines) + f"\n\n{source}"
+
+
+def _alarm_answer(result: dict[str, Any], sql_text: str, max_rows: int) -> str | None:
+    columns = [str(c).lower() for c in result.get("columns") or []]
+    rows = result.get("rows") or []
+    if "alarm_code" not in columns or "ts" not in columns or len(rows) > max_rows:
+        return None
+    codes = ", ".join(sorted({code.upper() for code in ALARM_CODE_RE.findall(sql_text)}))
+    scope = f"{_machine(sql_text)}{_window_phrase(sql_text)}"
+    if not rows:
+        return f"No {codes + ' ' if codes else ''}alarm events recorded on {scope}.\n\nSource: alarm history (SQL)."
+    subject = f"Alarm {codes}" if codes else "Alarms"
+
+    lines = []
+    for row in rows:
+        cells = dict(zip(columns, row))
+        details = ", ".join(str(cells[key]) for key in ("severity", "state") if cells.get(key))
+        message = f" - {cells['message']}" if cells.get("message") else ""
+        lines.append(f"- {_format_ts(cells['ts'])} **{cells['alarm_code']}**{f' ({details})' if details else ''}{message}")
+    count = f"{len(rows)} event{'s' if len(rows) != 1 else ''}"
+    return f"{subject} on {scope}: {count}.\n" + "\n".join(lines) + "\n\nSource: alarm history (SQL)."
+
+
+class TemplateResponder:
+    """Recognizes trivial tool results and renders them without calling the LLM."""
+
+    def __init__(self, max_rows: int = 5) -> None:
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._turns = 0
+        self._rendered: dict[str, int] = {}
+
+    def _render(self, tool_results: list[dict[str, Any]]) -> tuple[str, str] | None:
+        answer = _memory_ack(tool_results)
+        if answer is not None:
+            return "memory_write", answer
+        if len(tool_results) != 1 or tool_results[0].get("tool") != "sql_query":
+            return None
+        entry = tool_results[0]
+        result = entry.get("result")
+        if not isinstance(result, dict):
+            return None
+        sql_text = f"{result.get('generated_sql', '')} {entry.get('instruction', '')}"
+        answer = _alarm_answer(result, sql_text, self.max_rows)
+        if answer is not None:
+            return "alarm_lookup", answer
+        answer = _aggregate_answer(result, sql_text, self.max_rows)
+        if answer is not None:
+            return "sql_aggregate", answer
+        return None
+
+    def render(
+        self, query: str, tool_results: list[dict[str, Any]], execution_status: dict[str, Any]
+    ) -> tuple[str, str] | None:
+        """Return (template name, answer) for a trivial result shape, or None to use the LLM."""
+        rendered = None
+        trivial = not execution_status.get("partial") and all("result" in r for r in tool_results)
+        if trivial and not _REASONING_RE.search(query):
+            try:
+                rendered = self._render(tool_results)
+            except Exception as exc:
+                logger.warning("[TEMPLATE] Rendering failed, using the LLM: %s", exc)
+        with self._lock:
+            self._turns += 1
+            if rendered is not None:
+                self._rendered[rendered[0]] = self._rendered.get(rendered[0], 0) + 1
+        return rendered
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            rendered = sum(self._rendered.values())
+            return {
+                "turns": self._turns,
+                "llm_skipped": rendered,
+                "skip_rate": rendered / self._turns if self._turns else 0.0,
+                "by_template": dict(self._rendered),
+            }
+
+
+def template_responder_from_env() -> TemplateResponder | None:
+    if os.getenv("RESPONSE_TEMPLATES_ENABLED", "true").lower() != "true":
+        return None
+    return TemplateResponder(max_rows=int(os.getenv("RESPONSE_TEMPLATE_MAX_ROWS", "5")))
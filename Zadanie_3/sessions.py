@@ -0,0 +1,97 @@
+"""Conversation sessions: a bounded in-memory LangGraph checkpointer keyed by session id."""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.memory import InMemorySaver
+
+logger = logging.getLogger(__name__)
+
+# Questions that only make sense with the previous turn ("and for the last hour?").
+_FOLLOWUP_START_RE = re.compile(r"^\s*(?:and|also|what about|how about|same|now|then)\b", re.IGNORECASE)
+_FOLLOWUP_REFERENCE_RE = re.compile(r"\b(?:it|that|this|those|them|same|there)\b", re.IGNORECASE)
+
+
+def is_followup(query: str) -> bool:
+    if _FOLLOWUP_START_RE.search(query):
+        return True
+    return len(query.split()) <= 8 and bool(_FOLLOWUP_REFERENCE_RE.search(query))
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """InMemorySaver whose threads can be compacted to their latest checkpoint.
+
+    Sessions only ever resume from their latest state. `compact_thread` rewrites a thread as
+    that one checkpoint (plus its pending writes) using only the public saver API.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._compact_lock = threading.Lock()
+
+    def compact_thread(self, thread_id: str) -> None:
+        config: RunnableConfig = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+        with self._compact_lock:
+            latest = self.get_tuple(config)
+            if latest is None or latest.parent_config is None:
+                return  # nothing older to drop
+            self.delete_thread(thread_id)
+            checkpoint = latest.checkpoint
+            saved = self.put(config, checkpoint, latest.metadata, checkpoint["channel_versions"])
+            writes: dict[str, list[tuple[str, Any]]] = {}
+            for task_id, channel, value in latest.pending_writes or []:
+                writes.setdefault(task_id, []).append((channel, value))
+            for task_id, task_writes in writes.items():
+                self.put_writes(saved, task_writes, task_id)
+
+
+class SessionStore:
+    """Maps session ids to checkpointer threads, evicting idle and least recently used ones."""
+
+    def __init__(self, max_sessions: int = 200, idle_seconds: float = 1800) -> None:
+        self.max_sessions = max(1, max_sessions)
+        self.idle_seconds = idle_seconds
+        self.checkpointer = BoundedMemorySaver()
+        self._lock = threading.Lock()
+        self._last_seen: OrderedDict[str, float] = OrderedDict()
+        self._evicted = 0
+
+    def _evict_locked(self, now: float) -> None:
+        expired = [sid for sid, seen in self._last_seen.items() if now - seen > self.idle_seconds]
+        while len(self._last_seen) - len(expired) > self.max_sessions:
+            oldest = next(sid for sid in self._last_seen if sid not in expired)
+            expired.append(oldest)
+        for session_id in expired:
+            del self._last_seen[session_id]
+            self.checkpointer.delete_thread(session_id)
+            self._evicted += 1
+        if expired:
+            logger.info("[SESSION] Evicted %d sessions (%d active)", len(expired), len(self._last_seen))
+
+    def config(self, session_id: str, **configurable: Any) -> RunnableConfig:
+        """Graph config for one turn of `session_id`; extra keys go into `configurable`."""
+        now = time.time()
+        with self._lock:
+            self._last_seen[session_id] = now
+            self._last_seen.move_to_end(session_id)
+            self._evict_locked(now)
+        # The previous turn left one checkpoint per graph step; only the last one is resumed.
+        self.checkpointer.compact_thread(session_id)
+        return {"configurable": {"thread_id": session_id, **configurable}}
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"active": len(self._last_seen), "evicted": self._evicted}
+
+
+def session_store_from_env() -> SessionStore:
+    return SessionStore(
+        max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "200")),
+        idle_seconds=float(os.getenv("SESSION_IDLE_SECONDS", "1800")),
+    )
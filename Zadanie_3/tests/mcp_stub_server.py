@@ -0,0 +1,23 @@
+"""Stdio MCP server for tests/test_mcp_client.py: `sleep` and `fail` methods."""
+
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tools.mcp_server_loop import serve  # noqa: E402
+
+
+def sleep(params: dict[str, Any]) -> float:
+    time.sleep(float(params["seconds"]))
+    return params["seconds"]
+
+
+def fail(params: dict[str, Any]) -> None:
+    raise ValueError("stub failure")
+
+
+if __name__ == "__main__":
+    serve({"sleep": sleep, "fail": fail})
@@ -0,0 +1,63 @@
+from answer_cache import AnswerCache
+
+_FINGERPRINT = {
+    "time_bucket": 100,
+    "memory_version": 1,
+    "kb_version": "kb-1",
+    "telemetry_ts": "2024-01-01 08:00:00",
+    "alarms_ts": "2024-01-01 07:00:00",
+}
+
+
+def _sql_result(instruction: str, sql: str) -> dict:
+    return {"tool": "sql_query", "instruction": instruction, "result": {"generated_sql": sql, "rows": [[1]]}}
+
+
+def _changed(**fields) -> dict:
+    return {**_FINGERPRINT, **fields}
+
+
+def test_stale_telemetry_misses():
+    cache = AnswerCache()
+    query = "How many alarms did LNK-01 raise on 2024-01-01?"
+    results = [_sql_result("Count alarms for LNK-01 on 2024-01-01", "SELECT count(*) FROM alarms WHERE ts::date = '2024-01-01'")]
+    assert cache.store(query, "3 alarms.", results, _FINGERPRINT)
+    assert cache.lookup(query, _changed(time_bucket=999)) == "3 alarms."
+    assert cache.lookup(query, _changed(telemetry_ts="2024-01-01 08:05:00")) is None
+    assert cache.stats()["stale_invalidations"] == 1
+
+
+def test_time_relative_query_changes_bucket():
+    cache = AnswerCache()
+    query = "Average gearbox temperature over the last hour?"
+    results = [_sql_result("Average TempGearbox_C", "SELECT avg(temp) FROM telemetry WHERE ts > now() - interval '1 hour'")]
+    assert cache.store(query, "61 C.", results, _FINGERPRINT)
+    assert cache.lookup(query, _FINGERPRINT) == "61 C."
+    assert cache.lookup(query, _changed(time_bucket=101)) is None
+
+
+def test_error_and_memory_turns_are_refused():
+    cache = AnswerCache()
+    failed = [{"tool": "sql_query", "instruction": "Count alarms", "error": "timeout"}]
+    memory = [{"tool": "memory_search", "instruction": "User preferences", "result": []}]
+    assert not cache.store("How many alarms?", "Unknown.", failed, _FINGERPRINT)
+    assert not cache.store("What do I prefer?", "Concise answers.", memory, _FINGERPRINT)
+    assert cache.stats()["entries"] == 0
+
+
+def test_memory_version_change_misses():
+    cache = AnswerCache()
+    query = "What does alarm E204 mean?"
+    results = [{"tool": "rag_search", "instruction": "Alarm E204", "result": []}]
+    assert cache.store(query, "Overheating.", results, _FINGERPRINT)
+    assert cache.lookup(query, _changed(memory_version=2)) is None
+
+
+def test_llm_only_turn_is_keyed_by_memory_and_time():
+    cache = AnswerCache()
+    assert cache.store("Hello", "Hi.", [], _FINGERPRINT)
+    assert cache.lookup("Hello", _FINGERPRINT) == "Hi."
+    assert cache.lookup("Hello", _changed(time_bucket=101)) is None
+    assert cache.store("Hello", "Hi.", [], _FINGERPRINT)
+    assert cache.lookup("Hello", _changed(memory_version=2)) is None
+    assert not cache.store("Hello", "Hi.", [], {"time_bucket": 100})
@@ -0,0 +1,42 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from tools.columnar import dumps, encode_columns, loads, to_rows
+
+_COLUMNS = ["ts", "avg_value", "samples", "flag_count", "note"]
+_ROWS = [
+    (datetime(2024, 1, 1, 8, 0), Decimal("63.125"), 10, True, "ok"),
+    (datetime(2024, 1, 1, 8, 1), 58.5, 11, 3, None),
+    (None, None, None, None, "gap"),
+]
+_EXPECTED_TYPES = ["timestamp", "float", "int", "int", "text"]
+_EXPECTED_ROWS = [
+    ["2024-01-01T08:00:00", 63.125, 10, 1, "ok"],
+    ["2024-01-01T08:01:00", 58.5, 11, 3, None],
+    [None, None, None, None, "gap"],
+]
+
+
+@pytest.mark.parametrize("wire", [False, True], ids=["native", "mcp"])
+def test_round_trip(wire):
+    encoded = encode_columns(_COLUMNS, _ROWS)
+    if wire:
+        encoded = loads(dumps(encoded))
+    assert encoded["types"] == _EXPECTED_TYPES
+    result = to_rows(encoded)
+    assert result["columns"] == _COLUMNS
+    assert result["rows"] == _EXPECTED_ROWS
+    assert result["row_count"] == 3
+    assert [type(v) for v in result["rows"][0][2:4]] == [int, int]
+
+
+def test_column_types():
+    encoded = encode_columns(["a", "b", "c", "d"], [(True, 1, Decimal("1"), None), (False, 2.5, 2, None)])
+    assert encoded["types"] == ["bool", "float", "float", "null"]
+    assert encoded["data"] == [[True, False], [1.0, 2.5], [1.0, 2.0], [None, None]]
+
+
+def test_empty_result():
+    assert to_rows(encode_columns(["n"], [])) == {"columns": ["n"], "types": ["null"], "row_count": 0, "rows": []}
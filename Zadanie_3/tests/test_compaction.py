@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+from compaction import summarize_rows
+
+_START = datetime(2024, 1, 1, 8, 0)
+
+
+def _result(rows):
+    return {"columns": ["ts", "tag", "value"], "rows": rows, "row_count": len(rows)}
+
+
+def test_trend_follows_time_for_descending_rows():
+    rising = [[(_START + timedelta(minutes=i)).isoformat(), "TempGearbox_C", 60 + i] for i in range(20)]
+    summary = summarize_rows(_result(list(reversed(rising))), head_rows=3, tail_rows=3)
+
+    stats = summary["trends"]["all"]["value"]
+    assert stats["first"] == 60 and stats["last"] == 79
+    assert stats["trend"]["direction"] == "rising"
+    assert summary["trends_by"] == "time"
+    assert summary["column_stats"]["ts"]["first"] == rising[0][0]
+    assert summary["column_stats"]["ts"]["last"] == rising[-1][0]
+    # head/tail keep the order the query asked for
+    assert summary["head"][0] == rising[-1]
+
+
+def test_trend_per_group():
+    rows = []
+    for i in range(20):
+        ts = (_START + timedelta(minutes=i)).isoformat()
+        rows.append([ts, "TempGearbox_C", 60 + i])
+        rows.append([ts, "Vibration_mm_s", 5 - 0.2 * i])
+    summary = summarize_rows(_result(rows[::-1]), head_rows=3, tail_rows=3)
+
+    assert summary["trends_by"] == "tag"
+    assert summary["trends"]["TempGearbox_C"]["value"]["trend"]["direction"] == "rising"
+    assert summary["trends"]["Vibration_mm_s"]["value"]["trend"]["direction"] == "falling"
+    assert summary["trends"]["Vibration_mm_s"]["rows"] == 20
+
+
+def test_small_result_is_unchanged():
+    result = _result([["2024-01-01T08:00:00", "TempGearbox_C", 60]])
+    assert summarize_rows(result, head_rows=3, tail_rows=3) is result
@@ -0,0 +1,36 @@
+from answer_cache import DATA_VERSION_SQL
+from tools.sql_result_cache import SQLResultCache
+from tools.sql_tool import SQLPlannerExecutor
+
+
+class _Backend:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def run_select(self, query: str, limit: int = 100) -> dict:
+        self.calls += 1
+        return {"columns": ["telemetry_ts", "alarms_ts"], "types": ["text", "text"],
+                "data": [[f"2024-01-01 08:00:0{self.calls}"], [None]], "row_count": 1}
+
+
+def _executor(monkeypatch, backend: _Backend, cache: SQLResultCache) -> SQLPlannerExecutor:
+    monkeypatch.setattr("tools.sql_tool.NativeSQLTool", lambda: backend)
+    return SQLPlannerExecutor(llm=None, backend_mode="native", mcp_server_path="", result_cache=cache)
+
+
+def test_run_uncached_skips_result_cache(monkeypatch):
+    backend, cache = _Backend(), SQLResultCache(channel=None)
+    executor = _executor(monkeypatch, backend, cache)
+    first = executor.run_uncached(DATA_VERSION_SQL)
+    second = executor.run_uncached(DATA_VERSION_SQL)
+    assert backend.calls == 2
+    assert first["rows"] != second["rows"]
+    assert cache.stats()["entries"] == 0
+
+
+def test_run_uses_result_cache(monkeypatch):
+    backend, cache = _Backend(), SQLResultCache(channel=None)
+    executor = _executor(monkeypatch, backend, cache)
+    executor.run("versions", sql=DATA_VERSION_SQL)
+    assert executor.run("versions", sql=DATA_VERSION_SQL)["sql_backend"] == "cache"
+    assert backend.calls == 1
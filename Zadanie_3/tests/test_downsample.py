@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from tools.downsample import Downsampler, _lttb_indices, _minmax_indices, is_series_sql
+from tools.sql_tool import SQLPlannerExecutor
+
+_START = datetime(2024, 1, 1)
+
+
+def _series(n, tags=("TempGearbox_C",), spike_at=None):
+    ts, tag_col, values = [], [], []
+    for tag in tags:
+        for i in range(n):
+            ts.append((_START + timedelta(seconds=i)).isoformat())
+            tag_col.append(tag)
+            values.append(500.0 if i == spike_at else float(np.sin(i / 50)))
+    return {
+        "columns": ["ts", "tag", "value"],
+        "types": ["timestamp", "text", "float"],
+        "data": [ts, tag_col, values],
+        "row_count": len(ts),
+    }
+
+
+def test_minmax_keeps_bucket_extremes_and_ends():
+    x = np.arange(100, dtype=float)
+    y = np.zeros(100)
+    y[37], y[62] = 9.0, -9.0
+    keep = _minmax_indices(x, [y], points=10)
+    assert {0, 37, 62, 99} <= set(keep.tolist())
+    assert len(keep) <= 12
+
+
+def test_lttb_keeps_requested_points_plus_extremes():
+    x = np.arange(1000, dtype=float)
+    y = np.sin(x / 40)
+    y[500] = 50.0
+    keep = _lttb_indices(x, y, points=50)
+    assert keep[0] == 0 and keep[-1] == 999
+    assert 500 in keep and int(np.argmin(y)) in keep
+    assert len(keep) <= 52
+
+
+def test_lttb_small_series_is_unchanged():
+    x = np.arange(10, dtype=float)
+    assert _lttb_indices(x, x.copy(), points=20).tolist() == list(range(10))
+
+
+def test_apply_downsamples_each_series_and_keeps_spike():
+    result = Downsampler(max_rows=200).apply(_series(5000, tags=("A", "B"), spike_at=1234))
+    assert result["downsampled"] == {"method": "minmax", "rows_before": 10000}
+    assert result["row_count"] <= 200 + 8
+    tags = result["data"][1]
+    assert tags.count("A") > 50 and tags.count("B") > 50
+    assert result["data"][2].count(500.0) == 2
+
+
+def test_apply_lttb():
+    result = Downsampler(max_rows=100, method="lttb").apply(_series(3000, spike_at=10))
+    assert result["downsampled"]["method"] == "lttb"
+    assert 500.0 in result["data"][2]
+    assert result["data"][0] == sorted(result["data"][0])
+
+
+def test_non_series_results_are_truncated():
+    result = {"columns": ["message"], "types": ["text"], "data": [[f"m{i}" for i in range(500)]], "row_count": 500}
+    out = Downsampler(row_limit=100).apply(result)
+    assert out["row_count"] == 100 and out["truncated"] == {"rows_before": 500}
+
+
+def test_small_results_pass_through():
+    result = _series(50)
+    downsampler = Downsampler()
+    assert downsampler.apply(result) is result
+    assert downsampler.stats()["results"] == 0
+
+
+def test_is_series_sql():
+    assert is_series_sql("SELECT ts, tag, value FROM telemetry WHERE machine_id = 'LNK-01' ORDER BY ts")
+    assert is_series_sql(
+        "SELECT date_trunc('minute', ts) AS bucket, avg(value) FROM telemetry GROUP BY 1 ORDER BY bucket LIMIT 500"
+    )
+    assert is_series_sql("SELECT ts, value - lag(value) OVER (ORDER BY ts) AS delta FROM telemetry")
+    assert not is_series_sql("SELECT machine_id, count(*) FROM alarms GROUP BY machine_id ORDER BY 2 DESC")
+    assert not is_series_sql("SELECT ts, message FROM alarms")
+
+
+class _RecordingBackend:
+    def __init__(self) -> None:
+        self.limits: list[int] = []
+
+    def run_select(self, query: str, limit: int = 100) -> dict:
+        self.limits.append(limit)
+        return {"columns": ["n"], "types": ["int"], "data": [[1]], "row_count": 1}
+
+
+def test_fetch_limit_depends_on_sql(monkeypatch):
+    backend = _RecordingBackend()
+    monkeypatch.setattr("tools.sql_tool.NativeSQLTool", lambda: backend)
+    executor = SQLPlannerExecutor(
+        llm=None, backend_mode="native", mcp_server_path="", downsampler=Downsampler(raw_row_limit=20000, row_limit=100)
+    )
+    executor.run_uncached("SELECT machine_id, message FROM alarms ORDER BY severity DESC")
+    executor.run_uncached("SELECT ts, tag, value FROM telemetry ORDER BY ts")
+    assert backend.limits == [100, 20000]
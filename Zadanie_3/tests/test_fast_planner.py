@@ -0,0 +1,55 @@
+from fast_planner import FastPathPlanner
+
+
+def _planner(**kwargs) -> FastPathPlanner:
+    return FastPathPlanner(memory_intent=lambda query: False, **kwargs)
+
+
+def test_minutes_window_is_not_a_min_aggregate():
+    planner = _planner()
+    assert planner.plan("Show TempGearbox_C for the last 30 min") is None
+    assert planner.plan("Plot vibration over the last 45 mins on LNK-01") is None
+
+
+def test_min_aggregate_with_minutes_window():
+    plan = _planner(inline_sql=True).plan("What was the min TempGearbox_C in the last 30 min?")
+    assert plan is not None and plan.rule == "telemetry_aggregate"
+    assert "MIN(value)" in plan.plan[0]["sql"]
+    assert "interval '30 minutes'" in plan.plan[0]["sql"]
+
+
+def test_max_aggregate():
+    plan = _planner(inline_sql=True).plan("Max vibration on LNK-02 over the last 8 hours")
+    assert plan is not None and plan.rule == "telemetry_aggregate"
+    assert "MAX(value)" in plan.plan[0]["sql"]
+    assert "machine_id='LNK-02'" in plan.plan[0]["sql"]
+
+
+def test_vendor_question_naming_a_tag_is_not_telemetry():
+    planner = _planner()
+    assert planner.plan("What is the max line speed allowed by the Siemens drive in the last shift?") is None
+
+
+def test_vendor_lookup():
+    plan = _planner().plan("Where is the Siemens SINAMICS datasheet?")
+    assert plan is not None and plan.rule == "vendor_lookup"
+    assert plan.plan[0]["tool"] == "web_search"
+
+
+def test_alarm_sop_and_history():
+    planner = _planner()
+    assert planner.plan("What does alarm E101 mean?").rule == "alarm_sop"
+    assert planner.plan("When did E101 occur in the last 24 hours?").rule == "alarm_history"
+
+
+def test_correlation_is_left_to_llm():
+    assert _planner().plan("Is the max vibration in the last 8 hours related to E101?") is None
+
+
+def test_stats_count_hits():
+    planner = _planner()
+    planner.plan("Where is the Siemens datasheet?")
+    planner.plan("hello")
+    stats = planner.stats()
+    assert stats["calls"] == 2 and stats["hits"] == 1
+    assert stats["rule_hits"] == {"vendor_lookup": 1}
@@ -0,0 +1,12 @@
+from tools.llm_json import safe_json_parse
+
+
+def test_plain_and_fenced_json():
+    assert safe_json_parse('{"plan": []}') == {"plan": []}
+    assert safe_json_parse('Here:\n```json\n{"a": 1}\n```\nDone') == {"a": 1}
+    assert safe_json_parse("```\n[1, 2]\n```") == [1, 2]
+
+
+def test_invalid_json_is_none():
+    assert safe_json_parse("not json") is None
+    assert safe_json_parse("```json\n{broken\n```") is None
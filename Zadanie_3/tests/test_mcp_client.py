@@ -0,0 +1,62 @@
+import logging
+import os
+import signal
+import time
+from pathlib import Path
+
+import pytest
+
+import tools.mcp_client as mcp_client
+from tools.mcp_client import MCPStdioClient
+
+_SERVER = str(Path(__file__).resolve().parent / "mcp_stub_server.py")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(mcp_client, "MCP_PING_TIMEOUT_SECONDS", 0.5)
+    client = MCPStdioClient(_SERVER, label="stub", processes=1)
+    yield client
+    for server in client._servers:
+        if server.alive:
+            os.kill(server.proc.pid, signal.SIGCONT)
+    client.close()
+
+
+def _wait(condition, seconds: float = 5.0) -> bool:
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_slow_request_times_out_alone(client):
+    pid = client._servers[0].proc.pid
+    with pytest.raises(TimeoutError):
+        client.request("sleep", {"seconds": 2}, timeout=0.2)
+    time.sleep(1.0)  # longer than the ping timeout
+    assert client._servers[0].alive and client._servers[0].proc.pid == pid
+    assert client.request("sleep", {"seconds": 0}, timeout=5) == 0
+    assert client.stats()["killed"] == 0
+
+
+def test_hung_process_is_killed_and_restarted(client):
+    server = client._servers[0]
+    os.kill(server.proc.pid, signal.SIGSTOP)
+    with pytest.raises(TimeoutError):
+        client.request("sleep", {"seconds": 0}, timeout=0.2)
+    assert _wait(lambda: not server.alive)
+    assert client.request("sleep", {"seconds": 0}, timeout=5) == 0
+    stats = client.stats()
+    assert stats["killed"] == 1 and stats["restarts"] == 1
+
+
+def test_server_traceback_reaches_the_log(client, caplog):
+    with caplog.at_level(logging.INFO, logger="tools.mcp_client"):
+        with pytest.raises(RuntimeError, match="stub failure"):
+            client.request("fail", {}, timeout=5)
+        assert _wait(lambda: any("ValueError: stub failure" in r.getMessage() for r in caplog.records))
+    warnings = [r.getMessage() for r in caplog.records if r.levelno == logging.WARNING]
+    assert any("Traceback" in message for message in warnings)
@@ -0,0 +1,69 @@
+from typing import Any
+
+from benchmarks.fakes import FakeChatModel
+from memory_writer import BackgroundMemoryWriter
+
+
+class _MemoryTool:
+    def __init__(self, failing: bool = False) -> None:
+        self.failing = failing
+        self.calls = 0
+        self.saved: list[str] = []
+
+    def save_memories(self, items: list[tuple[str, dict[str, Any]]]) -> list[str]:
+        self.calls += 1
+        if self.failing:
+            raise ConnectionError("chroma unavailable")
+        self.saved.extend(metadata["source_query"] for _, metadata in items)
+        return [str(idx) for idx, _ in enumerate(items)]
+
+
+def _writer(queue_path, **kwargs) -> BackgroundMemoryWriter:
+    return BackgroundMemoryWriter(queue_path=str(queue_path), max_delay_seconds=60, **kwargs)
+
+
+def test_restart_writes_recovered_items_exactly_once(tmp_path):
+    path = tmp_path / "memory_queue.jsonl"
+    first_tool = _MemoryTool()
+    first = _writer(path)
+    first.start(FakeChatModel(), first_tool)  # type: ignore[arg-type]
+    for idx in range(3):
+        first.enqueue(f"Remember preference {idx}", "Saved.", explicit=True)
+    first.stop()  # before the batch delay runs out
+    assert first_tool.saved == []
+
+    tool = _MemoryTool()
+    second = _writer(path)
+    assert second.stats()["queued"] == 3
+    second.start(FakeChatModel(), tool)  # type: ignore[arg-type]
+    assert second.flush(timeout=5)
+    second.stop()
+    assert sorted(tool.saved) == [f"Remember preference {idx}" for idx in range(3)]
+
+    third = _writer(path)
+    assert third.stats()["queued"] == 0
+
+
+def test_failing_batch_is_retried_then_dropped(tmp_path):
+    tool = _MemoryTool(failing=True)
+    writer = _writer(tmp_path / "memory_queue.jsonl", max_attempts=3, retry_delay_seconds=0.01)
+    writer.start(FakeChatModel(), tool)  # type: ignore[arg-type]
+    writer.enqueue("Remember that alerts go to Jan", "Saved.", explicit=True)
+    assert writer.flush(timeout=5)
+    writer.stop()
+    assert tool.calls == 3
+    stats = writer.stats()
+    assert stats["failed_batches"] == 3 and stats["dropped"] == 1 and stats["queued"] == 0
+    assert _writer(tmp_path / "memory_queue.jsonl").stats()["queued"] == 0
+
+
+def test_flush_drains_queue(tmp_path):
+    tool = _MemoryTool()
+    writer = _writer(tmp_path / "memory_queue.jsonl", batch_size=2)
+    writer.start(FakeChatModel(), tool)  # type: ignore[arg-type]
+    for idx in range(5):
+        writer.enqueue(f"Remember preference {idx}", "Saved.", explicit=True)
+    assert writer.flush(timeout=5)
+    writer.stop()
+    assert len(tool.saved) == 5
+    assert writer.stats()["queued"] == 0 and writer.stats()["batches"] == 3
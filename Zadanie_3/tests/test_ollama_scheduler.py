@@ -0,0 +1,176 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from benchmarks.fakes import OFFLINE_ENV, FakeChatModel, FakeMemoryTool, FakeRAGTool, FakeSQLTool, FakeWebSearchTool
+from graph import create_agent_graph
+from memory_writer import BackgroundMemoryWriter
+from tools.deadline import DeadlineExceeded, deadline_scope
+from tools.ollama_scheduler import OllamaScheduler
+
+
+def _wait_until(condition, timeout: float = 2.0) -> None:
+    stop = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < stop, "condition not reached"
+        time.sleep(0.005)
+
+
+def _queued(scheduler: OllamaScheduler) -> int:
+    return sum(scheduler.stats()["queued"].values())
+
+
+def test_waiters_are_served_by_priority():
+    scheduler = OllamaScheduler(max_concurrency=1)
+    order: list[str] = []
+
+    def call(priority: str) -> None:
+        with scheduler.slot(priority):
+            order.append(priority)
+
+    threads = []
+    with scheduler.slot("respond"):
+        for count, priority in enumerate(["persist_memory", "embeddings", "respond", "planner"], start=1):
+            thread = threading.Thread(target=call, args=(priority,))
+            thread.start()
+            threads.append(thread)
+            _wait_until(lambda count=count: _queued(scheduler) == count)
+    for thread in threads:
+        thread.join(2)
+    assert order == ["respond", "planner", "embeddings", "persist_memory"]
+
+
+def test_concurrency_cap():
+    scheduler = OllamaScheduler(max_concurrency=2)
+    lock = threading.Lock()
+    running, peak = 0, 0
+
+    def call() -> None:
+        nonlocal running, peak
+        with scheduler.slot("embeddings"):
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(2)
+    assert peak == 2
+    assert scheduler.stats()["calls"]["embeddings"] == 8
+
+
+def test_sync_and_async_callers_share_slots():
+    scheduler = OllamaScheduler(max_concurrency=1)
+    acquired = threading.Event()
+    release = threading.Event()
+
+    def hold() -> None:
+        with scheduler.slot("persist_memory"):
+            acquired.set()
+            release.wait(2)
+
+    async def main() -> None:
+        thread = threading.Thread(target=hold)
+        thread.start()
+        acquired.wait(2)
+        task = asyncio.create_task(_aslot_used(scheduler, "respond"))
+        while _queued(scheduler) == 0:
+            await asyncio.sleep(0.005)
+        assert not task.done()
+        release.set()
+        assert await asyncio.wait_for(task, 2) == 1
+        thread.join(2)
+
+    asyncio.run(main())
+    assert scheduler.stats()["running"] == 0
+
+
+async def _aslot_used(scheduler: OllamaScheduler, priority: str) -> int:
+    async with scheduler.aslot(priority):
+        return scheduler.stats()["running"]
+
+
+def test_aslot_cancelled_while_granted_releases_slot():
+    scheduler = OllamaScheduler(max_concurrency=1)
+
+    async def main() -> None:
+        holder = scheduler.slot("respond")
+        holder.__enter__()
+        task = asyncio.create_task(_aslot_used(scheduler, "planner"))
+        while _queued(scheduler) == 0:
+            await asyncio.sleep(0)
+        holder.__exit__(None, None, None)  # hands the slot to the waiting task...
+        assert scheduler.stats()["running"] == 1
+        task.cancel()  # ...which goes away before it runs again
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert scheduler.stats()["running"] == 0
+    with scheduler.slot("respond"):
+        pass
+
+
+def test_slot_gives_up_at_deadline():
+    scheduler = OllamaScheduler(max_concurrency=1)
+    with scheduler.slot("respond"):
+        started = time.perf_counter()
+        with deadline_scope(time.time() + 0.2), pytest.raises(DeadlineExceeded):
+            with scheduler.slot("planner"):
+                pass
+        assert time.perf_counter() - started < 2
+    # The abandoned waiter does not keep the slot once it is released.
+    with scheduler.slot("respond"):
+        assert scheduler.stats()["running"] == 1
+    assert scheduler.stats()["running"] == 0
+
+
+def test_aslot_gives_up_at_deadline():
+    scheduler = OllamaScheduler(max_concurrency=1)
+
+    async def main() -> None:
+        with scheduler.slot("respond"):
+            with deadline_scope(time.time() + 0.2), pytest.raises(DeadlineExceeded):
+                async with scheduler.aslot("planner"):
+                    pass
+        async with scheduler.aslot("planner"):
+            assert scheduler.stats()["running"] == 1
+
+    asyncio.run(main())
+    assert scheduler.stats()["running"] == 0
+
+
+def test_saturated_scheduler_gives_degraded_answer(monkeypatch):
+    for name, value in OFFLINE_ENV.items():
+        monkeypatch.setenv(name, value)
+    scheduler = OllamaScheduler(max_concurrency=1)
+    writer = BackgroundMemoryWriter(queue_path=None)
+    graph = create_agent_graph(
+        FakeChatModel(),  # type: ignore[arg-type]
+        memory_writer=writer,
+        scheduler=scheduler,
+        sql_tool=FakeSQLTool(),  # type: ignore[arg-type]
+        rag_tool=FakeRAGTool(),  # type: ignore[arg-type]
+        memory_tool=FakeMemoryTool(),  # type: ignore[arg-type]
+        web_search_tool=FakeWebSearchTool(),  # type: ignore[arg-type]
+    )
+    try:
+        started = time.perf_counter()
+        with scheduler.slot("persist_memory"):  # the only slot is busy for the whole turn
+            state = graph.invoke(
+                {"user_query": "What does alarm E204 mean?"},
+                config={"configurable": {"thread_id": "t1", "deadline_seconds": 0.5}},
+            )
+        assert time.perf_counter() - started < 5
+        assert "deadline was reached" in state["final_answer"]
+        assert "planner: steps=1 fallback (deadline)" in state["trace"]
+        assert state["execution_status"]["partial"]
+    finally:
+        writer.stop()
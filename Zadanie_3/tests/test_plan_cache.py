@@ -0,0 +1,76 @@
+import time
+
+from plan_cache import SemanticPlanCache, plan_fits_query
+
+_SQL_PLAN = [{"step": 1, "tool": "sql_query", "instruction": "Average TempGearbox_C on LNK-01 over the last 8 hours"}]
+_QUERY = "What was the average gearbox temperature on LNK-01 over the last 8 hours?"
+
+
+def _cache(**kwargs) -> SemanticPlanCache:
+    return SemanticPlanCache(path=None, **kwargs)
+
+
+def test_hit_above_threshold():
+    cache = _cache()
+    cache.put(_QUERY, [1.0, 0.0], _SQL_PLAN)
+    plan, similarity = cache.lookup("Average gearbox temperature on LNK-01 over the last 8 hours?", [0.99, 0.05])
+    assert plan == _SQL_PLAN and similarity > 0.92
+    assert cache.lookup(_QUERY, [0.0, 1.0]) is None
+
+
+def test_entity_mismatch_misses():
+    cache = _cache()
+    cache.put(_QUERY, [1.0, 0.0], _SQL_PLAN)
+    assert cache.lookup(_QUERY.replace("LNK-01", "LNK-02"), [1.0, 0.0]) is None
+    assert cache.lookup(_QUERY.replace("8 hours", "2 hours"), [1.0, 0.0]) is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_ttl_expiry(monkeypatch):
+    cache = _cache(ttl_seconds=60)
+    cache.put(_QUERY, [1.0, 0.0], _SQL_PLAN)
+    now = time.time()
+    monkeypatch.setattr("plan_cache.time.time", lambda: now + 61)
+    assert cache.lookup(_QUERY, [1.0, 0.0]) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction():
+    cache = _cache(max_entries=2)
+    cache.put("first question about E101", [1.0, 0.0], _SQL_PLAN)
+    cache.put("second question about E102", [1.0, 0.0], _SQL_PLAN)
+    assert cache.lookup("first question about E101", [1.0, 0.0]) is not None  # now most recent
+    cache.put("third question about E103", [1.0, 0.0], _SQL_PLAN)
+    assert cache.lookup("second question about E102", [1.0, 0.0]) is None
+    assert cache.lookup("first question about E101", [1.0, 0.0]) is not None
+
+
+def test_persistence_across_reload(tmp_path):
+    path = tmp_path / "plans.json"
+    cache = SemanticPlanCache(path=str(path))
+    cache.put(_QUERY, [1.0, 0.0], _SQL_PLAN)
+    cache.save()
+    plan, _ = SemanticPlanCache(path=str(path)).lookup(_QUERY, [1.0, 0.0])
+    assert plan == _SQL_PLAN
+
+
+def test_memory_write_plans_are_not_cached():
+    cache = _cache()
+    plan = [{"step": 1, "tool": "memory_write", "instruction": "Gearbox temperature alerts go to Jan"}]
+    assert cache.put("Remember that gearbox temperature alerts go to Jan", [1.0, 0.0], plan) is False
+    assert cache.lookup("Remember that gearbox temperature alerts go to Peter", [1.0, 0.0]) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_free_text_from_another_query_is_not_replayed():
+    cache = _cache()
+    plan = [{"step": 1, "tool": "web_search", "instruction": "Siemens drive compatibility with induction motor"}]
+    cache.put("Is the Siemens drive compatible with our motor?", [1.0, 0.0], plan)
+    assert cache.lookup("Is the ABB drive compatible with our motor?", [1.0, 0.0]) is None
+    assert cache.lookup("Is the Siemens drive compatible with the motor?", [1.0, 0.0]) is not None
+    assert cache.stats()["rejected"] == 1
+
+
+def test_plan_fits_query_ignores_wording_the_step_does_not_use():
+    plan = [{"step": 1, "tool": "rag_search", "instruction": "SOP for alarm E204"}]
+    assert plan_fits_query(plan, "Please explain alarm E204", "What does alarm E204 mean?")
@@ -0,0 +1,65 @@
+from response_templates import TemplateResponder
+
+_AVG_SQL = (
+    "SELECT tag, AVG(value) AS avg_value, unit FROM telemetry WHERE machine_id='LNK-02' "
+    "AND ts >= now() - interval '8 hours' AND tag IN ('TempGearbox_C') GROUP BY tag, unit"
+)
+
+
+def _sql_turn(columns, rows, sql, instruction="", **extra):
+    result = {"columns": columns, "rows": rows, "generated_sql": sql, **extra}
+    return [{"tool": "sql_query", "instruction": instruction, "result": result}]
+
+
+def test_single_aggregate():
+    turn = _sql_turn(["tag", "avg_value", "unit"], [["TempGearbox_C", 63.142, "°C"]], _AVG_SQL)
+    name, answer = TemplateResponder().render("Average gearbox temperature?", turn, {})
+    assert name == "sql_aggregate"
+    assert answer.startswith("Average TempGearbox_C: **63.14 °C** on LNK-02 over the last 8 hours.")
+
+
+def test_aggregate_per_tag_and_column_alias():
+    sql = "SELECT tag, MAX(value) AS max_value FROM telemetry WHERE ts >= now() - interval '1 day' GROUP BY tag"
+    turn = _sql_turn(["tag", "max_value"], [["TempGearbox_C", 71], ["TempMotor_C", 80.5]], sql)
+    _, answer = TemplateResponder().render("Peak temperatures today", turn, {})
+    assert "- Maximum TempGearbox_C: **71 °C**" in answer
+    assert "- Maximum TempMotor_C: **80.50 °C**" in answer
+
+
+def test_minutes_window_is_not_minimum():
+    sql = "SELECT value FROM telemetry WHERE tag='TempGearbox_C' ORDER BY ts DESC LIMIT 1"
+    turn = _sql_turn(["value"], [[63.1]], sql, instruction="Latest TempGearbox_C in the last 30 min")
+    _, answer = TemplateResponder().render("Latest gearbox temperature", turn, {})
+    assert answer.startswith("Value TempGearbox_C: **63.10 °C** on LNK-01 over the last 30 minutes.")
+
+
+def test_approximate_rollup_note():
+    turn = _sql_turn(["avg_value"], [[63.1]], _AVG_SQL, approximate="Computed from telemetry_1m.")
+    _, answer = TemplateResponder().render("Average gearbox temperature?", turn, {})
+    assert "Approximate: Computed from telemetry_1m.\nSource: telemetry database (SQL)." in answer
+
+
+def test_alarm_lookup():
+    sql = "SELECT ts, alarm_code, severity, message, state FROM alarms WHERE alarm_code IN ('E204')"
+    rows = [["2024-01-01T08:00:00", "E204", "high", "Wire break", "active"]]
+    name, answer = TemplateResponder().render("When did E204 fire?", _sql_turn(
+        ["ts", "alarm_code", "severity", "message", "state"], rows, sql, "E204 in the last 24 hours"), {})
+    assert name == "alarm_lookup"
+    assert answer.startswith("Alarm E204 on LNK-01 over the last 24 hours: 1 event.")
+    assert "- 2024-01-01 08:00:00 **E204** (high, active) - Wire break" in answer
+
+
+def test_memory_ack():
+    turn = [{"tool": "memory_write", "instruction": "I prefer Celsius", "result": {"stored": True}}]
+    name, answer = TemplateResponder().render("Remember I prefer Celsius", turn, {})
+    assert name == "memory_write" and '- "I prefer Celsius"' in answer
+
+
+def test_llm_is_used_for_reasoning_partial_or_null_results():
+    responder = TemplateResponder()
+    turn = _sql_turn(["avg_value"], [[63.1]], _AVG_SQL)
+    assert responder.render("Is this temperature normal?", turn, {}) is None
+    assert responder.render("Average temperature", turn, {"partial": True}) is None
+    assert responder.render("Average temperature", _sql_turn(["avg_value"], [[None]], _AVG_SQL), {}) is None
+    stats = responder.stats()
+    assert stats["turns"] == 3 and stats["llm_skipped"] == 0
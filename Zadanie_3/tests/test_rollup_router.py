@@ -0,0 +1,79 @@
+import pytest
+
+from tools.rollup_router import RollupRouter
+
+
+@pytest.fixture
+def router() -> RollupRouter:
+    return RollupRouter()
+
+
+def test_aligned_day_bounds_use_daily_rollup(router):
+    sql, table, note = router.rewrite(
+        "SELECT tag, avg(value) FROM telemetry WHERE machine_id='LNK-01' "
+        "AND ts >= '2024-01-01' AND ts < '2024-01-03' GROUP BY tag"
+    )
+    assert table == "telemetry_1d" and note is None
+    assert "sum(value_sum) / nullif(sum(value_count), 0)" in sql
+    assert "bucket >= '2024-01-01' AND bucket < '2024-01-03'" in sql
+
+
+@pytest.mark.parametrize(
+    "where",
+    [
+        "ts > '2024-01-01' AND ts <= '2024-01-03'",
+        "ts BETWEEN '2024-01-01' AND '2024-01-03'",
+        "ts = '2024-01-01'",
+        "ts >= '2024-01-01 10:00:30'",
+        "value > 3",
+    ],
+)
+def test_bounds_that_split_a_bucket_are_not_routed(router, where):
+    assert router.rewrite(f"SELECT tag, max(value) FROM telemetry WHERE {where} GROUP BY tag") is None
+
+
+def test_unaligned_to_day_falls_back_to_finer_rollup(router):
+    _, table, note = router.rewrite("SELECT max(value) FROM telemetry WHERE ts >= '2024-01-01 10:00' AND ts < now()")
+    assert table == "telemetry_1h" and note is None
+
+
+def test_relative_window_is_approximate(router):
+    sql, table, note = router.rewrite(
+        "SELECT date_trunc('hour', ts) AS h, avg(value), count(*) FROM telemetry "
+        "WHERE tag='TempGearbox_C' AND ts >= now() - interval '8 hours' GROUP BY 1 ORDER BY 1"
+    )
+    assert table == "telemetry_1m"
+    assert note == "Computed from telemetry_1m: the time window is rounded to whole minutes."
+    assert "date_trunc('hour', bucket)" in sql and "sum(samples)" in sql
+
+
+def test_short_relative_window_is_not_routed(router):
+    assert router.rewrite("SELECT avg(value) FROM telemetry WHERE ts >= now() - interval '30 minutes'") is None
+    assert RollupRouter(max_edge_fraction=0).rewrite(
+        "SELECT avg(value) FROM telemetry WHERE ts >= now() - interval '30 days'"
+    ) is None
+
+
+def test_date_trunc_now_bound_is_exact(router):
+    sql, table, note = router.rewrite("SELECT avg(value), min(ts), max(ts) FROM telemetry WHERE ts >= date_trunc('day', now())")
+    assert table == "telemetry_1d" and note is None
+    assert "min(first_ts)" in sql and "max(last_ts)" in sql
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT value FROM telemetry WHERE ts >= '2024-01-01'",
+        "SELECT * FROM telemetry",
+        "SELECT ts, avg(value) FROM telemetry GROUP BY ts",
+        "SELECT avg(value) FROM telemetry t JOIN alarms a ON a.ts = t.ts",
+        "SELECT percentile_cont(0.5) WITHIN GROUP (ORDER BY value) FROM telemetry",
+    ],
+)
+def test_non_aggregate_shapes_are_not_routed(router, sql):
+    assert router.rewrite(sql) is None
+
+
+def test_missing_rollup_tables_disable_routing(router):
+    router.failed(Exception('relation "telemetry_1d" does not exist'))
+    assert router.rewrite("SELECT avg(value) FROM telemetry WHERE ts >= '2024-01-01' AND ts < '2024-01-02'") is None
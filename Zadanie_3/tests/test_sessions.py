@@ -0,0 +1,50 @@
+import operator
+from typing import Annotated, TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+from sessions import SessionStore, is_followup
+
+
+class _State(TypedDict):
+    query: str
+    history: Annotated[list[str], operator.add]
+
+
+def _app(sessions: SessionStore):
+    graph = StateGraph(_State)
+    graph.add_node("first", lambda state: {"history": [f"first:{state['query']}"]})
+    graph.add_node("second", lambda state: {"history": [f"second:{state['query']}"]})
+    graph.add_edge(START, "first")
+    graph.add_edge("first", "second")
+    graph.add_edge("second", END)
+    return graph.compile(checkpointer=sessions.checkpointer)
+
+
+def test_session_keeps_only_latest_checkpoint_and_state():
+    sessions = SessionStore()
+    app = _app(sessions)
+    app.invoke({"query": "a"}, config=sessions.config("s1"))
+    state = app.invoke({"query": "b"}, config=sessions.config("s1"))
+    assert state["history"] == ["first:a", "second:a", "first:b", "second:b"]
+
+    config = sessions.config("s1")
+    assert len(list(sessions.checkpointer.list(config))) == 1
+    assert app.get_state(config).values["history"] == state["history"]
+    state = app.invoke({"query": "c"}, config=config)
+    assert state["history"][-2:] == ["first:c", "second:c"] and len(state["history"]) == 6
+
+
+def test_evicted_sessions_are_deleted():
+    sessions = SessionStore(max_sessions=1)
+    app = _app(sessions)
+    app.invoke({"query": "a"}, config=sessions.config("s1"))
+    app.invoke({"query": "b"}, config=sessions.config("s2"))
+    assert list(sessions.checkpointer.list({"configurable": {"thread_id": "s1"}})) == []
+    assert sessions.stats() == {"active": 1, "evicted": 1}
+
+
+def test_followup_detection():
+    assert is_followup("and for the last hour?")
+    assert is_followup("why is that?")
+    assert not is_followup("What was the average gearbox temperature on LNK-01 over the last 8 hours?")
@@ -0,0 +1,81 @@
+from tools.sql_result_cache import SQLResultCache, normalize_sql
+
+_RESULT = {"columns": ["v"], "types": ["int"], "data": [[1]], "row_count": 1}
+
+
+def _cache(**kwargs) -> SQLResultCache:
+    return SQLResultCache(channel=None, **kwargs)
+
+
+def test_normalize_sql_keeps_literals():
+    assert normalize_sql("SELECT  *\n FROM t WHERE a = 'A  B';") == "select * from t where a = 'A  B'"
+
+
+def test_key_ignores_case_and_whitespace():
+    cache = _cache()
+    cache.put("SELECT 1 FROM telemetry", _RESULT)
+    hit = cache.get("select 1\n  from telemetry;")
+    assert hit is not None and hit["cached"] is True
+    assert hit["data"] == [[1]]
+
+
+def test_now_queries_are_bucketed(monkeypatch):
+    cache = _cache(bucket_seconds=60)
+    clock = [1_000_020.0]
+    monkeypatch.setattr("tools.sql_result_cache.time.time", lambda: clock[0])
+    cache.put("SELECT 1 FROM telemetry WHERE ts >= now() - interval '1 hour'", _RESULT)
+    assert cache.get("SELECT 1 FROM telemetry WHERE ts >= now() - interval '1 hour'") is not None
+    clock[0] += 60
+    assert cache.get("SELECT 1 FROM telemetry WHERE ts >= now() - interval '1 hour'") is None
+
+
+def test_invalidate_machine_drops_matching_and_unfiltered_entries():
+    cache = _cache()
+    cache.put("SELECT 1 FROM telemetry WHERE machine_id='LNK-01'", _RESULT)
+    cache.put("SELECT 1 FROM telemetry WHERE machine_id='LNK-02'", _RESULT)
+    cache.put("SELECT count(*) FROM telemetry", _RESULT)
+    assert cache.invalidate_machine("lnk-01") == 2
+    assert cache.get("SELECT 1 FROM telemetry WHERE machine_id='LNK-02'") is not None
+    assert cache.get("SELECT 1 FROM telemetry WHERE machine_id='LNK-01'") is None
+    assert cache.get("SELECT count(*) FROM telemetry") is None
+
+
+def test_put_skips_result_raced_by_invalidation():
+    cache = _cache()
+    sql = "SELECT 1 FROM telemetry WHERE machine_id='LNK-01'"
+    generation = cache.generation()
+    assert cache.get(sql) is None
+    cache.invalidate_machine("LNK-01")  # ingest while the query runs
+    cache.put(sql, _RESULT, generation)
+    assert cache.get(sql) is None
+    assert cache.stats()["skipped_stale"] == 1
+
+
+def test_put_keeps_result_when_other_machine_invalidated():
+    cache = _cache()
+    sql = "SELECT 1 FROM telemetry WHERE machine_id='LNK-01'"
+    generation = cache.generation()
+    cache.invalidate_machine("LNK-02")
+    cache.put(sql, _RESULT, generation)
+    assert cache.get(sql) is not None
+
+
+def test_put_skips_after_global_invalidation_or_for_unfiltered_sql():
+    cache = _cache()
+    generation = cache.generation()
+    cache.clear()
+    cache.put("SELECT 1 FROM telemetry WHERE machine_id='LNK-01'", _RESULT, generation)
+    generation = cache.generation()
+    cache.invalidate_machine("LNK-02")
+    cache.put("SELECT count(*) FROM telemetry", _RESULT, generation)
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction_by_bytes():
+    cache = _cache(max_bytes=200)
+    for idx in range(5):
+        cache.put(f"SELECT {idx} FROM telemetry", _RESULT)
+    stats = cache.stats()
+    assert stats["bytes"] <= 200 and stats["evicted"] > 0
+    assert cache.get("SELECT 4 FROM telemetry") is not None
+    assert cache.get("SELECT 0 FROM telemetry") is None
@@ -0,0 +1,87 @@
+from pathlib import Path
+
+from tools.sql_template_cache import (
+    SQLTemplateCache,
+    fill_template,
+    instruction_params,
+    instruction_signature,
+    make_template,
+)
+
+_INSTRUCTION = "Average TempGearbox_C on LNK-01 for the last 8 hours"
+_SQL = (
+    "SELECT tag, AVG(value) AS avg_value FROM telemetry WHERE machine_id='LNK-01' "
+    "AND ts >= now() - interval '8 hours' AND tag = 'TempGearbox_C' GROUP BY tag"
+)
+
+
+def test_signature_masks_values():
+    assert instruction_signature(_INSTRUCTION) == instruction_signature(
+        "Average Vibration_mm_s, TempMotor_C on LNK-02 for the last 30 min"
+    )
+    assert instruction_signature(_INSTRUCTION) != instruction_signature("Maximum TempGearbox_C on LNK-01 for the last 8 hours")
+
+
+def test_template_roundtrip_with_new_values():
+    template = make_template(_SQL, instruction_params(_INSTRUCTION))
+    assert template is not None and "LNK-01" not in template and "TempGearbox_C" not in template
+    sql = fill_template(template, instruction_params("Average vibration and TempMotor_C on LNK-02 for the last 30 min"))
+    assert "machine_id='LNK-02'" in sql
+    assert "interval '30 minutes'" in sql
+    assert "tag IN ('TempMotor_C', 'Vibration_mm_s')" in sql or "tag IN ('Vibration_mm_s', 'TempMotor_C')" in sql
+
+
+def test_template_rejected_when_a_value_is_not_in_the_sql():
+    # The SQL answers for a different machine than the instruction names.
+    assert make_template(_SQL.replace("LNK-01", "LNK-03"), instruction_params(_INSTRUCTION)) is None
+    # The tag predicate lists other tags.
+    assert make_template(_SQL.replace("TempGearbox_C", "TempMotor_C"), instruction_params(_INSTRUCTION)) is None
+
+
+def test_bucket_interval_is_not_the_window():
+    sql = (
+        "SELECT date_bin(interval '1 hour', ts, now()) AS bucket, avg(value) FROM telemetry "
+        "WHERE machine_id='LNK-01' AND tag = 'TempGearbox_C' AND ts >= now() - interval '8 hours' GROUP BY 1"
+    )
+    template = make_template(sql, instruction_params(_INSTRUCTION))
+    assert "interval '1 hour'" in template and "interval '<<window>>'" in template
+
+
+def test_fill_needs_every_placeholder():
+    template = make_template(_SQL, instruction_params(_INSTRUCTION))
+    assert fill_template(template, instruction_params("Average TempGearbox_C for the last 8 hours")) is None
+
+
+def test_cache_hit_miss_and_invalidate():
+    cache = SQLTemplateCache(path=None)
+    assert cache.lookup(_INSTRUCTION) is None
+    assert cache.put(_INSTRUCTION, _SQL)
+    assert "machine_id='LNK-02'" in cache.lookup("Average TempGearbox_C on LNK-02 for the last 2 hours")
+    cache.invalidate(_INSTRUCTION)
+    assert cache.lookup(_INSTRUCTION) is None
+    assert cache.stats()["invalidated"] == 1
+
+
+def test_pinned_templates_survive_eviction_and_invalidation():
+    cache = SQLTemplateCache(path=None, max_entries=1)
+    assert cache.pin(_INSTRUCTION, _SQL)
+    cache.put("Maximum TempGearbox_C on LNK-01 for the last 8 hours", _SQL.replace("AVG", "MAX"))
+    cache.put("Minimum TempGearbox_C on LNK-01 for the last 8 hours", _SQL.replace("AVG", "MIN"))
+    cache.invalidate(_INSTRUCTION)
+    assert cache.lookup(_INSTRUCTION) is not None
+    assert cache.lookup("Maximum TempGearbox_C on LNK-01 for the last 8 hours") is None
+    assert cache.stats()["entries"] == 1
+
+
+def test_persistence(tmp_path):
+    path = tmp_path / "templates.json"
+    cache = SQLTemplateCache(path=str(path))
+    cache.put(_INSTRUCTION, _SQL)
+    cache.save()
+    assert SQLTemplateCache(path=str(path)).lookup(_INSTRUCTION) is not None
+
+
+def test_curated_templates_load():
+    pinned = Path(__file__).resolve().parent.parent / "sql_templates.json"
+    cache = SQLTemplateCache(path=None, pinned_path=str(pinned))
+    assert cache.stats()["pinned"] > 0
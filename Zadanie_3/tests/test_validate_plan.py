@@ -0,0 +1,66 @@
+from graph import _validate_plan
+
+
+def test_independent_steps_have_no_dependencies():
+    plan = _validate_plan(
+        [
+            {"step": 1, "tool": "sql_query", "instruction": "avg temp"},
+            {"step": 2, "tool": "rag_search", "instruction": "SOP E204"},
+            {"step": 3, "tool": "web_search", "instruction": "Siemens drive"},
+        ],
+        fallback_instruction="q",
+    )
+    assert [s["depends_on"] for s in plan] == [[], [], []]
+
+
+def test_only_earlier_steps_can_be_dependencies():
+    plan = _validate_plan(
+        [
+            {"step": 1, "tool": "sql_query", "instruction": "a", "depends_on": [2, 1]},
+            {"step": 2, "tool": "rag_search", "instruction": "b", "depends_on": ["1", 1, "x", 7]},
+            {"step": 3, "tool": "web_search", "instruction": "c", "depends_on": 2},
+        ],
+        fallback_instruction="q",
+    )
+    assert [s["depends_on"] for s in plan] == [[], [1], [2]]
+
+
+def test_memory_search_waits_for_earlier_memory_writes():
+    plan = _validate_plan(
+        [
+            {"step": 1, "tool": "memory_write", "instruction": "I prefer Celsius"},
+            {"step": 2, "tool": "sql_query", "instruction": "avg temp"},
+            {"step": 3, "tool": "memory_search", "instruction": "unit preference"},
+        ],
+        fallback_instruction="q",
+    )
+    assert plan[2]["depends_on"] == [1]
+    assert plan[1]["depends_on"] == []
+
+
+def test_invalid_steps_are_dropped_and_plan_is_capped():
+    raw = [{"step": "x", "tool": "sql_query", "instruction": ""}, "junk", {"tool": "shell", "instruction": "rm"}]
+    raw += [{"step": n, "tool": "rag_search", "instruction": str(n)} for n in range(2, 8)]
+    plan = _validate_plan(raw, fallback_instruction="fallback")
+    assert len(plan) == 4
+    assert plan[0] == {"step": 1, "tool": "sql_query", "instruction": "fallback", "depends_on": []}
+    assert all(s["tool"] != "shell" for s in plan)
+
+
+def test_non_list_plan_falls_back_to_rag():
+    assert _validate_plan({"plan": []}, fallback_instruction="q") == [
+        {"step": 1, "tool": "rag_search", "instruction": "q", "depends_on": []}
+    ]
+
+
+def test_inline_sql_must_be_read_only():
+    plan = _validate_plan(
+        [
+            {"step": 1, "tool": "sql_query", "instruction": "a", "sql": "SELECT 1;"},
+            {"step": 2, "tool": "sql_query", "instruction": "b", "sql": "DELETE FROM telemetry"},
+        ],
+        fallback_instruction="q",
+        inline_sql=True,
+    )
+    assert plan[0]["sql"] == "SELECT 1"
+    assert "sql" not in plan[1]
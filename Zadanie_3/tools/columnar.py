@@ -0,0 +1,89 @@
+"""Columnar, typed encoding of SQL results and the JSON codec used on the MCP wire.
+
+`run_select` backends return
+`{"columns": [...], "types": [...], "data": [[column values], ...], "row_count": n}`:
+one JSON-native array per column instead of one tuple per row. Timestamps become ISO 8601
+strings and numerics (including `Decimal`) floats, so the payload serializes without a
+`default=` fallback. Booleans mixed into a numeric column count as 0/1. `orjson` is used when installed, otherwise the stdlib `json`.
+"""
+
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # stdlib json fallback
+    orjson = None
+
+
+def dumps(value: Any) -> str:
+    """One-line JSON; non-ASCII is kept as is, so the stream must be UTF-8."""
+    if orjson is not None:
+        return orjson.dumps(value, default=str).decode("utf-8")
+    return json.dumps(value, ensure_ascii=False, default=str, separators=(",", ":"))
+
+
+def loads(text: str | bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def _column_type(values: list[Any]) -> str:
+    kinds = {type(v) for v in values if v is not None}
+    if not kinds:
+        return "null"
+    if kinds == {bool}:
+        return "bool"
+    if kinds <= {bool, int}:
+        return "int"
+    if kinds <= {bool, int, float, Decimal}:
+        return "float"
+    if kinds <= {datetime}:
+        return "timestamp"
+    if kinds <= {date}:
+        return "date"
+    if kinds <= {time}:
+        return "time"
+    if kinds <= {timedelta}:
+        return "interval"
+    if kinds <= {dict, list}:
+        return "json"
+    return "text"
+
+
+_CONVERTERS = {
+    "int": int,
+    "float": float,
+    "timestamp": datetime.isoformat,
+    "date": date.isoformat,
+    "time": time.isoformat,
+    "interval": timedelta.total_seconds,  # seconds
+    "text": str,
+}
+
+
+def encode_columns(columns: list[str], rows: list[Any]) -> dict[str, Any]:
+    """Typed column arrays for `rows` (as returned by `fetchall()`)."""
+    data = [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]
+    types = []
+    for idx, values in enumerate(data):
+        kind = _column_type(values)
+        convert = _CONVERTERS.get(kind)
+        if convert is not None:
+            data[idx] = [None if v is None else convert(v) for v in values]
+        types.append(kind)
+    return {"columns": list(columns), "types": types, "data": data, "row_count": len(rows)}
+
+
+def to_rows(result: dict[str, Any]) -> dict[str, Any]:
+    """The row-oriented result (`rows` as lists) the agent works with; row results pass through."""
+    if "data" not in result:
+        return result
+    rows = [list(row) for row in zip(*result["data"])] if result["data"] else []
+    out = {key: value for key, value in result.items() if key != "data"}
+    out["rows"] = rows
+    out["row_count"] = len(rows)
+    return out
@@ -0,0 +1,44 @@
+"""Per-request deadline, visible to every tool call made on behalf of the request.
+
+Graph nodes enter `deadline_scope(state["deadline_ts"])`; tools then size their own
+timeouts (HTTP, SQL statement_timeout, MCP reads) with `timeout_for()`. Outside a scope
+there is no deadline and tools keep their defaults.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+_DEADLINE: ContextVar[float | None] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+@contextmanager
+def deadline_scope(deadline_ts: float | None) -> Iterator[None]:
+    token = _DEADLINE.set(deadline_ts)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+def remaining() -> float | None:
+    """Seconds left for the current request, or None without a deadline."""
+    deadline_ts = _DEADLINE.get()
+    if deadline_ts is None:
+        return None
+    return deadline_ts - time.time()
+
+
+def timeout_for(default: float, minimum: float = 1.0) -> float:
+    """`default`, shortened to the time left; raises once the deadline has passed."""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded.")
+    return max(minimum, min(default, left))
@@ -0,0 +1,222 @@
+"""Downsampling of time-series SQL results before they reach the LLM.
+
+A result is a time series when it has a timestamp column and numeric columns, e.g. raw
+`(ts, machine_id, tag, value, unit)` telemetry. Rows are split into series by the remaining
+columns (machine, tag, unit) and each series is reduced to a bounded number of its own rows:
+
+- `minmax` (default): the time span is cut into equal buckets; each bucket keeps the rows
+  with the lowest and highest value of every numeric column.
+- `lttb`: Largest-Triangle-Three-Buckets on the first numeric column, which keeps the
+  visual shape; the series minimum and maximum are always added.
+
+Both keep real rows (no interpolated values), so short spikes such as alarm excursions
+survive. Works on the columnar payload of tools/columnar.py, before it becomes rows.
+"""
+
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Any, Literal
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DownsampleMethod = Literal["minmax", "lttb"]
+
+_NUMERIC_TYPES = ("float", "int")
+_TIME_COLUMNS = ("ts", "time", "timestamp", "bucket", "hour", "minute", "day")
+# More series than this is not a plottable time series (e.g. one row per alarm message).
+_MAX_SERIES = 64
+_MIN_POINTS_PER_SERIES = 8
+
+_TIME_EXPR_RE = re.compile(
+    r"\b(?:" + "|".join(_TIME_COLUMNS) + r")\b|\b(?:date_trunc|date_bin|time_bucket)\s*\(", re.IGNORECASE
+)
+_SELECT_LIST_RE = re.compile(r"\bselect\s+(.*?)\s+from\b", re.IGNORECASE | re.DOTALL)
+# Top-level ORDER BY, or the ORDER BY of a window (ended by its closing parenthesis).
+_ORDER_BY_RE = re.compile(r"\border\s+by\s+(.*?)(?:\blimit\b|\boffset\b|\)|$)", re.IGNORECASE | re.DOTALL)
+
+
+def is_series_sql(sql: str) -> bool:
+    """Whether `sql` selects a time column and orders (or windows) by time."""
+    selects_time = any(_TIME_EXPR_RE.search(cols) for cols in _SELECT_LIST_RE.findall(sql))
+    return selects_time and any(_TIME_EXPR_RE.search(order) for order in _ORDER_BY_RE.findall(sql))
+
+
+def _epoch_seconds(values: list[Any]) -> np.ndarray | None:
+    try:
+        return np.array(
+            [np.nan if v is None else datetime.fromisoformat(str(v)).timestamp() for v in values], dtype=float
+        )
+    except ValueError:
+        return None
+
+
+def _time_column(columns: list[str], types: list[str]) -> int | None:
+    for idx, kind in enumerate(types):
+        if kind == "timestamp":
+            return idx
+    for idx, (col, kind) in enumerate(zip(columns, types)):
+        if kind == "text" and col.lower() in _TIME_COLUMNS:
+            return idx
+    return None
+
+
+def _minmax_indices(x: np.ndarray, ys: list[np.ndarray], points: int) -> np.ndarray:
+    """Per time bucket, the positions of the min and max of every column in `ys`."""
+    buckets = max(1, points // (2 * len(ys)))
+    span = x[-1] - x[0]
+    if span <= 0:
+        bucket = np.zeros(len(x), dtype=int)
+    else:
+        bucket = np.minimum(((x - x[0]) / span * buckets).astype(int), buckets - 1)
+    keep = [np.array([0, len(x) - 1])]
+    for y in ys:
+        valid = ~np.isnan(y)
+        if not valid.any():
+            continue
+        pos = np.flatnonzero(valid)
+        # Sorted by (bucket, value): the first row of each bucket is its min, the last its max.
+        order = pos[np.lexsort((y[pos], bucket[pos]))]
+        _, first = np.unique(bucket[order], return_index=True)
+        last = np.append(first[1:], len(order)) - 1
+        keep.extend([order[first], order[last]])
+    return np.unique(np.concatenate(keep))
+
+
+def _lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    n = len(x)
+    valid = ~np.isnan(y)
+    if valid.sum() <= points or points < 3:
+        return np.arange(n)
+    pos = np.flatnonzero(valid)
+    xv, yv = x[pos], y[pos]
+    edges = np.linspace(1, len(pos) - 1, points - 1).astype(int)
+    selected = [0]
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else len(pos)
+        # Third vertex: the average of the next bucket (the last point for the final one).
+        avg_x, avg_y = xv[nxt_lo:nxt_hi].mean(), yv[nxt_lo:nxt_hi].mean()
+        ax, ay = xv[selected[-1]], yv[selected[-1]]
+        area = np.abs((ax - avg_x) * (yv[lo:hi] - ay) - (ax - xv[lo:hi]) * (avg_y - ay))
+        selected.append(lo + int(np.argmax(area)))
+    selected.append(len(pos) - 1)
+    extremes = [int(np.argmin(yv)), int(np.argmax(yv))]
+    return np.unique(pos[np.array(selected + extremes)])
+
+
+class Downsampler:
+    """Bounds SQL results: time series are downsampled per series, anything else is truncated."""
+
+    def __init__(
+        self,
+        max_rows: int = 200,
+        raw_row_limit: int = 20000,
+        row_limit: int = 100,
+        method: DownsampleMethod = "minmax",
+    ) -> None:
+        self.max_rows = max_rows
+        self.raw_row_limit = raw_row_limit
+        self.row_limit = row_limit
+        self.method = method
+        self._lock = threading.Lock()
+        self._results = 0
+        self._downsampled = 0
+        self._truncated = 0
+        self._rows_in = 0
+        self._rows_out = 0
+
+    def fetch_limit(self, sql: str) -> int:
+        """Rows to fetch for `sql`: the raw limit for time-series selects, `row_limit` otherwise."""
+        return self.raw_row_limit if is_series_sql(sql) else self.row_limit
+
+    def _series_indices(self, result: dict[str, Any]) -> np.ndarray | None:
+        """Row positions to keep, or None when the result is not a time series."""
+        columns, types, data = result["columns"], result.get("types") or [], result["data"]
+        time_idx = _time_column(columns, types)
+        if time_idx is None:
+            return None
+        value_idx = [idx for idx, kind in enumerate(types) if kind in _NUMERIC_TYPES and idx != time_idx]
+        if not value_idx:
+            return None
+        x = _epoch_seconds(data[time_idx])
+        if x is None or np.isnan(x).all():
+            return None
+
+        group_idx = [idx for idx in range(len(columns)) if idx != time_idx and idx not in value_idx]
+        keys = list(zip(*(data[idx] for idx in group_idx))) if group_idx else [()] * len(x)
+        series: dict[tuple, list[int]] = {}
+        for row, key in enumerate(keys):
+            series.setdefault(key, []).append(row)
+        if len(series) > _MAX_SERIES:
+            return None
+
+        values = [np.array([np.nan if v is None else v for v in data[idx]], dtype=float) for idx in value_idx]
+        points = max(_MIN_POINTS_PER_SERIES, self.max_rows // len(series))
+        keep: list[np.ndarray] = []
+        for rows in series.values():
+            rows_arr = np.array(rows)
+            if len(rows_arr) <= points:
+                keep.append(rows_arr)
+                continue
+            rows_arr = rows_arr[np.argsort(x[rows_arr], kind="stable")]
+            sx = np.nan_to_num(x[rows_arr], nan=np.nanmin(x[rows_arr]))
+            if self.method == "lttb":
+                picked = _lttb_indices(sx, values[0][rows_arr], points)
+            else:
+                picked = _minmax_indices(sx, [v[rows_arr] for v in values], points)
+            keep.append(rows_arr[picked])
+        return np.sort(np.concatenate(keep))
+
+    def apply(self, result: dict[str, Any]) -> dict[str, Any]:
+        """Bound a columnar result (tools/columnar.py); row results and small results pass through."""
+        rows_before = result.get("row_count", 0)
+        if "data" not in result or rows_before <= self.row_limit:
+            return result
+        keep = self._series_indices(result)
+        if keep is not None and len(keep) == rows_before:
+            return result  # a time series already within its point budget
+        out = dict(result)
+        if keep is None:
+            out["data"] = [values[: self.row_limit] for values in result["data"]]
+            out["row_count"] = self.row_limit
+            out["truncated"] = {"rows_before": rows_before}
+        else:
+            out["data"] = [[values[i] for i in keep] for values in result["data"]]
+            out["row_count"] = len(keep)
+            out["downsampled"] = {"method": self.method, "rows_before": rows_before}
+            logger.info("[SQL] Downsampled time series %d -> %d rows (%s)", rows_before, len(keep), self.method)
+        with self._lock:
+            self._results += 1
+            self._downsampled += keep is not None
+            self._truncated += keep is None
+            self._rows_in += rows_before
+            self._rows_out += out["row_count"]
+        return out
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "results": self._results,
+                "downsampled": self._downsampled,
+                "truncated": self._truncated,
+                "rows_in": self._rows_in,
+                "rows_out": self._rows_out,
+                "reduction": 1 - self._rows_out / self._rows_in if self._rows_in else 0.0,
+            }
+
+
+def downsampler_from_env() -> Downsampler | None:
+    if os.getenv("SQL_DOWNSAMPLE_ENABLED", "true").lower() != "true":
+        return None
+    method = os.getenv("SQL_DOWNSAMPLE_METHOD", "minmax").lower()
+    return Downsampler(
+        max_rows=int(os.getenv("SQL_DOWNSAMPLE_MAX_ROWS", "200")),
+        raw_row_limit=int(os.getenv("SQL_RAW_ROW_LIMIT", "20000")),
+        row_limit=int(os.getenv("SQL_ROW_LIMIT", "100")),
+        method="lttb" if method == "lttb" else "minmax",
+    )
@@ -0,0 +1,47 @@
+import threading
+from collections import OrderedDict
+from typing import Any
+
+
+class EmbeddingCache:
+    """LRU of embeddings keyed by (model, text), shared by the KB and memory tools.
+
+    One turn embeds the user query for memory lookup, the plan cache and KB search;
+    with the cache that is one Ollama call instead of three.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str, str], list[float]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, model: str, text: str) -> list[float] | None:
+        key = (model, text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return embedding
+
+    def put(self, model: str, text: str, embedding: list[float]) -> None:
+        key = (model, text)
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / total if total else 0.0,
+            }
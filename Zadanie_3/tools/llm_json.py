@@ -0,0 +1,17 @@
+"""Parsing of JSON replies from the LLM (planner, memory writer)."""
+
+import json
+from typing import Any
+
+
+def safe_json_parse(raw: str) -> Any:
+    """The JSON in `raw`, also when wrapped in a Markdown code fence; None if it does not parse."""
+    text = raw.strip()
+    if "```json" in text:
+        text = text.split("```json", maxsplit=1)[1].split("```", maxsplit=1)[0].strip()
+    elif "```" in text:
+        text = text.split("```", maxsplit=1)[1].split("```", maxsplit=1)[0].strip()
+    try:
+        return json.loads(text)
+    except Exception:
+        return None
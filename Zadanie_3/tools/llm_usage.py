@@ -0,0 +1,103 @@
+"""Token and Ollama timing accounting for LLM calls.
+
+Call sites pass each response (or the merged metadata of a stream) to `record_llm_call`.
+The usage is appended to the enclosing `usage_scope()` - graph nodes open one per run, so
+calls made by tools inside a node are attributed to that turn - and handed to the
+registered listeners (the Prometheus counters in metrics.py). Calls outside a scope, like
+the background memory writer's, only reach the listeners.
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+_SCOPE: ContextVar[list[dict[str, Any]] | None] = ContextVar("llm_usage_scope", default=None)
+_listeners: list[Callable[[dict[str, Any]], None]] = []
+_listeners_lock = threading.Lock()
+
+# Ollama reports durations in nanoseconds.
+_DURATIONS = {
+    "load_ms": "load_duration",
+    "prompt_eval_ms": "prompt_eval_duration",
+    "eval_ms": "eval_duration",
+    "total_ms": "total_duration",
+}
+
+
+def add_listener(listener: Callable[[dict[str, Any]], None]) -> None:
+    with _listeners_lock:
+        if listener not in _listeners:
+            _listeners.append(listener)
+
+
+@contextmanager
+def usage_scope() -> Iterator[list[dict[str, Any]]]:
+    """Collect the usage of LLM calls made inside the block (including worker threads/tasks)."""
+    usages: list[dict[str, Any]] = []
+    token = _SCOPE.set(usages)
+    try:
+        yield usages
+    finally:
+        _SCOPE.reset(token)
+
+
+def usage_from_response(node: str, response: Any) -> dict[str, Any]:
+    """Usage of one LLM call from an AIMessage (or a response_metadata dict)."""
+    metadata = response if isinstance(response, dict) else getattr(response, "response_metadata", None) or {}
+    usage: dict[str, Any] = {
+        "node": node,
+        "model": metadata.get("model") or metadata.get("model_name") or "",
+        "prompt_tokens": int(metadata.get("prompt_eval_count") or 0),
+        "completion_tokens": int(metadata.get("eval_count") or 0),
+    }
+    # Non-Ollama chat models only fill LangChain's usage_metadata.
+    usage_metadata = getattr(response, "usage_metadata", None) or {}
+    if not usage["prompt_tokens"] and not usage["completion_tokens"] and usage_metadata:
+        usage["prompt_tokens"] = int(usage_metadata.get("input_tokens") or 0)
+        usage["completion_tokens"] = int(usage_metadata.get("output_tokens") or 0)
+    for key, source in _DURATIONS.items():
+        usage[key] = round(int(metadata.get(source) or 0) / 1e6, 1)
+    return usage
+
+
+def record_llm_call(node: str, response: Any) -> dict[str, Any]:
+    usage = usage_from_response(node, response)
+    logger.info(
+        "[LLM] node=%s prompt_tokens=%d completion_tokens=%d load_ms=%.0f prompt_eval_ms=%.0f eval_ms=%.0f",
+        node,
+        usage["prompt_tokens"],
+        usage["completion_tokens"],
+        usage["load_ms"],
+        usage["prompt_eval_ms"],
+        usage["eval_ms"],
+    )
+    scope = _SCOPE.get()
+    if scope is not None:
+        scope.append(usage)
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        try:
+            listener(usage)
+        except Exception as exc:
+            logger.warning("[LLM] usage listener failed: %s", exc)
+    return usage
+
+
+def summarize_usage(usages: list[dict[str, Any]]) -> dict[str, dict[str, Any]]:
+    """Per-node totals of a turn's LLM calls."""
+    totals: dict[str, dict[str, Any]] = {}
+    for usage in usages:
+        node = totals.setdefault(
+            usage["node"],
+            {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, **{key: 0.0 for key in _DURATIONS}},
+        )
+        node["calls"] += 1
+        for key in ("prompt_tokens", "completion_tokens", *_DURATIONS):
+            node[key] += usage.get(key, 0)
+    return totals
+
@@ -0,0 +1,258 @@
+import asyncio
+import atexit
+import itertools
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from pathlib import Path
+from typing import Any
+
+from tools.columnar import dumps, loads
+from tools.deadline import timeout_for
+
+logger = logging.getLogger(__name__)
+
+# Upper bound for one MCP response; shortened further by the request deadline.
+MCP_READ_TIMEOUT_SECONDS = float(os.getenv("MCP_READ_TIMEOUT_SECONDS", "60"))
+# After a timeout, a process must answer `ping` within this time or it is killed.
+MCP_PING_TIMEOUT_SECONDS = float(os.getenv("MCP_PING_TIMEOUT_SECONDS", "5"))
+
+_STDERR_PROBLEM_RE = re.compile(r"\b(?:WARNING|ERROR|CRITICAL)\b|^Traceback")
+
+
+def _server_command(server_path: str) -> tuple[list[str], str]:
+    command = [os.getenv("PYTHON_BIN", "python"), "-u", server_path]
+    cwd = str(Path(server_path).resolve().parents[1])
+    return command, cwd
+
+
+def _parse_response(response: dict[str, Any], label: str) -> Any:
+    if not response.get("ok"):
+        raise RuntimeError(response.get("error", f"Unknown {label} error"))
+    return response["result"]
+
+
+class _ServerProcess:
+    """One server subprocess with many requests in flight.
+
+    A reader thread resolves each caller's future by the response `id`, so the server may
+    answer in any order. Replies to requests that already timed out are dropped. The server's
+    stderr is forwarded to this process's log, tracebacks and warnings at WARNING level.
+    """
+
+    def __init__(self, server_path: str, label: str) -> None:
+        command, cwd = _server_command(server_path)
+        self.label = label
+        self.proc = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            cwd=cwd,
+        )
+        self.last_reply = time.monotonic()
+        self._pending: dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self.probing = False
+        threading.Thread(target=self._read_responses, name=f"mcp-reader-{self.proc.pid}", daemon=True).start()
+        threading.Thread(target=self._forward_stderr, name=f"mcp-stderr-{self.proc.pid}", daemon=True).start()
+        logger.info("[MCP] Started %s pid=%s", label, self.proc.pid)
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    def send(self, req_id: int, method: str, params: dict[str, Any]) -> Future:
+        future: Future = Future()
+        line = dumps({"id": req_id, "method": method, "params": params}) + "\n"
+        with self._lock:
+            self._pending[req_id] = future
+            try:
+                assert self.proc.stdin is not None
+                self.proc.stdin.write(line)
+                self.proc.stdin.flush()
+            except (OSError, ValueError) as exc:
+                self._pending.pop(req_id, None)
+                raise RuntimeError(f"{self.label} is not accepting requests: {exc}") from exc
+        return future
+
+    def discard(self, req_id: int) -> None:
+        with self._lock:
+            self._pending.pop(req_id, None)
+
+    def _read_responses(self) -> None:
+        assert self.proc.stdout is not None
+        for line in self.proc.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                response = loads(line)
+            except ValueError:
+                logger.warning("[MCP] %s sent a malformed line: %.200s", self.label, line)
+                continue
+            self.last_reply = time.monotonic()
+            with self._lock:
+                future = self._pending.pop(response.get("id"), None)
+            if future is not None:
+                try:
+                    future.set_result(response)
+                except InvalidStateError:
+                    pass  # cancelled by its caller
+        # EOF: the process exited; fail everything still waiting on it.
+        try:
+            code = self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            code = None
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            try:
+                future.set_exception(RuntimeError(f"{self.label} exited (code {code}) before answering."))
+            except InvalidStateError:
+                pass
+
+    def _forward_stderr(self) -> None:
+        assert self.proc.stderr is not None
+        in_traceback = False
+        for line in self.proc.stderr:
+            line = line.rstrip()
+            if not line:
+                continue
+            if line.startswith("Traceback"):
+                in_traceback = True
+            problem = in_traceback or bool(_STDERR_PROBLEM_RE.search(line))
+            if in_traceback and not line[0].isspace() and not line.startswith("Traceback"):
+                in_traceback = False  # the exception line ends the traceback
+            level = logging.WARNING if problem else logging.INFO
+            logger.log(level, "[MCP] %s pid=%s: %s", self.label, self.proc.pid, line)
+
+    def kill(self) -> None:
+        # The reader thread sees EOF and fails the remaining requests.
+        self.proc.kill()
+        self.proc.wait()  # so `alive` is False before the next request is routed
+
+    def close(self) -> None:
+        if self.alive:
+            self.proc.terminate()
+
+
+class MCPStdioClient:
+    """Line-delimited JSON request/response client over a pool of server subprocesses.
+
+    Requests are multiplexed: each process has many in flight and answers them in any order.
+    A request goes to the live process with the fewest requests in flight; dead processes are
+    restarted on the next request. A timed-out request fails alone. When its process has not
+    answered anything since that request was sent, it is probed with `ping` (answered outside
+    the worker pool) in the background and killed only if that also times out: it hangs rather
+    than being busy with slow requests.
+    Sync callers block on the request's future, async callers await it via `asyncio.wrap_future`.
+    """
+
+    def __init__(self, server_path: str, label: str, processes: int | None = None) -> None:
+        self.server_path = server_path
+        self.label = label
+        size = processes if processes is not None else int(os.getenv("MCP_SERVER_PROCESSES", "1"))
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._servers = [_ServerProcess(server_path, label) for _ in range(max(1, size))]
+        self._requests = 0
+        self._timeouts = 0
+        self._restarts = 0
+        self._killed = 0
+        atexit.register(self.close)
+
+    def close(self) -> None:
+        for server in self._servers:
+            server.close()
+
+    def _pick(self) -> tuple[_ServerProcess, int]:
+        with self._lock:
+            for idx, server in enumerate(self._servers):
+                if not server.alive:
+                    logger.warning("[MCP] %s pid=%s is not running, restarting", self.label, server.proc.pid)
+                    self._servers[idx] = _ServerProcess(self.server_path, self.label)
+                    self._restarts += 1
+            self._requests += 1
+            return min(self._servers, key=lambda server: server.in_flight), next(self._ids)
+
+    def _send(self, method: str, params: dict[str, Any], timeout: float | None):
+        server, req_id = self._pick()
+        read_timeout = timeout if timeout is not None else timeout_for(MCP_READ_TIMEOUT_SECONDS)
+        sent_at = time.monotonic()
+        return server, req_id, server.send(req_id, method, params), read_timeout, sent_at
+
+    def _timed_out(
+        self, server: _ServerProcess, req_id: int, method: str, read_timeout: float, sent_at: float
+    ) -> TimeoutError:
+        server.discard(req_id)
+        with self._lock:
+            self._timeouts += 1
+        if server.last_reply < sent_at:
+            self._probe(server)
+        return TimeoutError(f"{self.label} did not answer {method} within {read_timeout:.1f}s.")
+
+    def _probe(self, server: _ServerProcess) -> None:
+        with self._lock:
+            if server.probing or not server.alive:
+                return
+            server.probing = True
+            req_id = next(self._ids)
+        threading.Thread(target=self._ping, args=(server, req_id), name="mcp-probe", daemon=True).start()
+
+    def _ping(self, server: _ServerProcess, req_id: int) -> None:
+        try:
+            server.send(req_id, "ping", {}).result(timeout=MCP_PING_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            server.discard(req_id)
+            logger.warning("[MCP] %s pid=%s did not answer ping, killing it", self.label, server.proc.pid)
+            server.kill()
+            with self._lock:
+                self._killed += 1
+        except Exception:
+            pass  # already exited; restarted on the next request
+        finally:
+            server.probing = False
+
+    def request(self, method: str, params: dict[str, Any], timeout: float | None = None) -> Any:
+        server, req_id, future, read_timeout, sent_at = self._send(method, params, timeout)
+        try:
+            response = future.result(timeout=read_timeout)
+        except FutureTimeoutError:
+            raise self._timed_out(server, req_id, method, read_timeout, sent_at) from None
+        return _parse_response(response, self.label)
+
+    async def arequest(self, method: str, params: dict[str, Any], timeout: float | None = None) -> Any:
+        server, req_id, future, read_timeout, sent_at = self._send(method, params, timeout)
+        try:
+            response = await asyncio.wait_for(asyncio.wrap_future(future), read_timeout)
+        except asyncio.TimeoutError:
+            raise self._timed_out(server, req_id, method, read_timeout, sent_at) from None
+        except asyncio.CancelledError:
+            server.discard(req_id)
+            raise
+        return _parse_response(response, self.label)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            servers = list(self._servers)
+            stats: dict[str, Any] = {
+                "requests": self._requests,
+                "timeouts": self._timeouts,
+                "restarts": self._restarts,
+                "killed": self._killed,
+            }
+        stats["processes"] = sum(1 for server in servers if server.alive)
+        stats["in_flight"] = sum(server.in_flight for server in servers)
+        return stats
@@ -0,0 +1,70 @@
+"""Concurrent request loop shared by the stdio MCP servers in `mcp_server/`.
+
+Requests are read from stdin and handled by a thread pool, so a slow query does not hold
+up the ones behind it. Responses are written as they finish, possibly out of order; the
+client matches them to callers by `id` (see tools/mcp_client.py). Lines are UTF-8 JSON
+encoded by `tools.columnar.dumps` (orjson when installed).
+"""
+
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from tools.columnar import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict[str, Any]], Any]
+
+
+class _ResponseWriter:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+
+    def write(self, payload: dict[str, Any]) -> None:
+        line = dumps(payload) + "\n"
+        # One whole line per response, even with many workers writing.
+        with self._lock:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+
+
+def _handle(writer: _ResponseWriter, handler: Handler, req_id: Any, params: dict[str, Any]) -> None:
+    try:
+        writer.write({"id": req_id, "ok": True, "result": handler(params)})
+    except Exception as exc:
+        logger.exception("Request handling failed")
+        writer.write({"id": req_id, "ok": False, "error": str(exc)})
+
+
+def serve(handlers: dict[str, Handler], workers: int | None = None) -> None:
+    """Serve `method -> handler(params)` until stdin closes, then finish in-flight requests."""
+    workers = max(1, workers or int(os.getenv("MCP_SERVER_WORKERS", "4")))
+    sys.stdin.reconfigure(encoding="utf-8")
+    sys.stdout.reconfigure(encoding="utf-8")
+    writer = _ResponseWriter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mcp-worker") as executor:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            req_id = None
+            try:
+                request = loads(line)
+                req_id = request.get("id")
+                method = request.get("method")
+                params = request.get("params") or {}
+            except Exception as exc:
+                writer.write({"id": req_id, "ok": False, "error": f"Invalid request: {exc}"})
+                continue
+
+            if method == "ping":
+                # Answered inline so health checks are not queued behind slow requests.
+                writer.write({"id": req_id, "ok": True, "result": "pong"})
+            elif method in handlers:
+                executor.submit(_handle, writer, handlers[method], req_id, params)
+            else:
+                writer.write({"id": req_id, "ok": False, "error": f"Unknown method: {method}"})
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 import uuid
@@ -5,12 +6,44 @@ from datetime import datetime, timezone
 from typing import Any
 
 import chromadb
+import httpx
 import requests
 from chromadb.config import Settings
 
+from tools.deadline import timeout_for
+from tools.embedding_cache import EmbeddingCache
+from tools.ollama_scheduler import OllamaScheduler
+
 logger = logging.getLogger(__name__)
 
 
+def _memories_from_query(res: Any) -> list[dict[str, Any]]:
+    docs = res.get("documents", [[]])[0]
+    metas = res.get("metadatas", [[]])[0]
+    distances = res.get("distances", [[]])[0]
+
+    memories: list[dict[str, Any]] = []
+    for idx, doc in enumerate(docs):
+        memories.append(
+            {
+                "text": doc,
+                "metadata": metas[idx] if idx < len(metas) else {},
+                "distance": distances[idx] if idx < len(distances) else None,
+            }
+        )
+    return memories
+
+
+def _memory_metadata(metadata: dict[str, Any] | None) -> dict[str, Any]:
+    meta = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "source": "agent",
+    }
+    if metadata:
+        meta.update(metadata)
+    return meta
+
+
 class LongTermMemoryTool:
     def __init__(
         self,
@@ -19,9 +52,16 @@ class LongTermMemoryTool:
         ollama_base_url: str,
         embed_model: str,
         collection_name: str = "long_term_memory",
+        embedding_cache: EmbeddingCache | None = None,
+        scheduler: OllamaScheduler | None = None,
     ) -> None:
+        self.chroma_host = chroma_host
+        self.chroma_port = chroma_port
+        self.collection_name = collection_name
         self.ollama_base_url = ollama_base_url
         self.embed_model = embed_model
+        self.embedding_cache = embedding_cache
+        self.scheduler = scheduler or OllamaScheduler(max_concurrency=0)
         self.client = chromadb.HttpClient(
             host=chroma_host,
             port=chroma_port,
@@ -31,25 +71,79 @@ class LongTermMemoryTool:
             name=collection_name,
             metadata={"hnsw:space": "cosine"},
         )
+        # Async clients are bound to the running event loop, so they are created lazily.
+        self._http: httpx.AsyncClient | None = None
+        self._async_collection: Any = None
+        self._async_lock = asyncio.Lock()
+        # Bumped on every write so sessions know when a cached memory lookup is stale.
+        self.version = 0
 
     def _embed(self, text: str) -> list[float]:
-        response = requests.post(
-            f"{self.ollama_base_url.rstrip('/')}/api/embeddings",
-            json={"model": self.embed_model, "prompt": text},
-            timeout=60,
-        )
+        if self.embedding_cache is not None:
+            cached = self.embedding_cache.get(self.embed_model, text)
+            if cached is not None:
+                return cached
+        with self.scheduler.slot("embeddings"):
+            response = requests.post(
+                f"{self.ollama_base_url.rstrip('/')}/api/embeddings",
+                json={"model": self.embed_model, "prompt": text},
+                timeout=timeout_for(60),
+            )
+        response.raise_for_status()
+        payload = response.json()
+        if self.embedding_cache is not None:
+            self.embedding_cache.put(self.embed_model, text, payload["embedding"])
+        return payload["embedding"]
+
+    def _embed_many(self, texts: list[str]) -> list[list[float]]:
+        # /api/embed takes a list input, so a batch costs one request. Only the
+        # background memory writer embeds in bulk, hence the lowest priority.
+        with self.scheduler.slot("persist_memory"):
+            response = requests.post(
+                f"{self.ollama_base_url.rstrip('/')}/api/embed",
+                json={"model": self.embed_model, "input": texts},
+                timeout=120,
+            )
+        response.raise_for_status()
+        payload = response.json()
+        return payload["embeddings"]
+
+    async def _aembed(self, text: str) -> list[float]:
+        if self.embedding_cache is not None:
+            cached = self.embedding_cache.get(self.embed_model, text)
+            if cached is not None:
+                return cached
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=60)
+        async with self.scheduler.aslot("embeddings"):
+            response = await self._http.post(
+                f"{self.ollama_base_url.rstrip('/')}/api/embeddings",
+                json={"model": self.embed_model, "prompt": text},
+                timeout=timeout_for(60),
+            )
         response.raise_for_status()
         payload = response.json()
+        if self.embedding_cache is not None:
+            self.embedding_cache.put(self.embed_model, text, payload["embedding"])
         return payload["embedding"]
 
+    async def _aget_collection(self) -> Any:
+        async with self._async_lock:
+            if self._async_collection is None:
+                client = await chromadb.AsyncHttpClient(
+                    host=self.chroma_host,
+                    port=self.chroma_port,
+                    settings=Settings(anonymized_telemetry=False),
+                )
+                self._async_collection = await client.get_or_create_collection(
+                    name=self.collection_name,
+                    metadata={"hnsw:space": "cosine"},
+                )
+            return self._async_collection
+
     def save_memory(self, text: str, metadata: dict[str, Any] | None = None) -> str:
         memory_id = str(uuid.uuid4())
-        meta = {
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "source": "agent",
-        }
-        if metadata:
-            meta.update(metadata)
+        meta = _memory_metadata(metadata)
 
         embedding = self._embed(text)
         self.collection.add(
@@ -58,26 +152,54 @@ class LongTermMemoryTool:
             metadatas=[meta],
             embeddings=[embedding],
         )
+        self.version += 1
+        logger.info("[MEMORY] Stored memory id=%s metadata=%s", memory_id, json.dumps(meta))
+        return memory_id
+
+    def save_memories(self, items: list[tuple[str, dict[str, Any] | None]]) -> list[str]:
+        """Store several (text, metadata) memories with one embedding call and one Chroma add."""
+        if not items:
+            return []
+        memory_ids = [str(uuid.uuid4()) for _ in items]
+        texts = [text for text, _ in items]
+        metas = [_memory_metadata(metadata) for _, metadata in items]
+
+        embeddings = self._embed_many(texts)
+        self.collection.add(
+            ids=memory_ids,
+            documents=texts,
+            metadatas=metas,
+            embeddings=embeddings,
+        )
+        self.version += 1
+        logger.info("[MEMORY] Stored %d memories in bulk", len(memory_ids))
+        return memory_ids
+
+    async def asave_memory(self, text: str, metadata: dict[str, Any] | None = None) -> str:
+        memory_id = str(uuid.uuid4())
+        meta = _memory_metadata(metadata)
+
+        embedding, collection = await asyncio.gather(self._aembed(text), self._aget_collection())
+        await collection.add(
+            ids=[memory_id],
+            documents=[text],
+            metadatas=[meta],
+            embeddings=[embedding],
+        )
+        self.version += 1
         logger.info("[MEMORY] Stored memory id=%s metadata=%s", memory_id, json.dumps(meta))
         return memory_id
 
     def search_memories(self, query: str, n_results: int = 4) -> list[dict[str, Any]]:
         embedding = self._embed(query)
         res = self.collection.query(query_embeddings=[embedding], n_results=n_results)
-
-        docs = res.get("documents", [[]])[0]
-        metas = res.get("metadatas", [[]])[0]
-        distances = res.get("distances", [[]])[0]
-
-        memories: list[dict[str, Any]] = []
-        for idx, doc in enumerate(docs):
-            memories.append(
-                {
-                    "text": doc,
-                    "metadata": metas[idx] if idx < len(metas) else {},
-                    "distance": distances[idx] if idx < len(distances) else None,
-                }
-            )
+        memories = _memories_from_query(res)
         logger.info("[MEMORY] Retrieved %d memories for query='%s'", len(memories), query)
         return memories
 
+    async def asearch_memories(self, query: str, n_results: int = 4) -> list[dict[str, Any]]:
+        embedding, collection = await asyncio.gather(self._aembed(query), self._aget_collection())
+        res = await collection.query(query_embeddings=[embedding], n_results=n_results)
+        memories = _memories_from_query(res)
+        logger.info("[MEMORY] Async retrieved %d memories for query='%s'", len(memories), query)
+        return memories
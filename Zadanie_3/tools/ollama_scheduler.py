@@ -0,0 +1,181 @@
+"""Priority gate in front of the shared Ollama instance.
+
+Every LLM and embedding call takes a slot first. When all slots are busy, waiters are
+served by priority class, so under saturation background work waits the longest.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Iterator
+
+from tools.deadline import DeadlineExceeded, remaining
+
+logger = logging.getLogger(__name__)
+
+# Highest priority first.
+PRIORITIES = ("respond", "planner", "nl_to_sql", "embeddings", "persist_memory")
+_RANK = {name: rank for rank, name in enumerate(PRIORITIES)}
+
+
+class _Waiter:
+    __slots__ = ("grant", "granted", "cancelled")
+
+    def __init__(self, grant: Callable[[], None]) -> None:
+        self.grant = grant
+        self.granted = False
+        self.cancelled = False
+
+
+class OllamaScheduler:
+    """Caps concurrent Ollama calls across threads and event loops.
+
+    `max_concurrency <= 0` disables the cap; calls then only record metrics.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 2,
+        on_wait: Callable[[str, float], None] | None = None,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.on_wait = on_wait
+        self._lock = threading.Lock()
+        self._running = 0
+        self._seq = itertools.count()
+        self._queue: list[tuple[int, int, str, _Waiter]] = []
+        self._queued = {name: 0 for name in PRIORITIES}
+        self._calls = {name: 0 for name in PRIORITIES}
+        self._wait_seconds = {name: 0.0 for name in PRIORITIES}
+        self._max_wait_seconds = {name: 0.0 for name in PRIORITIES}
+
+    def _rank(self, priority: str) -> int:
+        if priority not in _RANK:
+            raise ValueError(f"Unknown Ollama priority: {priority}")
+        return _RANK[priority]
+
+    def _try_acquire_locked(self) -> bool:
+        if self.max_concurrency <= 0 or (self._running < self.max_concurrency and not self._queue):
+            self._running += 1
+            return True
+        return False
+
+    def _enqueue_locked(self, priority: str, waiter: _Waiter) -> None:
+        heapq.heappush(self._queue, (self._rank(priority), next(self._seq), priority, waiter))
+        self._queued[priority] += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._running -= 1
+            while self._queue and (self.max_concurrency <= 0 or self._running < self.max_concurrency):
+                _, _, priority, waiter = heapq.heappop(self._queue)
+                self._queued[priority] -= 1
+                if waiter.cancelled:
+                    continue
+                waiter.granted = True
+                self._running += 1
+                waiter.grant()
+
+    def _withdraw(self, priority: str, waiter: _Waiter, waited: float) -> DeadlineExceeded:
+        """Cancel a waiter that gave up; a slot granted to it meanwhile is passed on."""
+        with self._lock:
+            granted = waiter.granted
+            waiter.cancelled = True
+        if granted:
+            self._release()
+        logger.warning("[OLLAMA] %s gave up after %.2fs: request deadline reached", priority, waited)
+        return DeadlineExceeded(f"No Ollama slot for {priority} before the request deadline.")
+
+    def _record(self, priority: str, waited: float) -> None:
+        with self._lock:
+            self._calls[priority] += 1
+            self._wait_seconds[priority] += waited
+            self._max_wait_seconds[priority] = max(self._max_wait_seconds[priority], waited)
+        if waited > 1.0:
+            logger.info("[OLLAMA] %s waited %.2fs for a slot", priority, waited)
+        if self.on_wait is not None:
+            self.on_wait(priority, waited)
+
+    @contextmanager
+    def slot(self, priority: str) -> Iterator[None]:
+        """Hold one Ollama slot for the duration of the block (blocking wait).
+
+        The wait ends at the request deadline (tools/deadline.py) with `DeadlineExceeded`.
+        """
+        started = time.perf_counter()
+        event = threading.Event()
+        waiter = _Waiter(event.set)
+        with self._lock:
+            self._rank(priority)
+            acquired = self._try_acquire_locked()
+            if not acquired:
+                self._enqueue_locked(priority, waiter)
+        if not acquired and not event.wait(remaining()):
+            raise self._withdraw(priority, waiter, time.perf_counter() - started)
+        self._record(priority, time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def aslot(self, priority: str) -> AsyncIterator[None]:
+        """Async variant of `slot`; sync and async callers share the same slots."""
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[None] = loop.create_future()
+
+        def grant() -> None:
+            # Called by whichever thread releases a slot.
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = _Waiter(grant)
+        with self._lock:
+            self._rank(priority)
+            acquired = self._try_acquire_locked()
+            if not acquired:
+                self._enqueue_locked(priority, waiter)
+        if not acquired:
+            try:
+                await asyncio.wait_for(future, remaining())
+            except asyncio.TimeoutError:
+                raise self._withdraw(priority, waiter, time.perf_counter() - started) from None
+            except asyncio.CancelledError:
+                with self._lock:
+                    granted = waiter.granted
+                    waiter.cancelled = True
+                if granted:
+                    # The slot was handed over just as the caller went away.
+                    self._release()
+                raise
+        self._record(priority, time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "running": self._running,
+                "queued": dict(self._queued),
+                "calls": dict(self._calls),
+                "wait_avg_ms": {
+                    name: 1000 * self._wait_seconds[name] / self._calls[name] if self._calls[name] else 0.0
+                    for name in PRIORITIES
+                },
+                "wait_max_ms": {name: 1000 * value for name, value in self._max_wait_seconds.items()},
+            }
+
+
+def ollama_scheduler_from_env(on_wait: Callable[[str, float], None] | None = None) -> OllamaScheduler:
+    return OllamaScheduler(
+        max_concurrency=int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2")),
+        on_wait=on_wait,
+    )
@@ -0,0 +1,217 @@
+"""Process-wide Postgres connection pools for the native SQL backend and the Postgres MCP server.
+
+Connections are health-checked when borrowed, broken ones are replaced, and a read-only query
+that loses its connection is retried once on a fresh one. `statement_timeout` is set inside
+each query's transaction, so it never leaks to the next borrower.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable
+
+import psycopg
+from psycopg_pool import AsyncConnectionPool, ConnectionPool, PoolTimeout
+
+logger = logging.getLogger(__name__)
+
+# Not retried: the server is unreachable/saturated, or the query itself hit statement_timeout.
+_NOT_RETRIED = (PoolTimeout, psycopg.errors.QueryCanceled)
+
+# set_config() takes bind parameters, unlike SET; is_local=true scopes it to the transaction.
+_SET_LOCAL_STATEMENT_TIMEOUT = "SELECT set_config('statement_timeout', %s, true)"
+
+
+def pg_connect_kwargs() -> dict[str, Any]:
+    return {
+        "host": os.getenv("POSTGRES_HOST", "localhost"),
+        "port": int(os.getenv("POSTGRES_PORT", "5432")),
+        "dbname": os.getenv("POSTGRES_DB", "lankovacka"),
+        "user": os.getenv("POSTGRES_USER", "langflow"),
+        "password": os.getenv("POSTGRES_PASSWORD", "langflow"),
+        "autocommit": True,
+    }
+
+
+class PgPool:
+    """Sync pool opened eagerly, async pool opened on first use inside the running loop."""
+
+    def __init__(
+        self,
+        min_size: int = 1,
+        max_size: int = 4,
+        timeout: float = 10.0,
+        max_idle: float = 300.0,
+        max_lifetime: float = 1800.0,
+        on_wait: Callable[[str, float], None] | None = None,
+    ) -> None:
+        self.on_wait = on_wait
+        self._options: dict[str, Any] = {
+            "conninfo": "",
+            "kwargs": pg_connect_kwargs(),
+            "min_size": min_size,
+            "max_size": max(min_size, max_size),
+            "timeout": timeout,
+            "max_idle": max_idle,
+            "max_lifetime": max_lifetime,
+        }
+        # open=True connects min_size connections in the background; failures are retried.
+        self._pool = ConnectionPool(
+            **self._options, check=ConnectionPool.check_connection, name="pg-sync", open=True
+        )
+        self._apool: AsyncConnectionPool | None = None
+        self._apool_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._waits = {"sync": [0, 0.0, 0.0], "async": [0, 0.0, 0.0]}  # count, total, max
+        self._retries = 0
+
+    def _record_wait(self, kind: str, waited: float) -> None:
+        with self._lock:
+            stats = self._waits[kind]
+            stats[0] += 1
+            stats[1] += waited
+            stats[2] = max(stats[2], waited)
+        if waited > 1.0:
+            logger.info("[PG_POOL] %s query waited %.2fs for a connection", kind, waited)
+        if self.on_wait is not None:
+            self.on_wait(kind, waited)
+
+    def _count_retry(self, exc: Exception) -> None:
+        with self._lock:
+            self._retries += 1
+        logger.warning("[PG_POOL] Connection lost (%s), retrying on a fresh connection", exc)
+
+    def _query_once(self, statement: str, statement_timeout_ms: int) -> tuple[list[str], list[Any]]:
+        started = time.perf_counter()
+        try:
+            conn = self._pool.getconn()
+        finally:
+            self._record_wait("sync", time.perf_counter() - started)
+        try:
+            with conn.transaction(), conn.cursor() as cur:
+                cur.execute(_SET_LOCAL_STATEMENT_TIMEOUT, (str(int(statement_timeout_ms)),))
+                cur.execute(statement)
+                rows = cur.fetchall()
+                columns = [c.name for c in cur.description] if cur.description else []
+        finally:
+            # A broken connection is discarded and replaced by the pool's workers.
+            self._pool.putconn(conn)
+        return columns, rows
+
+    def query(self, statement: str, statement_timeout_ms: int = 0) -> tuple[list[str], list[Any]]:
+        """Run one read-only statement; returns (column names, rows)."""
+        try:
+            return self._query_once(statement, statement_timeout_ms)
+        except psycopg.OperationalError as exc:
+            # Read-only queries are safe to repeat on a fresh connection.
+            if isinstance(exc, _NOT_RETRIED):
+                raise
+            self._count_retry(exc)
+            return self._query_once(statement, statement_timeout_ms)
+
+    async def _aget_pool(self) -> AsyncConnectionPool:
+        with self._apool_lock:
+            pool = self._apool
+            if pool is None:
+                pool = self._apool = AsyncConnectionPool(
+                    **self._options, check=AsyncConnectionPool.check_connection, name="pg-async", open=False
+                )
+        await pool.open()  # no-op once open
+        return pool
+
+    async def _aquery_once(self, statement: str, statement_timeout_ms: int) -> tuple[list[str], list[Any]]:
+        pool = await self._aget_pool()
+        started = time.perf_counter()
+        try:
+            conn = await pool.getconn()
+        finally:
+            self._record_wait("async", time.perf_counter() - started)
+        try:
+            async with conn.transaction(), conn.cursor() as cur:
+                await cur.execute(_SET_LOCAL_STATEMENT_TIMEOUT, (str(int(statement_timeout_ms)),))
+                await cur.execute(statement)
+                rows = await cur.fetchall()
+                columns = [c.name for c in cur.description] if cur.description else []
+        finally:
+            await pool.putconn(conn)
+        return columns, rows
+
+    async def aquery(self, statement: str, statement_timeout_ms: int = 0) -> tuple[list[str], list[Any]]:
+        try:
+            return await self._aquery_once(statement, statement_timeout_ms)
+        except psycopg.OperationalError as exc:
+            if isinstance(exc, _NOT_RETRIED):
+                raise
+            self._count_retry(exc)
+            return await self._aquery_once(statement, statement_timeout_ms)
+
+    def close(self) -> None:
+        self._pool.close()
+        if self._apool is not None and not self._apool.closed:
+            try:
+                asyncio.get_running_loop().create_task(self._apool.close())
+            except RuntimeError:
+                pass  # no running loop; the async pool dies with the process
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            waits = {kind: list(values) for kind, values in self._waits.items()}
+            retries = self._retries
+        pools = {"sync": self._pool.get_stats()}
+        if self._apool is not None:
+            pools["async"] = self._apool.get_stats()
+        stats: dict[str, Any] = {"retries": retries}
+        for kind, (count, total, longest) in waits.items():
+            stats[f"{kind}_checkouts"] = count
+            stats[f"{kind}_wait_avg_ms"] = 1000 * total / count if count else 0.0
+            stats[f"{kind}_wait_max_ms"] = 1000 * longest
+        for kind, pool_stats in pools.items():
+            # pool_min/pool_max/pool_size/pool_available/requests_waiting/connections_lost/...
+            stats[kind] = dict(pool_stats)
+        return stats
+
+
+_shared: PgPool | None = None
+_shared_lock = threading.Lock()
+_wait_listeners: list[Callable[[str, float], None]] = []
+
+
+def add_wait_listener(listener: Callable[[str, float], None]) -> None:
+    """Called with ("sync" | "async", seconds) after every connection checkout of the shared pool."""
+    with _shared_lock:
+        if listener not in _wait_listeners:
+            _wait_listeners.append(listener)
+
+
+def _notify_wait(kind: str, waited: float) -> None:
+    for listener in list(_wait_listeners):
+        try:
+            listener(kind, waited)
+        except Exception as exc:
+            logger.warning("[PG_POOL] wait listener failed: %s", exc)
+
+
+def pg_pool_from_env() -> PgPool:
+    """The process-wide pool, created on first use from PG_POOL_* settings."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = PgPool(
+                min_size=int(os.getenv("PG_POOL_MIN_SIZE", "1")),
+                max_size=int(os.getenv("PG_POOL_MAX_SIZE", "4")),
+                timeout=float(os.getenv("PG_POOL_TIMEOUT_SECONDS", "10")),
+                max_idle=float(os.getenv("PG_POOL_MAX_IDLE_SECONDS", "300")),
+                max_lifetime=float(os.getenv("PG_POOL_MAX_LIFETIME_SECONDS", "1800")),
+                on_wait=_notify_wait,
+            )
+            logger.info(
+                "[PG_POOL] Created pool min=%d max=%d", _shared._options["min_size"], _shared._options["max_size"]
+            )
+        return _shared
+
+
+def pg_pool_stats() -> dict[str, Any]:
+    """Stats of the shared pool, or {} while it has not been created."""
+    return _shared.stats() if _shared is not None else {}
@@ -1,13 +1,36 @@
+import asyncio
 import logging
 from typing import Any
 
 import chromadb
+import httpx
 import requests
 from chromadb.config import Settings
 
+from tools.deadline import timeout_for
+from tools.embedding_cache import EmbeddingCache
+from tools.ollama_scheduler import OllamaScheduler
+
 logger = logging.getLogger(__name__)
 
 
+def _matches_from_query(results: Any) -> list[dict[str, Any]]:
+    docs = results.get("documents", [[]])[0]
+    metas = results.get("metadatas", [[]])[0]
+    distances = results.get("distances", [[]])[0]
+
+    matches: list[dict[str, Any]] = []
+    for idx, doc in enumerate(docs):
+        matches.append(
+            {
+                "document": doc,
+                "metadata": metas[idx] if idx < len(metas) else {},
+                "distance": distances[idx] if idx < len(distances) else None,
+            }
+        )
+    return matches
+
+
 class RAGTool:
     def __init__(
         self,
@@ -16,43 +39,105 @@ class RAGTool:
         collection_name: str,
         ollama_base_url: str,
         embed_model: str,
+        embedding_cache: EmbeddingCache | None = None,
+        scheduler: OllamaScheduler | None = None,
     ) -> None:
+        self.chroma_host = chroma_host
+        self.chroma_port = chroma_port
+        self.collection_name = collection_name
         self.ollama_base_url = ollama_base_url
         self.embed_model = embed_model
+        self.embedding_cache = embedding_cache
+        self.scheduler = scheduler or OllamaScheduler(max_concurrency=0)
         self.client = chromadb.HttpClient(
             host=chroma_host,
             port=chroma_port,
             settings=Settings(anonymized_telemetry=False),
         )
         self.collection = self.client.get_collection(name=collection_name)
+        # Async clients are bound to the running event loop, so they are created lazily.
+        self._http: httpx.AsyncClient | None = None
+        self._async_client: Any = None
+        self._async_collection: Any = None
+        self._async_lock = asyncio.Lock()
 
-    def _embed(self, text: str) -> list[float]:
-        response = requests.post(
-            f"{self.ollama_base_url.rstrip('/')}/api/embeddings",
-            json={"model": self.embed_model, "prompt": text},
-            timeout=60,
-        )
+    def embed(self, text: str) -> list[float]:
+        if self.embedding_cache is not None:
+            cached = self.embedding_cache.get(self.embed_model, text)
+            if cached is not None:
+                return cached
+        with self.scheduler.slot("embeddings"):
+            response = requests.post(
+                f"{self.ollama_base_url.rstrip('/')}/api/embeddings",
+                json={"model": self.embed_model, "prompt": text},
+                timeout=timeout_for(60),
+            )
         response.raise_for_status()
         payload = response.json()
+        if self.embedding_cache is not None:
+            self.embedding_cache.put(self.embed_model, text, payload["embedding"])
         return payload["embedding"]
 
-    def search(self, query: str, n_results: int = 3) -> list[dict[str, Any]]:
-        query_embedding = self._embed(query)
-        results = self.collection.query(query_embeddings=[query_embedding], n_results=n_results)
+    async def aembed(self, text: str) -> list[float]:
+        if self.embedding_cache is not None:
+            cached = self.embedding_cache.get(self.embed_model, text)
+            if cached is not None:
+                return cached
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=60)
+        async with self.scheduler.aslot("embeddings"):
+            response = await self._http.post(
+                f"{self.ollama_base_url.rstrip('/')}/api/embeddings",
+                json={"model": self.embed_model, "prompt": text},
+                timeout=timeout_for(60),
+            )
+        response.raise_for_status()
+        payload = response.json()
+        if self.embedding_cache is not None:
+            self.embedding_cache.put(self.embed_model, text, payload["embedding"])
+        return payload["embedding"]
 
-        docs = results.get("documents", [[]])[0]
-        metas = results.get("metadatas", [[]])[0]
-        distances = results.get("distances", [[]])[0]
-
-        matches: list[dict[str, Any]] = []
-        for idx, doc in enumerate(docs):
-            matches.append(
-                {
-                    "document": doc,
-                    "metadata": metas[idx] if idx < len(metas) else {},
-                    "distance": distances[idx] if idx < len(distances) else None,
-                }
+    async def _aget_client(self) -> Any:
+        if self._async_client is None:
+            self._async_client = await chromadb.AsyncHttpClient(
+                host=self.chroma_host,
+                port=self.chroma_port,
+                settings=Settings(anonymized_telemetry=False),
             )
+        return self._async_client
+
+    async def _aget_collection(self) -> Any:
+        async with self._async_lock:
+            if self._async_collection is None:
+                client = await self._aget_client()
+                self._async_collection = await client.get_collection(name=self.collection_name)
+            return self._async_collection
+
+    def kb_version(self) -> str:
+        """Identify the current KB contents: collection id, ingest version and size."""
+        # Re-ingest recreates the collection, so follow it instead of holding a stale handle.
+        self.collection = self.client.get_collection(name=self.collection_name)
+        meta = self.collection.metadata or {}
+        return f"{self.collection.id}:{meta.get('kb_version', '')}:{self.collection.count()}"
+
+    async def akb_version(self) -> str:
+        async with self._async_lock:
+            client = await self._aget_client()
+            self._async_collection = await client.get_collection(name=self.collection_name)
+            collection = self._async_collection
+        meta = collection.metadata or {}
+        return f"{collection.id}:{meta.get('kb_version', '')}:{await collection.count()}"
+
+    def search(self, query: str, n_results: int = 3) -> list[dict[str, Any]]:
+        query_embedding = self.embed(query)
+        results = self.collection.query(query_embeddings=[query_embedding], n_results=n_results)
+        matches = _matches_from_query(results)
         logger.info("[RAG] Query='%s' returned %d docs", query, len(matches))
         return matches
 
+    async def asearch(self, query: str, n_results: int = 3) -> list[dict[str, Any]]:
+        query_embedding, collection = await asyncio.gather(self.aembed(query), self._aget_collection())
+        results = await collection.query(query_embeddings=[query_embedding], n_results=n_results)
+        matches = _matches_from_query(results)
+        logger.info("[RAG] Async query='%s' returned %d docs", query, len(matches))
+        return matches
@@ -0,0 +1,292 @@
+"""Routes aggregate queries over `telemetry` to the rollup tables.
+
+`telemetry_1m`, `telemetry_1h` and `telemetry_1d` (Zadanie_2/services/postgres/init/03_rollups.sql)
+hold count, min, max, sum, first and last per UTC bucket, machine and tag. A query is
+rewritten only when it has the shape
+
+    SELECT <machine_id/tag/unit, date_trunc(<unit>, ts), AVG/MIN/MAX/SUM/COUNT(value), COUNT(*),
+            MIN/MAX(ts)> FROM telemetry [WHERE ...] [GROUP BY ...] [HAVING ...] [ORDER BY ...] [LIMIT n]
+
+with no joins, subqueries or other functions, and `value` only inside those aggregates.
+The coarsest rollup is chosen whose bucket is no larger than the `date_trunc` unit and for
+which every `ts` condition in WHERE keeps or drops whole buckets:
+
+- `ts >= X` / `ts < X` with X a literal aligned to the bucket, or `date_trunc(<unit>, now())`:
+  exact. `>`, `<=`, `=` and `BETWEEN` on literals are not routed (they split a bucket).
+- `ts < now()` / `ts <= now()`: exact (telemetry has no future rows).
+- `ts >= now() - interval '...'` (and other bounds relative to now()): the bucket at the edge
+  is partial, so the result is approximate. Routed only when one bucket is at most
+  `max_edge_fraction` of the window (0 disables); the rewrite reports it as approximate.
+
+Hour and day buckets are UTC; `date_trunc` in the rewritten query assumes a UTC session
+(the Postgres image default).
+"""
+
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# (table, bucket seconds), coarsest first.
+ROLLUP_TABLES = (("telemetry_1d", 86400), ("telemetry_1h", 3600), ("telemetry_1m", 60))
+_BUCKET_NAMES = {86400: "day", 3600: "hour", 60: "minute"}
+
+_UNIT_SECONDS = {
+    "second": 1,
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+    "week": 7 * 86400,
+    "month": 28 * 86400,
+    "quarter": 90 * 86400,
+    "year": 365 * 86400,
+}
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER_RE = re.compile(r"\x00(\d+)\x00")
+_SHAPE_RE = re.compile(
+    r"^\s*select\s+(?P<select>.+?)\s+from\s+telemetry"
+    r"(?:\s+where\s+(?P<where>.+?))?"
+    r"(?:\s+group\s+by\s+(?P<group>.+?))?"
+    r"(?:\s+having\s+(?P<having>.+?))?"
+    r"(?:\s+order\s+by\s+(?P<order>.+?))?"
+    r"(?:\s+limit\s+(?P<limit>\d+))?\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+_CALL_RE = re.compile(r"\b(\w+)\s*\(")
+_ALLOWED_CALLS = {
+    "avg", "min", "max", "sum", "count", "date_trunc", "now", "round", "coalesce", "nullif",
+    "in", "and", "or", "not", "between",
+}
+_AGG_RE = re.compile(r"\b(avg|min|max|sum|count)\s*\(\s*(value|ts|\*)\s*\)", re.IGNORECASE)
+_AGG_ANY_RE = re.compile(r"\b(?:avg|sum|count)\s*\(", re.IGNORECASE)
+_COUNT_DISTINCT_RE = re.compile(r"\bcount\s*\(\s*distinct\b", re.IGNORECASE)
+_TRUNC_RE = re.compile(r"\bdate_trunc\s*\(\s*\x00(\d+)\x00\s*,\s*ts\s*\)", re.IGNORECASE)
+_NOW = r"(?:now\s*\(\s*\)|current_timestamp)"
+# `ts <op> <bound>`; exactly one of the bound groups matches.
+_TS_CONDITION_RE = re.compile(
+    r"\bts\s*(?P<op>>=|<=|<>|!=|=|<|>)\s*(?:"
+    rf"{_NOW}\s*-\s*(?:interval\s*\x00(?P<ago>\d+)\x00|\x00(?P<ago_cast>\d+)\x00\s*::\s*interval)"
+    rf"|date_trunc\s*\(\s*\x00(?P<trunc>\d+)\x00\s*,\s*{_NOW}\s*\)"
+    rf"|(?P<now>{_NOW})"
+    r"|\x00(?P<literal>\d+)\x00(?:\s*::\s*(?:timestamptz|timestamp|date))?"
+    r")",
+    re.IGNORECASE,
+)
+_INTERVAL_PART_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(second|minute|hour|day|week|month|year)s?", re.IGNORECASE)
+# Rollup column names; a query using them as aliases could bind to the rollup column instead.
+_ROLLUP_COLUMNS_RE = re.compile(
+    r"\b(?:bucket|samples|value_count|value_min|value_max|value_sum|first_ts|value_first|last_ts|value_last)\b",
+    re.IGNORECASE,
+)
+
+
+def _rollup_aggregate(match: re.Match) -> str:
+    func, arg = match.group(1).lower(), match.group(2).lower()
+    if arg == "value":
+        return {
+            "avg": "(sum(value_sum) / nullif(sum(value_count), 0)::double precision)",
+            "min": "min(value_min)",
+            "max": "max(value_max)",
+            "sum": "sum(value_sum)",
+            "count": "coalesce(sum(value_count), 0)::bigint",
+        }[func]
+    if func == "count":
+        return "coalesce(sum(samples), 0)::bigint"
+    return {"min": "min(first_ts)", "max": "max(last_ts)"}[func]  # avg/sum(ts) rejected earlier
+
+
+def _split_top_level(clause: str) -> list[str]:
+    items, depth, start = [], 0, 0
+    for idx, char in enumerate(clause):
+        depth += char == "("
+        depth -= char == ")"
+        if char == "," and depth == 0:
+            items.append(clause[start:idx])
+            start = idx + 1
+    items.append(clause[start:])
+    return items
+
+
+def _name_aggregates(select: str) -> str:
+    """Keep the output column names of unaliased aggregates (`avg`, `count`, ...)."""
+    items = []
+    for item in _split_top_level(select):
+        match = _AGG_RE.fullmatch(item.strip())
+        items.append(f"{item.rstrip()} AS {match.group(1).lower()}" if match else item)
+    return ",".join(items)
+
+
+def _interval_seconds(text: str) -> float | None:
+    parts = _INTERVAL_PART_RE.findall(text)
+    if not parts:
+        return None
+    return sum(float(amount) * _UNIT_SECONDS[unit.lower()] for amount, unit in parts)
+
+
+def _literal_time(literal: str) -> datetime | None:
+    try:
+        value = datetime.fromisoformat(literal.strip("'"))
+    except ValueError:
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class _NotRoutable(Exception):
+    pass
+
+
+class RollupRouter:
+    def __init__(self, max_edge_fraction: float = 0.02) -> None:
+        self.max_edge_fraction = max_edge_fraction
+        self._lock = threading.Lock()
+        self._disabled = False
+        self._routed: dict[str, int] = {table: 0 for table, _ in ROLLUP_TABLES}
+        self._raw = 0
+        self._failures = 0
+
+    def _route_where(self, seconds: int, where: str, literals: list[str]) -> tuple[str, bool] | None:
+        """WHERE on `bucket` and whether it is approximate, or None if `seconds` buckets do not fit."""
+        approximate = False
+        lower_ago: list[float] = []
+        upper_ago: list[float] = []
+
+        def condition(match: re.Match) -> str:
+            nonlocal approximate
+            op = match.group("op")
+            bound = match.group(0)[match.end("op") - match.start():].strip()
+            if match.group("ago") or match.group("ago_cast"):
+                ago = _interval_seconds(literals[int(match.group("ago") or match.group("ago_cast"))])
+                if ago is None or op not in (">=", ">", "<", "<="):
+                    raise _NotRoutable
+                (lower_ago if op.startswith(">") else upper_ago).append(ago)
+                approximate = True
+            elif match.group("trunc"):
+                unit = _UNIT_SECONDS.get(literals[int(match.group("trunc"))].strip("'").lower())
+                if unit is None or seconds > unit or op not in (">=", "<"):
+                    raise _NotRoutable
+            elif match.group("now"):
+                if op not in ("<", "<="):
+                    raise _NotRoutable
+            else:
+                value = _literal_time(literals[int(match.group("literal"))])
+                if value is None or value.timestamp() % seconds or op not in (">=", "<"):
+                    raise _NotRoutable
+            return f"bucket {op} {bound}"
+
+        try:
+            routed = _TS_CONDITION_RE.sub(condition, where)
+        except _NotRoutable:
+            return None
+        if re.search(r"\b(?:ts|between)\b", routed, re.IGNORECASE):
+            return None
+        if approximate:
+            # Relative window: from the oldest lower bound to the newest upper bound (or now).
+            window = max(lower_ago or [0.0]) - min(upper_ago or [0.0])
+            if window <= 0 or seconds > self.max_edge_fraction * window:
+                return None
+        return routed, approximate
+
+    def rewrite(self, sql: str) -> tuple[str, str, str | None] | None:
+        """`(rewritten SQL, rollup table, approximation note)`, or None when `sql` must run on raw telemetry.
+
+        The note is None when the rewrite returns exactly what the raw query would.
+        """
+        routed = None if self._disabled else self._rewrite(sql)
+        with self._lock:
+            if routed is None:
+                self._raw += 1
+            else:
+                self._routed[routed[1]] += 1
+        return routed
+
+    def _rewrite(self, sql: str) -> tuple[str, str, str | None] | None:
+        literals: list[str] = []
+
+        def mask(match: re.Match) -> str:
+            literals.append(match.group(0))
+            return f"\x00{len(literals) - 1}\x00"
+
+        masked = _LITERAL_RE.sub(mask, sql)
+        shape = _SHAPE_RE.match(masked)
+        if shape is None or _ROLLUP_COLUMNS_RE.search(masked):
+            return None
+        if not {call.lower() for call in _CALL_RE.findall(masked)} <= _ALLOWED_CALLS:
+            return None
+        aggregates = _AGG_RE.findall(masked)
+        if len(_AGG_ANY_RE.findall(masked)) != sum(
+            1 for func, _ in aggregates if func.lower() in ("avg", "sum", "count")
+        ) + len(_COUNT_DISTINCT_RE.findall(masked)):
+            return None  # e.g. count(tag) would count buckets, not rows
+        if any(arg.lower() == "ts" and func.lower() in ("avg", "sum") for func, arg in aggregates):
+            return None
+        if not aggregates and not shape.group("group"):
+            return None  # one row per raw row
+
+        grain: int | None = None
+        for match in _TRUNC_RE.finditer(masked):
+            unit = _UNIT_SECONDS.get(literals[int(match.group(1))].strip("'").lower())
+            if unit is None or unit < 60:
+                return None
+            grain = unit if grain is None else min(grain, unit)
+
+        clauses = {}
+        for name in ("select", "where", "group", "having", "order"):
+            clause = shape.group(name)
+            if clause is None:
+                continue
+            if name == "select":
+                clause = _name_aggregates(clause)
+            clause = _AGG_RE.sub(_rollup_aggregate, clause)
+            clause = _TRUNC_RE.sub(lambda m: f"date_trunc(\x00{m.group(1)}\x00, bucket)", clause)
+            if re.search(r"\bvalue\b", clause, re.IGNORECASE) or (
+                name != "where" and re.search(r"\bts\b", clause, re.IGNORECASE)
+            ):
+                return None
+            if name == "select" and "*" in clause:
+                return None
+            clauses[name] = clause
+
+        for table, seconds in ROLLUP_TABLES:
+            if grain is not None and seconds > grain:
+                continue
+            where = self._route_where(seconds, clauses.get("where", ""), literals)
+            if where is not None:
+                break
+        else:
+            return None
+        clauses["where"], approximate = where
+
+        rewritten = f"SELECT {clauses['select']} FROM {table}"
+        for name, keyword in (("where", "WHERE"), ("group", "GROUP BY"), ("having", "HAVING"), ("order", "ORDER BY")):
+            if clauses.get(name):
+                rewritten += f" {keyword} {clauses[name]}"
+        if shape.group("limit"):
+            rewritten += f" LIMIT {shape.group('limit')}"
+        note = None
+        if approximate:
+            note = f"Computed from {table}: the time window is rounded to whole {_BUCKET_NAMES[seconds]}s."
+        return _PLACEHOLDER_RE.sub(lambda m: literals[int(m.group(1))], rewritten), table, note
+
+    def failed(self, exc: Exception) -> None:
+        """A rewritten query failed; without the rollup tables, stop routing."""
+        with self._lock:
+            self._failures += 1
+            if "does not exist" in str(exc) and not self._disabled:
+                self._disabled = True
+                logger.warning("[ROLLUP] Rollup tables unavailable (%s); routing disabled", exc)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            stats: dict[str, Any] = {f"routed.{table}": count for table, count in self._routed.items()}
+            stats.update({"raw": self._raw, "failures": self._failures, "disabled": int(self._disabled)})
+            return stats
+
+
+def rollup_router_from_env() -> RollupRouter | None:
+    if os.getenv("ROLLUP_ROUTER_ENABLED", "true").lower() != "true":
+        return None
+    return RollupRouter(max_edge_fraction=float(os.getenv("ROLLUP_MAX_EDGE_FRACTION", "0.02")))
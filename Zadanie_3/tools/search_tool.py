@@ -1,13 +1,11 @@
-import atexit
-import json
 import logging
 import os
-import subprocess
-import threading
-from pathlib import Path
 from typing import Any, Literal
 
-from tavily import TavilyClient
+from tavily import AsyncTavilyClient, TavilyClient
+
+from tools.deadline import timeout_for
+from tools.mcp_client import MCPStdioClient
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +20,22 @@ def _vendor_adjusted_query(query: str, vendor: str | None = None) -> str:
     return f"{query} {vendor}"
 
 
+def _search_timeout() -> float:
+    return timeout_for(float(os.getenv("WEB_SEARCH_TIMEOUT_SECONDS", "20")))
+
+
+def _normalize_tavily_rows(response: dict[str, Any]) -> list[dict[str, Any]]:
+    rows = response.get("results", [])
+    return [
+        {
+            "title": row.get("title", ""),
+            "url": row.get("url", ""),
+            "snippet": row.get("content", ""),
+        }
+        for row in rows
+    ]
+
+
 class NativeTavilyTool:
     def __init__(self, max_results: int = 5) -> None:
         self.max_results = max_results
@@ -29,6 +43,7 @@ class NativeTavilyTool:
         if not api_key:
             raise ValueError("Missing TAVILY_API_KEY environment variable for Tavily native search.")
         self.client = TavilyClient(api_key=api_key)
+        self.async_client = AsyncTavilyClient(api_key=api_key)
 
     def search(self, query: str, vendor: str | None = None) -> list[dict[str, Any]]:
         final_query = _vendor_adjusted_query(query, vendor)
@@ -36,68 +51,61 @@ class NativeTavilyTool:
             query=final_query,
             max_results=self.max_results,
             include_raw_content=False,
+            timeout=_search_timeout(),
         )
-        rows = response.get("results", [])
-        normalized = [
-            {
-                "title": row.get("title", ""),
-                "url": row.get("url", ""),
-                "snippet": row.get("content", ""),
-            }
-            for row in rows
-        ]
+        normalized = _normalize_tavily_rows(response)
         logger.info("[WEB] Native query='%s' vendor='%s' -> %d results", query, vendor or "", len(normalized))
         return normalized
 
+    async def asearch(self, query: str, vendor: str | None = None) -> list[dict[str, Any]]:
+        final_query = _vendor_adjusted_query(query, vendor)
+        response = await self.async_client.search(
+            query=final_query,
+            max_results=self.max_results,
+            include_raw_content=False,
+            timeout=_search_timeout(),
+        )
+        normalized = _normalize_tavily_rows(response)
+        logger.info("[WEB] Native async query='%s' vendor='%s' -> %d results", query, vendor or "", len(normalized))
+        return normalized
+
 
 class MCPTavilyTool:
     def __init__(self, server_path: str, max_results: int = 5) -> None:
         self.max_results = max_results
-        self._counter = 0
-        self._lock = threading.Lock()
-        self._proc = subprocess.Popen(
-            [os.getenv("PYTHON_BIN", "python"), "-u", server_path],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            cwd=str(Path(server_path).resolve().parents[1]),
-        )
-        atexit.register(self.close)
+        self._client = MCPStdioClient(server_path, label="MCP Tavily server")
 
     def close(self) -> None:
-        if self._proc and self._proc.poll() is None:
-            self._proc.terminate()
-
-    def _request(self, method: str, params: dict[str, Any]) -> dict[str, Any] | list[dict[str, Any]]:
-        if self._proc.poll() is not None:
-            raise RuntimeError("MCP Tavily server process is not running.")
-
-        with self._lock:
-            self._counter += 1
-            req_id = self._counter
-            payload = {"id": req_id, "method": method, "params": params}
-            assert self._proc.stdin is not None
-            assert self._proc.stdout is not None
-            self._proc.stdin.write(json.dumps(payload, ensure_ascii=True) + "\n")
-            self._proc.stdin.flush()
-            line = self._proc.stdout.readline().strip()
-
-        if not line:
-            raise RuntimeError("Empty response from MCP Tavily server.")
-
-        response = json.loads(line)
-        if not response.get("ok"):
-            raise RuntimeError(response.get("error", "Unknown MCP Tavily error"))
-        return response["result"]
+        self._client.close()
+
+    def stats(self) -> dict[str, Any]:
+        return self._client.stats()
 
     def search(self, query: str, vendor: str | None = None) -> list[dict[str, Any]]:
         final_query = _vendor_adjusted_query(query, vendor)
-        result = self._request("search", {"query": final_query, "max_results": self.max_results})
+        timeout = _search_timeout()
+        result = self._client.request(
+            "search",
+            {"query": final_query, "max_results": self.max_results, "timeout": timeout},
+            # Leave the server time to report Tavily's own timeout before the read gives up.
+            timeout=timeout + 2,
+        )
         rows = result if isinstance(result, list) else []
         logger.info("[WEB] MCP query='%s' vendor='%s' -> %d results", query, vendor or "", len(rows))
         return rows
 
+    async def asearch(self, query: str, vendor: str | None = None) -> list[dict[str, Any]]:
+        final_query = _vendor_adjusted_query(query, vendor)
+        timeout = _search_timeout()
+        result = await self._client.arequest(
+            "search",
+            {"query": final_query, "max_results": self.max_results, "timeout": timeout},
+            timeout=timeout + 2,
+        )
+        rows = result if isinstance(result, list) else []
+        logger.info("[WEB] MCP async query='%s' vendor='%s' -> %d results", query, vendor or "", len(rows))
+        return rows
+
 
 class WebSearchTool:
     def __init__(
@@ -143,11 +151,28 @@ class WebSearchTool:
         assert self.native_backend is not None
         return self.native_backend.search(query, vendor=vendor)
 
+    async def _arun_with_active_backend(self, query: str, vendor: str | None = None) -> list[dict[str, Any]]:
+        if self.active_backend == "mcp":
+            assert self.mcp_backend is not None
+            return await self.mcp_backend.asearch(query, vendor=vendor)
+
+        assert self.native_backend is not None
+        return await self.native_backend.asearch(query, vendor=vendor)
+
     def _ensure_native_backend(self) -> None:
         if self.native_backend is None:
             max_results = int(os.getenv("WEB_SEARCH_MAX_RESULTS", "5"))
             self.native_backend = NativeTavilyTool(max_results=max_results)
 
+    def _switch_to_native(self, exc: Exception) -> None:
+        can_fallback = self.runtime_fallback and self.active_backend == "mcp"
+        if not can_fallback:
+            raise exc
+
+        logger.warning("[WEB] Runtime MCP failure (%s), switching to native fallback", exc)
+        self._ensure_native_backend()
+        self.active_backend = "native"
+
     def search(self, query: str, vendor: str | None = None) -> list[dict[str, Any]]:
         try:
             result = self._run_with_active_backend(query, vendor=vendor)
@@ -155,16 +180,23 @@ class WebSearchTool:
                 result[0]["web_backend"] = self.active_backend
             return result
         except Exception as exc:
-            can_fallback = self.runtime_fallback and self.active_backend == "mcp"
-            if not can_fallback:
-                raise
-
-            logger.warning("[WEB] Runtime MCP failure (%s), switching to native fallback", exc)
-            self._ensure_native_backend()
-            self.active_backend = "native"
+            self._switch_to_native(exc)
             result = self._run_with_active_backend(query, vendor=vendor)
             if result:
                 result[0]["web_backend"] = self.active_backend
                 result[0]["fallback_reason"] = str(exc)
             return result
 
+    async def asearch(self, query: str, vendor: str | None = None) -> list[dict[str, Any]]:
+        try:
+            result = await self._arun_with_active_backend(query, vendor=vendor)
+            if result:
+                result[0]["web_backend"] = self.active_backend
+            return result
+        except Exception as exc:
+            self._switch_to_native(exc)
+            result = await self._arun_with_active_backend(query, vendor=vendor)
+            if result:
+                result[0]["web_backend"] = self.active_backend
+                result[0]["fallback_reason"] = str(exc)
+            return result
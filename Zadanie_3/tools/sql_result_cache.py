@@ -0,0 +1,249 @@
+"""Result cache for read-only SQL, in front of the native and MCP backends.
+
+Entries are keyed by the normalized statement. Statements relative to `now()` also carry a
+time bucket, so repeated dashboard/operator queries within one bucket share an entry and a
+new bucket starts fresh. The cache is an LRU bounded by the serialized size of the results.
+
+The Zadanie_2 loader sends `pg_notify(<channel>, <machine_id>)` when it writes telemetry or
+alarms. A listener thread drops the entries whose SQL names that machine, plus the ones not
+filtered by machine. While the listener is not connected, notifications could be missed, so
+the cache is bypassed and cleared on reconnect.
+
+A query can run while a notification arrives. Callers therefore read `generation()` before
+the lookup and pass it to `put`, which skips the result when a matching invalidation
+happened in the meantime.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any
+
+import psycopg
+from psycopg import sql as pg_sql
+
+from tools.columnar import dumps
+from tools.pg_pool import pg_connect_kwargs
+from tools.telemetry_schema import MACHINE_ID_RE
+
+logger = logging.getLogger(__name__)
+
+_LITERAL_RE = re.compile(r"('(?:[^']|'')*')")
+# Recent invalidations kept for `put`; a query older than all of them is not stored.
+_INVALIDATION_LOG_SIZE = 1024
+_NOW_RE = re.compile(
+    r"\b(?:now\s*\(\s*\)|current_timestamp|current_date|current_time|localtimestamp|localtime"
+    r"|clock_timestamp\s*\(\s*\)|statement_timestamp\s*\(\s*\)|transaction_timestamp\s*\(\s*\))"
+)
+
+
+def normalize_sql(sql: str) -> str:
+    """Lowercase and collapse whitespace outside string literals."""
+    parts = _LITERAL_RE.split(sql.strip().rstrip(";").strip())
+    # split() with a capturing group puts the literals at odd indices.
+    return "".join(part if idx % 2 else re.sub(r"\s+", " ", part.lower()) for idx, part in enumerate(parts))
+
+
+def _result_bytes(result: dict[str, Any]) -> int:
+    return len(dumps(result).encode("utf-8"))
+
+
+class SQLResultCache:
+    def __init__(
+        self,
+        max_bytes: int = 32 * 1024 * 1024,
+        bucket_seconds: float = 60.0,
+        ttl_seconds: float = 600.0,
+        channel: str | None = "telemetry_ingest",
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.bucket_seconds = bucket_seconds
+        self.ttl_seconds = ttl_seconds
+        self.channel = channel
+        self._lock = threading.Lock()
+        # Key -> entry; order is LRU (oldest first).
+        self._entries: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._bypassed = 0
+        self._evicted = 0
+        self._invalidated = 0
+        self._notifications = 0
+        self._skipped_stale = 0
+        self._generation = 0
+        # (generation, machine) of recent invalidations; machine "" means all machines.
+        self._invalidations: deque[tuple[int, str]] = deque(maxlen=_INVALIDATION_LOG_SIZE)
+        self._listening = channel is None
+        self._stop = threading.Event()
+        if channel:
+            threading.Thread(target=self._listen_loop, name="sql-result-cache-listener", daemon=True).start()
+
+    def _key(self, sql: str, now: float) -> tuple[str, float]:
+        """Cache key and expiry time for `sql`."""
+        normalized = normalize_sql(sql)
+        expires = now + self.ttl_seconds
+        if self.bucket_seconds > 0 and _NOW_RE.search(normalized):
+            bucket = int(now // self.bucket_seconds)
+            return f"{bucket}|{normalized}", min(expires, (bucket + 1) * self.bucket_seconds)
+        return normalized, expires
+
+    def get(self, sql: str) -> dict[str, Any] | None:
+        """A copy of the cached result marked with `cached` and `cache_age_ms`, or None."""
+        now = time.time()
+        key, _ = self._key(sql, now)
+        with self._lock:
+            if not self._listening:
+                self._bypassed += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires"] <= now:
+                self._drop_locked(key)
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+        return {**entry["result"], "cached": True, "cache_age_ms": round((now - entry["created"]) * 1000, 1)}
+
+    def generation(self) -> int:
+        """Invalidation counter to read before running a query whose result goes to `put`."""
+        with self._lock:
+            return self._generation
+
+    def _invalidate_locked(self, machine: str) -> None:
+        self._generation += 1
+        self._invalidations.append((self._generation, machine))
+
+    def _stale_locked(self, machines: set[str], generation: int) -> bool:
+        """Whether an invalidation since `generation` may cover a result for `machines`."""
+        if generation >= self._generation:
+            return False
+        if not self._invalidations or self._invalidations[0][0] > generation + 1:
+            return True  # older than the log
+        for gen, machine in reversed(self._invalidations):
+            if gen <= generation:
+                break
+            if not machine or not machines or machine in machines:
+                return True
+        return False
+
+    def put(self, sql: str, result: dict[str, Any], generation: int | None = None) -> None:
+        """Store `result`; with `generation`, skip it when it may predate a later invalidation."""
+        now = time.time()
+        key, expires = self._key(sql, now)
+        size = _result_bytes(result)
+        if size > self.max_bytes:
+            return
+        # SQL that names no machine may read any machine's rows.
+        machines = {m.upper() for m in MACHINE_ID_RE.findall(sql)}
+        with self._lock:
+            if not self._listening:
+                return
+            if generation is not None and self._stale_locked(machines, generation):
+                self._skipped_stale += 1
+                return
+            self._drop_locked(key)
+            self._entries[key] = {
+                "result": dict(result),
+                "bytes": size,
+                "machines": machines,
+                "created": now,
+                "expires": expires,
+            }
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                self._drop_locked(next(iter(self._entries)))
+                self._evicted += 1
+
+    def _drop_locked(self, key: str) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._bytes -= entry["bytes"]
+        return True
+
+    def invalidate_machine(self, machine_id: str | None) -> int:
+        """Drop entries that may include rows of `machine_id` (None: everything)."""
+        machine = (machine_id or "").strip().upper()
+        with self._lock:
+            stale = [
+                key
+                for key, entry in self._entries.items()
+                if not machine or not entry["machines"] or machine in entry["machines"]
+            ]
+            for key in stale:
+                self._drop_locked(key)
+            self._invalidated += len(stale)
+            self._invalidate_locked(machine)
+        if stale:
+            logger.info("[SQL_CACHE] Invalidated %d entries for machine=%s", len(stale), machine or "*")
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._invalidate_locked("")
+
+    def _listen_loop(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(**pg_connect_kwargs()) as conn:
+                    conn.execute(pg_sql.SQL("LISTEN {}").format(pg_sql.Identifier(self.channel)))
+                    # Anything written while we were not listening is unknown.
+                    self.clear()
+                    with self._lock:
+                        self._listening = True
+                    logger.info("[SQL_CACHE] Listening for ingest notifications on '%s'", self.channel)
+                    backoff = 1.0
+                    while not self._stop.is_set():
+                        for notify in conn.notifies(timeout=1.0):
+                            with self._lock:
+                                self._notifications += 1
+                            self.invalidate_machine(notify.payload)
+            except Exception as exc:
+                logger.warning("[SQL_CACHE] Ingest listener disconnected (%s); bypassing cache, retry in %.0fs",
+                               exc, backoff)
+            with self._lock:
+                self._listening = False
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "bypassed": self._bypassed,
+                "evicted": self._evicted,
+                "invalidated": self._invalidated,
+                "notifications": self._notifications,
+                "skipped_stale": self._skipped_stale,
+                "listening": int(self._listening),
+            }
+
+
+def sql_result_cache_from_env() -> SQLResultCache | None:
+    if os.getenv("SQL_RESULT_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    listen = os.getenv("SQL_RESULT_CACHE_LISTEN", "true").lower() == "true"
+    return SQLResultCache(
+        max_bytes=int(float(os.getenv("SQL_RESULT_CACHE_MAX_MB", "32")) * 1024 * 1024),
+        bucket_seconds=float(os.getenv("SQL_RESULT_CACHE_BUCKET_SECONDS", "60")),
+        ttl_seconds=float(os.getenv("SQL_RESULT_CACHE_TTL_SECONDS", "600")),
+        channel=os.getenv("TELEMETRY_NOTIFY_CHANNEL", "telemetry_ingest") if listen else None,
+    )
@@ -0,0 +1,324 @@
+"""Cache of NL->SQL translations as parameterized templates.
+
+Most `sql_query` instructions are a handful of shapes that differ only in machine, tags,
+alarm codes and time window. The SQL generated for one instruction is stored with those
+values replaced by placeholders, keyed by the instruction with the same values masked.
+A later instruction with the same signature gets the template filled with its own values
+instead of an LLM call.
+
+Only SQL where every value named in the instruction could be located and replaced is
+cached, so a filled template never carries a value from the instruction it was learned
+from. Pinned templates (curated, loaded from a JSON file) are never evicted or dropped.
+"""
+
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from tools.telemetry_schema import (
+    ALARM_CODE_RE,
+    MACHINE_ID_RE,
+    TAG_ALIASES,
+    TELEMETRY_TAGS,
+    find_tags,
+    find_time_window,
+)
+
+logger = logging.getLogger(__name__)
+
+_INTERVAL_RE = re.compile(r"interval\s+'([^']*)'", re.IGNORECASE)
+_WINDOW_PHRASE_RE = re.compile(
+    r"\b(?:last|past|previous)\s+(?:\d+\s*)?(?:minutes?|mins?|hours?|hrs?|h|days?|weeks?|shift)\b"
+    r"|\b\d+\s*(?:h|hrs?|min|d)\b",
+    re.IGNORECASE,
+)
+# `tag = 'X'` / `t.tag IN ('X', 'Y')`, and the same for alarm_code.
+_LIST_PREDICATE_RE = r"(\b[\w.]*\b{column})\s*(?:=\s*'([^']*)'|in\s*\(([^)]*)\))"
+_TAG_PREDICATE_RE = re.compile(_LIST_PREDICATE_RE.format(column="tag"), re.IGNORECASE)
+_ALARM_PREDICATE_RE = re.compile(_LIST_PREDICATE_RE.format(column="alarm_code"), re.IGNORECASE)
+_QUOTED_RE = re.compile(r"'([^']*)'")
+_TAG_NAMES_RE = re.compile(
+    "|".join(re.escape(name) for name in sorted([*TELEMETRY_TAGS, *TAG_ALIASES], key=len, reverse=True)),
+    re.IGNORECASE,
+)
+
+MACHINE = "<<machine_id>>"
+TAGS = "<<tags>>"
+ALARMS = "<<alarm_codes>>"
+WINDOW = "<<window>>"
+
+
+def _normalize_window(literal: str) -> str | None:
+    return find_time_window(f"last {literal}")
+
+
+def instruction_params(instruction: str) -> dict[str, Any]:
+    """Machine, tags, alarm codes and time window named in an instruction."""
+    interval = _INTERVAL_RE.search(instruction)
+    window = _normalize_window(interval.group(1)) if interval else find_time_window(instruction)
+    return {
+        "machines": sorted({m.upper() for m in MACHINE_ID_RE.findall(instruction)}),
+        "tags": find_tags(instruction),
+        "alarm_codes": sorted({c.upper() for c in ALARM_CODE_RE.findall(instruction)}),
+        "window": window,
+    }
+
+
+def instruction_signature(instruction: str) -> str:
+    """The instruction with its parameter values masked, e.g. `avg <tags> on <machine> for last <window>`."""
+    text = _INTERVAL_RE.sub("interval <window>", instruction)
+    text = _WINDOW_PHRASE_RE.sub("last <window>", text)
+    text = MACHINE_ID_RE.sub("<machine>", text)
+    text = ALARM_CODE_RE.sub("<alarm>", text)
+    text = _TAG_NAMES_RE.sub("<tag>", text)
+    text = text.lower().replace("'<", "<").replace(">'", ">")
+    # One or many tags/codes share a template: the SQL lists them in an IN (...).
+    for item in ("tag", "alarm"):
+        text = re.sub(rf"<{item}>(?:\s*(?:,|and|or|&)\s*<{item}>)*", f"<{item}s>", text)
+    return " ".join(text.strip(" .;").split())
+
+
+def _replace_list_predicates(sql: str, pattern: re.Pattern[str], values: list[str], placeholder: str) -> str | None:
+    """Rewrite predicates over exactly `values` to `col IN (<<placeholder>>)`; None if one lists other values."""
+    wanted = {value.lower() for value in values}
+    mismatch = False
+
+    def replace(match: re.Match[str]) -> str:
+        nonlocal mismatch
+        literals = [match.group(2)] if match.group(2) is not None else _QUOTED_RE.findall(match.group(3))
+        if {literal.lower() for literal in literals} != wanted:
+            mismatch = True
+            return match.group(0)
+        return f"{match.group(1)} IN ({placeholder})"
+
+    templated, count = pattern.subn(replace, sql)
+    return None if mismatch or count == 0 else templated
+
+
+def make_template(sql: str, params: dict[str, Any]) -> str | None:
+    """Parameterize `sql` with the values of `params`, or None if that cannot be done safely."""
+    if len(params["machines"]) > 1:
+        return None
+    template = sql.strip().rstrip(";")
+
+    if params["machines"]:
+        machine = params["machines"][0]
+        template, count = re.subn(rf"'{re.escape(machine)}'", f"'{MACHINE}'", template, flags=re.IGNORECASE)
+        if count == 0:
+            return None
+
+    if params["window"]:
+        # Exactly one matching interval, so a bucket width like interval '1 hour' is never mistaken for it.
+        matches = [m for m in _INTERVAL_RE.finditer(template) if _normalize_window(m.group(1)) == params["window"]]
+        if len(matches) != 1:
+            return None
+        start, end = matches[0].span()
+        template = f"{template[:start]}interval '{WINDOW}'{template[end:]}"
+
+    for key, pattern, placeholder in (("tags", _TAG_PREDICATE_RE, TAGS), ("alarm_codes", _ALARM_PREDICATE_RE, ALARMS)):
+        if params[key]:
+            templated = _replace_list_predicates(template, pattern, params[key], placeholder)
+            if templated is None:
+                return None
+            template = templated
+
+    # Any remaining literal machine/tag/alarm would be carried over to other instructions.
+    for literal in _QUOTED_RE.findall(template):
+        if (
+            (params["machines"] and MACHINE_ID_RE.fullmatch(literal))
+            or (params["tags"] and literal in TELEMETRY_TAGS)
+            or (params["alarm_codes"] and ALARM_CODE_RE.fullmatch(literal))
+        ):
+            return None
+    return template
+
+
+def _sql_list(values: list[str]) -> str:
+    return ", ".join("'" + value.replace("'", "''") + "'" for value in values)
+
+
+def fill_template(template: str, params: dict[str, Any]) -> str | None:
+    """Fill a template with `params`; None if the instruction lacks a value the template needs."""
+    sql = template
+    if MACHINE in sql:
+        if len(params["machines"]) != 1:
+            return None
+        sql = sql.replace(MACHINE, params["machines"][0])
+    if WINDOW in sql:
+        if not params["window"]:
+            return None
+        sql = sql.replace(WINDOW, params["window"])
+    for key, placeholder in (("tags", TAGS), ("alarm_codes", ALARMS)):
+        if placeholder in sql:
+            if not params[key]:
+                return None
+            sql = sql.replace(placeholder, _sql_list(params[key]))
+    return sql
+
+
+class SQLTemplateCache:
+    def __init__(
+        self,
+        path: str | None,
+        pinned_path: str | None = None,
+        max_entries: int = 256,
+        save_delay_seconds: float = 2.0,
+    ) -> None:
+        self.path = Path(path) if path else None
+        self.max_entries = max_entries
+        self.save_delay_seconds = save_delay_seconds
+        self._lock = threading.Lock()
+        self._save_timer: threading.Timer | None = None
+        # Signature -> entry; learned entries are in LRU order (oldest first).
+        self._pinned: dict[str, dict[str, Any]] = {}
+        self._entries: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._stored = 0
+        self._rejected = 0
+        self._invalidated = 0
+        if pinned_path:
+            self._load_pinned(Path(pinned_path))
+        self._load()
+        atexit.register(self.save)
+
+    def _load_pinned(self, path: Path) -> None:
+        try:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+        except Exception as exc:
+            logger.warning("[SQL_TEMPLATES] Ignoring unreadable pinned templates %s: %s", path, exc)
+            return
+        for item in payload.get("templates", []):
+            if not self.pin(item["instruction"], item["sql"]):
+                logger.warning("[SQL_TEMPLATES] Pinned example cannot be templated: %s", item["instruction"])
+        logger.info("[SQL_TEMPLATES] Loaded %d pinned templates from %s", len(self._pinned), path)
+
+    def _load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            payload = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception as exc:
+            logger.warning("[SQL_TEMPLATES] Ignoring unreadable cache file %s: %s", self.path, exc)
+            return
+        for entry in payload.get("entries", []):
+            if entry["signature"] not in self._pinned:
+                self._entries[entry["signature"]] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        logger.info("[SQL_TEMPLATES] Loaded %d templates from %s", len(self._entries), self.path)
+
+    def _schedule_save_locked(self) -> None:
+        if self.path is None or self._save_timer is not None:
+            return
+        self._save_timer = threading.Timer(self.save_delay_seconds, self.save)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            self._save_timer = None
+            snapshot = list(self._entries.values())
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(json.dumps({"entries": snapshot}, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except Exception as exc:
+            logger.warning("[SQL_TEMPLATES] Could not persist cache to %s: %s", self.path, exc)
+
+    @staticmethod
+    def _entry(instruction: str, sql: str) -> dict[str, Any] | None:
+        template = make_template(sql, instruction_params(instruction))
+        if template is None:
+            return None
+        return {
+            "signature": instruction_signature(instruction),
+            "template": template,
+            "example": instruction,
+            "created_at": time.time(),
+            "hits": 0,
+        }
+
+    def pin(self, instruction: str, sql: str) -> bool:
+        """Add a curated template from an example instruction and its SQL."""
+        entry = self._entry(instruction, sql)
+        if entry is None:
+            return False
+        with self._lock:
+            self._pinned[entry["signature"]] = entry
+            self._entries.pop(entry["signature"], None)
+        return True
+
+    def lookup(self, instruction: str) -> str | None:
+        """Ready SQL for `instruction` from a matching template, or None."""
+        signature = instruction_signature(instruction)
+        with self._lock:
+            entry = self._pinned.get(signature) or self._entries.get(signature)
+            sql = fill_template(entry["template"], instruction_params(instruction)) if entry else None
+            if sql is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            entry["hits"] += 1
+            if signature in self._entries:
+                self._entries.move_to_end(signature)
+        logger.info("[SQL_TEMPLATES] Hit for '%s'", signature)
+        return sql
+
+    def put(self, instruction: str, sql: str) -> bool:
+        """Learn a template from SQL that ran successfully for `instruction`."""
+        entry = self._entry(instruction, sql)
+        with self._lock:
+            if entry is None:
+                self._rejected += 1
+                return False
+            if entry["signature"] in self._pinned:
+                return False
+            self._entries[entry["signature"]] = entry
+            self._entries.move_to_end(entry["signature"])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._stored += 1
+            self._schedule_save_locked()
+        return True
+
+    def invalidate(self, instruction: str) -> None:
+        """Drop the learned template for `instruction` after its SQL failed; pinned ones stay."""
+        with self._lock:
+            if self._entries.pop(instruction_signature(instruction), None) is not None:
+                self._invalidated += 1
+                self._schedule_save_locked()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "pinned": len(self._pinned),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "stored": self._stored,
+                "rejected": self._rejected,
+                "invalidated": self._invalidated,
+            }
+
+
+def sql_template_cache_from_env() -> SQLTemplateCache | None:
+    if os.getenv("SQL_TEMPLATE_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    return SQLTemplateCache(
+        path=os.getenv("SQL_TEMPLATE_CACHE_PATH", ".data/sql_templates.json") or None,
+        pinned_path=os.getenv("SQL_TEMPLATE_PINNED_PATH", "sql_templates.json") or None,
+        max_entries=int(os.getenv("SQL_TEMPLATE_CACHE_MAX_ENTRIES", "256")),
+    )
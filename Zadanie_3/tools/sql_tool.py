@@ -1,16 +1,21 @@
-import atexit
-import json
 import logging
 import os
 import re
-import subprocess
-import threading
-from pathlib import Path
 from typing import Any, Literal
 
-import psycopg
 from langchain_core.language_models.chat_models import BaseChatModel
 
+from tools.columnar import encode_columns, to_rows
+from tools.deadline import timeout_for
+from tools.downsample import Downsampler
+from tools.llm_usage import record_llm_call
+from tools.mcp_client import MCPStdioClient
+from tools.ollama_scheduler import OllamaScheduler
+from tools.pg_pool import PgPool, pg_pool_from_env
+from tools.rollup_router import RollupRouter
+from tools.sql_result_cache import SQLResultCache
+from tools.sql_template_cache import SQLTemplateCache
+
 logger = logging.getLogger(__name__)
 
 SQLBackendMode = Literal["native", "mcp", "auto"]
@@ -55,80 +60,64 @@ def extract_sql(text: str) -> str:
     return text.strip()
 
 
+def _statement_timeout_ms() -> int:
+    """Postgres statement_timeout for the next query, bounded by the request deadline."""
+    return int(timeout_for(float(os.getenv("SQL_STATEMENT_TIMEOUT_SECONDS", "30"))) * 1000)
+
+
+def _limited_statement(query: str, limit: int) -> str:
+    if not is_read_only_sql(query):
+        raise ValueError("Only read-only SELECT/WITH/EXPLAIN queries are allowed.")
+    normalized = query.strip().lower()
+    # EXPLAIN is a top-level statement and cannot be wrapped as a subquery.
+    if normalized.startswith("explain"):
+        return query.rstrip(";")
+    return f"SELECT * FROM ({query.rstrip(';')}) AS q LIMIT {int(limit)}"
+
+
 class NativeSQLTool:
-    def __init__(self) -> None:
-        self.conn = psycopg.connect(
-            host=os.getenv("POSTGRES_HOST", "localhost"),
-            port=int(os.getenv("POSTGRES_PORT", "5432")),
-            dbname=os.getenv("POSTGRES_DB", "lankovacka"),
-            user=os.getenv("POSTGRES_USER", "langflow"),
-            password=os.getenv("POSTGRES_PASSWORD", "langflow"),
-            autocommit=True,
-        )
+    def __init__(self, pool: PgPool | None = None) -> None:
+        # Shared with every other NativeSQLTool in the process; see tools/pg_pool.py.
+        self.pool = pool or pg_pool_from_env()
 
     def run_select(self, query: str, limit: int = 100) -> dict[str, Any]:
-        if not is_read_only_sql(query):
-            raise ValueError("Only read-only SELECT/WITH/EXPLAIN queries are allowed.")
-        normalized = query.strip().lower()
-        # EXPLAIN is a top-level statement and cannot be wrapped as a subquery.
-        if normalized.startswith("explain"):
-            statement = query.rstrip(";")
-        else:
-            statement = f"SELECT * FROM ({query.rstrip(';')}) AS q LIMIT {int(limit)}"
-        with self.conn.cursor() as cur:
-            cur.execute(statement)
-            rows = cur.fetchall()
-            columns = [c.name for c in cur.description]
-        result = {"columns": columns, "rows": rows, "row_count": len(rows)}
+        statement = _limited_statement(query, limit)
+        columns, rows = self.pool.query(statement, _statement_timeout_ms())
+        result = encode_columns(columns, rows)
         logger.info("[SQL] Native query returned %d rows", len(rows))
         return result
 
+    async def arun_select(self, query: str, limit: int = 100) -> dict[str, Any]:
+        statement = _limited_statement(query, limit)
+        columns, rows = await self.pool.aquery(statement, _statement_timeout_ms())
+        result = encode_columns(columns, rows)
+        logger.info("[SQL] Native async query returned %d rows", len(rows))
+        return result
+
 
 class MCPSQLTool:
     def __init__(self, server_path: str) -> None:
-        self._counter = 0
-        self._lock = threading.Lock()
-        self._proc = subprocess.Popen(
-            [os.getenv("PYTHON_BIN", "python"), "-u", server_path],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            cwd=str(Path(server_path).resolve().parents[1]),
-        )
-        atexit.register(self.close)
+        # One process pool serves sync and async callers, many requests in flight per process.
+        self._client = MCPStdioClient(server_path, label="MCP Postgres server")
 
     def close(self) -> None:
-        if self._proc and self._proc.poll() is None:
-            self._proc.terminate()
-
-    def _request(self, method: str, params: dict[str, Any]) -> dict[str, Any]:
-        if self._proc.poll() is not None:
-            raise RuntimeError("MCP Postgres server process is not running.")
-
-        with self._lock:
-            self._counter += 1
-            req_id = self._counter
-            payload = {"id": req_id, "method": method, "params": params}
-            assert self._proc.stdin is not None
-            assert self._proc.stdout is not None
-            self._proc.stdin.write(json.dumps(payload, ensure_ascii=True) + "\n")
-            self._proc.stdin.flush()
-            line = self._proc.stdout.readline().strip()
-
-        if not line:
-            raise RuntimeError("Empty response from MCP Postgres server.")
-
-        response = json.loads(line)
-        if not response.get("ok"):
-            raise RuntimeError(response.get("error", "Unknown MCP Postgres error"))
-        return response["result"]
+        self._client.close()
+
+    def stats(self) -> dict[str, Any]:
+        return self._client.stats()
 
     def run_select(self, query: str, limit: int = 100) -> dict[str, Any]:
-        result = self._request("run_select", {"query": query, "limit": limit})
+        params = {"query": query, "limit": limit, "statement_timeout_ms": _statement_timeout_ms()}
+        result = self._client.request("run_select", params)
         logger.info("[SQL] MCP query returned %d rows", result.get("row_count", -1))
         return result
 
+    async def arun_select(self, query: str, limit: int = 100) -> dict[str, Any]:
+        params = {"query": query, "limit": limit, "statement_timeout_ms": _statement_timeout_ms()}
+        result = await self._client.arequest("run_select", params)
+        logger.info("[SQL] MCP async query returned %d rows", result.get("row_count", -1))
+        return result
+
 
 class SQLPlannerExecutor:
     def __init__(
@@ -137,8 +126,18 @@ class SQLPlannerExecutor:
         backend_mode: SQLBackendMode,
         mcp_server_path: str,
         runtime_fallback: bool = True,
+        scheduler: OllamaScheduler | None = None,
+        template_cache: SQLTemplateCache | None = None,
+        result_cache: SQLResultCache | None = None,
+        downsampler: Downsampler | None = None,
+        rollup_router: RollupRouter | None = None,
     ) -> None:
         self.llm = llm
+        self.scheduler = scheduler or OllamaScheduler(max_concurrency=0)
+        self.template_cache = template_cache
+        self.result_cache = result_cache
+        self.downsampler = downsampler
+        self.rollup_router = rollup_router
         self.backend_mode = backend_mode
         self.runtime_fallback = runtime_fallback
         self.native_backend: NativeSQLTool | None = None
@@ -167,11 +166,9 @@ class SQLPlannerExecutor:
             self.native_backend = NativeSQLTool()
             self.active_backend = "native"
 
-    def _nl_to_sql(self, instruction: str) -> str:
-        if instruction.strip().lower().startswith(("select", "with", "explain")):
-            return instruction.strip().rstrip(";")
-
-        prompt = f"""
+    @staticmethod
+    def _nl_to_sql_prompt(instruction: str) -> str:
+        return f"""
 You generate safe PostgreSQL read-only SQL for this schema:
 - telemetry(ts timestamptz, machine_id text, tag text, value double precision, unit text)
 - alarms(ts timestamptz, machine_id text, alarm_code text, severity text, message text, state text)
@@ -186,43 +183,282 @@ Rules:
 Instruction:
 {instruction}
 """.strip()
-        raw = self.llm.invoke(prompt).content
+
+    @classmethod
+    def _repair_prompt(cls, instruction: str, failed_sql: str, error: Exception) -> str:
+        return f"""
+{cls._nl_to_sql_prompt(instruction)}
+
+This SQL was planned for the instruction but failed:
+{failed_sql}
+
+Error:
+{error}
+
+Output corrected SQL only.
+""".strip()
+
+    @staticmethod
+    def _sql_from_llm(raw: Any) -> str:
         sql = extract_sql(raw if isinstance(raw, str) else str(raw))
         if not is_read_only_sql(sql):
             raise ValueError(f"Planner produced non read-only SQL: {sql}")
         return sql.rstrip(";")
 
+    def _nl_to_sql(self, instruction: str) -> str:
+        if instruction.strip().lower().startswith(("select", "with", "explain")):
+            return instruction.strip().rstrip(";")
+        with self.scheduler.slot("nl_to_sql"):
+            response = self.llm.invoke(self._nl_to_sql_prompt(instruction))
+        record_llm_call("nl_to_sql", response)
+        return self._sql_from_llm(response.content)
+
+    async def _anl_to_sql(self, instruction: str) -> str:
+        if instruction.strip().lower().startswith(("select", "with", "explain")):
+            return instruction.strip().rstrip(";")
+        async with self.scheduler.aslot("nl_to_sql"):
+            response = await self.llm.ainvoke(self._nl_to_sql_prompt(instruction))
+        record_llm_call("nl_to_sql", response)
+        return self._sql_from_llm(response.content)
+
+    def _repair_sql(self, instruction: str, failed_sql: str, error: Exception) -> str:
+        with self.scheduler.slot("nl_to_sql"):
+            response = self.llm.invoke(self._repair_prompt(instruction, failed_sql, error))
+        record_llm_call("sql_repair", response)
+        return self._sql_from_llm(response.content)
+
+    async def _arepair_sql(self, instruction: str, failed_sql: str, error: Exception) -> str:
+        async with self.scheduler.aslot("nl_to_sql"):
+            response = await self.llm.ainvoke(self._repair_prompt(instruction, failed_sql, error))
+        record_llm_call("sql_repair", response)
+        return self._sql_from_llm(response.content)
+
+    @staticmethod
+    def _planned_sql(sql: str) -> str:
+        if not is_read_only_sql(sql):
+            raise ValueError(f"Planner produced non read-only SQL: {sql}")
+        return sql.strip().rstrip(";")
+
+    def _row_limit(self, sql: str) -> int:
+        return self.downsampler.fetch_limit(sql) if self.downsampler is not None else 100
+
+    def _shaped(self, result: dict[str, Any]) -> dict[str, Any]:
+        # Backends return columnar results (tools/columnar.py); the agent works with rows.
+        if self.downsampler is not None:
+            result = self.downsampler.apply(result)
+        return to_rows(result)
+
     def _run_with_active_backend(self, sql: str) -> dict[str, Any]:
         if self.active_backend == "mcp":
             assert self.mcp_backend is not None
-            return self.mcp_backend.run_select(sql)
+            return self._shaped(self.mcp_backend.run_select(sql, limit=self._row_limit(sql)))
+
+        assert self.native_backend is not None
+        return self._shaped(self.native_backend.run_select(sql, limit=self._row_limit(sql)))
+
+    async def _arun_with_active_backend(self, sql: str) -> dict[str, Any]:
+        if self.active_backend == "mcp":
+            assert self.mcp_backend is not None
+            return self._shaped(await self.mcp_backend.arun_select(sql, limit=self._row_limit(sql)))
 
         assert self.native_backend is not None
-        return self.native_backend.run_select(sql)
+        return self._shaped(await self.native_backend.arun_select(sql, limit=self._row_limit(sql)))
+
+    def _run_routed(self, sql: str) -> dict[str, Any]:
+        routed = self.rollup_router.rewrite(sql) if self.rollup_router is not None else None
+        if routed is None:
+            return self._run_with_active_backend(sql)
+        rollup_sql, table, note = routed
+        try:
+            result = self._run_with_active_backend(rollup_sql)
+        except Exception as exc:
+            logger.warning("[ROLLUP] %s query failed (%s), running on telemetry", table, exc)
+            self.rollup_router.failed(exc)
+            return self._run_with_active_backend(sql)
+        logger.info("[ROLLUP] Routed to %s%s", table, " (approximate)" if note else "")
+        result["rollup_table"] = table
+        if note:
+            result["approximate"] = note
+        return result
+
+    async def _arun_routed(self, sql: str) -> dict[str, Any]:
+        routed = self.rollup_router.rewrite(sql) if self.rollup_router is not None else None
+        if routed is None:
+            return await self._arun_with_active_backend(sql)
+        rollup_sql, table, note = routed
+        try:
+            result = await self._arun_with_active_backend(rollup_sql)
+        except Exception as exc:
+            logger.warning("[ROLLUP] %s query failed (%s), running on telemetry", table, exc)
+            self.rollup_router.failed(exc)
+            return await self._arun_with_active_backend(sql)
+        logger.info("[ROLLUP] Routed to %s%s", table, " (approximate)" if note else "")
+        result["rollup_table"] = table
+        if note:
+            result["approximate"] = note
+        return result
 
     def _ensure_native_backend(self) -> None:
         if self.native_backend is None:
             self.native_backend = NativeSQLTool()
 
-    def run(self, instruction: str) -> dict[str, Any]:
-        sql = self._nl_to_sql(instruction)
+    def _switch_to_native(self, exc: Exception) -> None:
+        can_fallback = self.runtime_fallback and self.active_backend == "mcp"
+        if not can_fallback:
+            raise exc
+
+        logger.warning("[SQL] Runtime MCP failure (%s), switching to native fallback", exc)
+        self._ensure_native_backend()
+        self.active_backend = "native"
+
+    def _cached_result(self, sql: str) -> dict[str, Any] | None:
+        if self.result_cache is None:
+            return None
+        result = self.result_cache.get(sql)
+        if result is not None:
+            logger.info("[SQL] Result cache hit (age %.0f ms)", result["cache_age_ms"])
+            result["generated_sql"] = sql
+            result["sql_backend"] = "cache"
+        return result
+
+    def _cache_generation(self) -> int | None:
+        return self.result_cache.generation() if self.result_cache is not None else None
+
+    def _store_result(self, sql: str, result: dict[str, Any], generation: int | None) -> None:
+        if self.result_cache is not None:
+            self.result_cache.put(sql, result, generation)
 
+    def _execute(self, sql: str) -> dict[str, Any]:
+        generation = self._cache_generation()
+        cached = self._cached_result(sql)
+        if cached is not None:
+            return cached
         try:
-            result = self._run_with_active_backend(sql)
+            result = self._run_routed(sql)
+            self._store_result(sql, result, generation)
             result["generated_sql"] = sql
             result["sql_backend"] = self.active_backend
             return result
         except Exception as exc:
-            can_fallback = self.runtime_fallback and self.active_backend == "mcp"
-            if not can_fallback:
-                raise
+            self._switch_to_native(exc)
+            result = self._run_routed(sql)
+            self._store_result(sql, result, generation)
+            result["generated_sql"] = sql
+            result["sql_backend"] = self.active_backend
+            result["fallback_reason"] = str(exc)
+            return result
 
-            logger.warning("[SQL] Runtime MCP failure (%s), switching to native fallback", exc)
-            self._ensure_native_backend()
-            self.active_backend = "native"
-            result = self._run_with_active_backend(sql)
+    async def _aexecute(self, sql: str) -> dict[str, Any]:
+        generation = self._cache_generation()
+        cached = self._cached_result(sql)
+        if cached is not None:
+            return cached
+        try:
+            result = await self._arun_routed(sql)
+            self._store_result(sql, result, generation)
+            result["generated_sql"] = sql
+            result["sql_backend"] = self.active_backend
+            return result
+        except Exception as exc:
+            self._switch_to_native(exc)
+            result = await self._arun_routed(sql)
+            self._store_result(sql, result, generation)
             result["generated_sql"] = sql
             result["sql_backend"] = self.active_backend
             result["fallback_reason"] = str(exc)
             return result
 
+    def _templated_sql(self, instruction: str) -> str | None:
+        if self.template_cache is None:
+            return None
+        sql = self.template_cache.lookup(instruction)
+        if sql is not None and not is_read_only_sql(sql):
+            self.template_cache.invalidate(instruction)
+            return None
+        return sql
+
+    def _learn_template(self, instruction: str, sql: str) -> None:
+        # Instructions that already are SQL skip the LLM anyway.
+        if self.template_cache is None or instruction.strip().lower().startswith(("select", "with", "explain")):
+            return
+        self.template_cache.put(instruction, sql)
+
+    def _template_failed(self, instruction: str, exc: Exception) -> None:
+        logger.warning("[SQL] Templated SQL failed (%s), falling back to NL->SQL", exc)
+        if self.template_cache is not None:
+            self.template_cache.invalidate(instruction)
+
+    def run_uncached(self, sql: str) -> dict[str, Any]:
+        """Run internal read-only `sql` as is: no templates, rollups or result cache."""
+        try:
+            return self._run_with_active_backend(sql)
+        except Exception as exc:
+            self._switch_to_native(exc)
+            return self._run_with_active_backend(sql)
+
+    async def arun_uncached(self, sql: str) -> dict[str, Any]:
+        try:
+            return await self._arun_with_active_backend(sql)
+        except Exception as exc:
+            self._switch_to_native(exc)
+            return await self._arun_with_active_backend(sql)
+
+    def run(self, instruction: str, sql: str | None = None) -> dict[str, Any]:
+        """Run planner-supplied `sql` if given, else translate `instruction` to SQL.
+
+        The translation comes from the SQL template cache when the instruction has a known
+        shape, otherwise from the LLM. NL->SQL doubles as the repair path when the planner's
+        SQL is rejected or fails.
+        """
+        if sql is None:
+            templated = self._templated_sql(instruction)
+            if templated is not None:
+                try:
+                    result = self._execute(templated)
+                    result["sql_source"] = "template"
+                    return result
+                except Exception as exc:
+                    self._template_failed(instruction, exc)
+            generated = self._nl_to_sql(instruction)
+            result = self._execute(generated)
+            self._learn_template(instruction, generated)
+            result["sql_source"] = "nl_to_sql"
+            return result
+
+        try:
+            result = self._execute(self._planned_sql(sql))
+            result["sql_source"] = "planner"
+            return result
+        except Exception as exc:
+            logger.warning("[SQL] Planner SQL failed (%s), repairing via NL->SQL", exc)
+            result = self._execute(self._repair_sql(instruction, sql, exc))
+            result["sql_source"] = "repair"
+            result["repair_reason"] = str(exc)
+            return result
+
+    async def arun(self, instruction: str, sql: str | None = None) -> dict[str, Any]:
+        if sql is None:
+            templated = self._templated_sql(instruction)
+            if templated is not None:
+                try:
+                    result = await self._aexecute(templated)
+                    result["sql_source"] = "template"
+                    return result
+                except Exception as exc:
+                    self._template_failed(instruction, exc)
+            generated = await self._anl_to_sql(instruction)
+            result = await self._aexecute(generated)
+            self._learn_template(instruction, generated)
+            result["sql_source"] = "nl_to_sql"
+            return result
+
+        try:
+            result = await self._aexecute(self._planned_sql(sql))
+            result["sql_source"] = "planner"
+            return result
+        except Exception as exc:
+            logger.warning("[SQL] Planner SQL failed (%s), repairing via NL->SQL", exc)
+            result = await self._aexecute(await self._arepair_sql(instruction, sql, exc))
+            result["sql_source"] = "repair"
+            result["repair_reason"] = str(exc)
+            return result
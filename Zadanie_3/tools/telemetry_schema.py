@@ -0,0 +1,88 @@
+"""Static knowledge about the `telemetry`/`alarms` data shared by planners and SQL helpers."""
+
+import re
+
+DEFAULT_MACHINE_ID = "LNK-01"
+
+# Tags written by Zadanie_2/app/ingest/generate_demo_data.py, with their units.
+TELEMETRY_TAGS: dict[str, str] = {
+    "LineSpeed_mpm": "m/min",
+    "Tension_N": "N",
+    "SpoolRPM": "rpm",
+    "SpoolDiameter_mm": "mm",
+    "MainMotorCurrent_A": "A",
+    "Vibration_mm_s": "mm/s",
+    "TempGearbox_C": "°C",
+    "TempMotor_C": "°C",
+    "MachineState": "",
+    "WireBreak": "",
+    "SlipDetected": "",
+}
+
+# Operator phrasing -> tags. Longer phrases are matched first.
+TAG_ALIASES: dict[str, tuple[str, ...]] = {
+    "gearbox temperature": ("TempGearbox_C",),
+    "motor temperature": ("TempMotor_C",),
+    "machine temperature": ("TempGearbox_C", "TempMotor_C"),
+    "temperature": ("TempGearbox_C", "TempMotor_C"),
+    "line speed": ("LineSpeed_mpm",),
+    "spindle speed": ("SpoolRPM",),
+    "spool speed": ("SpoolRPM",),
+    "spool rpm": ("SpoolRPM",),
+    "spool diameter": ("SpoolDiameter_mm",),
+    "motor current": ("MainMotorCurrent_A",),
+    "tension": ("Tension_N",),
+    "vibration": ("Vibration_mm_s",),
+    "wire break": ("WireBreak",),
+    "slip": ("SlipDetected",),
+}
+
+ALARM_CODE_RE = re.compile(r"\bE\d{3}\b", re.IGNORECASE)
+MACHINE_ID_RE = re.compile(r"\bLNK-\d{2}\b", re.IGNORECASE)
+
+_WINDOW_RE = re.compile(
+    r"\b(?:last|past|previous)\s+(?:(\d+)\s*)?(minutes?|mins?|hours?|hrs?|h|days?|weeks?|shift)\b"
+    r"|\b(\d+)\s*(h|hrs?|min|d)\b",
+    re.IGNORECASE,
+)
+_UNIT_NAMES = {
+    "m": "minutes",
+    "h": "hours",
+    "d": "days",
+    "w": "weeks",
+}
+
+
+def find_tags(text: str) -> list[str]:
+    """Return known tags mentioned in `text`, by exact tag name or operator alias."""
+    lowered = text.lower()
+    found: list[str] = [tag for tag in TELEMETRY_TAGS if tag.lower() in lowered]
+    for alias in sorted(TAG_ALIASES, key=len, reverse=True):
+        if alias in lowered:
+            for tag in TAG_ALIASES[alias]:
+                if tag not in found:
+                    found.append(tag)
+            lowered = lowered.replace(alias, " ")
+    return found
+
+
+def find_time_window(text: str) -> str | None:
+    """Return a PostgreSQL interval literal such as `8 hours` for phrases like "last 8 hours"."""
+    match = _WINDOW_RE.search(text)
+    if not match:
+        return None
+    amount = match.group(1) or match.group(3) or "1"
+    unit = (match.group(2) or match.group(4)).lower()
+    if unit == "shift":
+        return f"{8 * int(amount)} hours"
+    name = _UNIT_NAMES.get(unit[0], "hours")
+    return f"{int(amount)} {name}"
+
+
+_INTERVAL_LITERAL_RE = re.compile(r"interval\s+'[^']*'", re.IGNORECASE)
+
+
+def replace_time_window(text: str, window: str) -> str:
+    """Point interval literals and "last N hours" phrases in `text` at `window` (e.g. `1 hours`)."""
+    text = _INTERVAL_LITERAL_RE.sub(f"interval '{window}'", text)
+    return _WINDOW_RE.sub(f"last {window}", text)
@@ -1,16 +1,25 @@
+import asyncio
+import json
 import logging
 import os
+import uuid
 from functools import lru_cache
 
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from langchain_ollama import ChatOllama
 from pydantic import BaseModel
 
+from answer_cache import AnswerCache, answer_cache_from_env
 from bootstrap_stack import ensure_zadanie2_stack
 from graph import create_agent_graph
+from memory_writer import BackgroundMemoryWriter, memory_writer_from_env
+from metrics import render_metrics
+from sessions import SessionStore, session_store_from_env
+from tools.llm_usage import summarize_usage
 
 
 logger = logging.getLogger(__name__)
@@ -18,10 +27,13 @@ logger = logging.getLogger(__name__)
 
 class ChatRequest(BaseModel):
     message: str
+    # Omit to start a new session; send the returned id back for follow-up questions.
+    session_id: str | None = None
 
 
 class ChatResponse(BaseModel):
     answer: str
+    session_id: str
 
 
 def _cors_origins_from_env() -> list[str]:
@@ -30,6 +42,27 @@ def _cors_origins_from_env() -> list[str]:
     return origins or ["http://localhost:8001", "http://127.0.0.1:8001"]
 
 
+@lru_cache(maxsize=1)
+def get_answer_cache() -> AnswerCache | None:
+    """Process-wide answer cache, shared with the graph so its stats can be served."""
+    load_dotenv()
+    return answer_cache_from_env()
+
+
+@lru_cache(maxsize=1)
+def get_memory_writer() -> BackgroundMemoryWriter:
+    """Process-wide background memory writer, flushed on shutdown."""
+    load_dotenv()
+    return memory_writer_from_env()
+
+
+@lru_cache(maxsize=1)
+def get_session_store() -> SessionStore:
+    """Process-wide conversation sessions (checkpointed graph state per session id)."""
+    load_dotenv()
+    return session_store_from_env()
+
+
 @lru_cache(maxsize=1)
 def get_app_graph():
     """Create LangGraph app once per process."""
@@ -51,7 +84,12 @@ def get_app_graph():
     )
 
     logger.info("Initializing LangGraph agent for web_app.")
-    return create_agent_graph(llm)
+    return create_agent_graph(
+        llm,
+        answer_cache=get_answer_cache(),
+        memory_writer=get_memory_writer(),
+        sessions=get_session_store(),
+    )
 
 
 app = FastAPI(title="Task 3 - LangGraph Maintenance Assistant API")
@@ -78,13 +116,52 @@ async def health_check():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus exposition: node/tool span histograms and component stats."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    cache = get_answer_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@app.get("/sessions/stats")
+async def session_stats():
+    return get_session_store().stats()
+
+
+@app.get("/memory/stats")
+async def memory_stats():
+    return get_memory_writer().stats()
+
+
+@app.post("/memory/flush")
+async def memory_flush(timeout: float = 30.0):
+    flushed = await asyncio.to_thread(get_memory_writer().flush, timeout)
+    return {"flushed": flushed, **get_memory_writer().stats()}
+
+
+@app.on_event("shutdown")
+async def flush_memory_writer():
+    if get_memory_writer.cache_info().currsize:
+        await asyncio.to_thread(get_memory_writer().flush, 30.0)
+
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(req: ChatRequest):
+    session_id = req.session_id or str(uuid.uuid4())
     try:
-        app_graph = get_app_graph()
-        state = app_graph.invoke({"user_query": req.message})
+        # Graph construction connects to Chroma/Postgres, so keep it off the event loop.
+        app_graph = await asyncio.to_thread(get_app_graph)
+        state = await app_graph.ainvoke({"user_query": req.message}, config=get_session_store().config(session_id))
         answer = state.get("final_answer", "(no answer)")
-        return ChatResponse(answer=answer)
+        return ChatResponse(answer=answer, session_id=session_id)
     except Exception as exc:
         logger.exception("Chat request failed")
         # Return a user-facing diagnostic instead of opaque HTTP 500.
@@ -92,10 +169,74 @@ async def chat(req: ChatRequest):
             answer=(
                 "The assistant is temporarily unavailable due to backend connectivity/configuration. "
                 f"Details: {exc}"
-            )
+            ),
+            session_id=session_id,
         )
 
 
+def _sse(event: dict) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """Server-Sent Events: node/step progress, answer tokens, then `done` (or `error`)."""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[dict | None] = asyncio.Queue()
+    session_id = req.session_id or str(uuid.uuid4())
+
+    def sink(event: dict) -> None:
+        # Nodes may emit from worker threads; hand events to the loop safely.
+        loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    async def run_graph() -> None:
+        try:
+            app_graph = await asyncio.to_thread(get_app_graph)
+            state = await app_graph.ainvoke(
+                {"user_query": req.message},
+                config=get_session_store().config(session_id, event_sink=sink),
+            )
+            sink(
+                {
+                    "event": "done",
+                    "answer": state.get("final_answer", "(no answer)"),
+                    "session_id": session_id,
+                    "llm_usage": summarize_usage(state.get("llm_usage") or []),
+                }
+            )
+        except Exception as exc:
+            logger.exception("Streaming chat request failed")
+            sink(
+                {
+                    "event": "error",
+                    "message": (
+                        "The assistant is temporarily unavailable due to backend connectivity/configuration. "
+                        f"Details: {exc}"
+                    ),
+                }
+            )
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    async def events():
+        task = asyncio.create_task(run_graph())
+        try:
+            # First byte goes out immediately, before graph construction or any LLM call.
+            yield _sse({"event": "start", "session_id": session_id})
+            while (event := await queue.get()) is not None:
+                yield _sse(event)
+        finally:
+            if not task.done():
+                # Client disconnected; stop spending Ollama time on this turn.
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
 